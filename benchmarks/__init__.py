@@ -0,0 +1,14 @@
+'''
+    benchmarks
+    ----------
+
+    Benchmarks of xam against synthetic repositories of 1k, 10k and 100k
+    addons. Run them from the repository root and compare two runs::
+
+        $ python -m benchmarks.run --output before.json
+        $ python -m benchmarks.run --output after.json
+        $ python -m benchmarks.compare before.json after.json
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
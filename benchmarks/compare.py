@@ -0,0 +1,73 @@
+'''
+    benchmarks.compare
+    ------------------
+
+    Compares two benchmark result files and lists the change of every
+    benchmark found in both. Exits with a status of 1 if a benchmark got
+    slower, or used more memory, by more than the threshold.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import sys
+import json
+from argparse import ArgumentParser
+
+
+DEFAULT_THRESHOLD = 0.1
+# Measurements shorter than this are too noisy to flag as regressions
+MIN_WALL = 0.01
+METRICS = [('wall', 's'), ('peak_rss_kb', ' KB')]
+
+
+def load(filename):
+    with open(filename) as inp:
+        return json.load(inp)
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    '''Returns a list of (benchmark, metric, old value, new value, ratio,
+    regressed) tuples for the benchmarks found in both results.'''
+    rows = []
+    old_results, new_results = old['results'], new['results']
+    for key in new_results:
+        if key not in old_results:
+            continue
+        for metric, _ in METRICS:
+            old_value = old_results[key][metric]
+            new_value = new_results[key][metric]
+            ratio = new_value / float(old_value) if old_value else 1.0
+            regressed = ratio > 1 + threshold
+            if metric == 'wall' and max(old_value, new_value) < MIN_WALL:
+                regressed = False
+            rows.append((key, metric, old_value, new_value, ratio,
+                         regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Compares two benchmark runs.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change reported as a regression, '
+                             'e.g. 0.1 for 10%%.')
+    args = parser.parse_args(argv)
+
+    old, new = load(args.old), load(args.new)
+    sys.stdout.write('%s (%s) -> %s (%s)\n'
+                     % (args.old, (old.get('commit') or '?')[:8],
+                        args.new, (new.get('commit') or '?')[:8]))
+    units = dict(METRICS)
+    rows = compare(old, new, args.threshold)
+    for key, metric, old_value, new_value, ratio, regressed in rows:
+        fmt = '%.4f' if metric == 'wall' else '%d'
+        sys.stdout.write('%-24s %-12s %14s %14s %+7.1f%%%s\n' % (
+            key, metric, (fmt % old_value) + units[metric],
+            (fmt % new_value) + units[metric], (ratio - 1) * 100,
+            '  REGRESSION' if regressed else ''))
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+'''
+    benchmarks.generate
+    -------------------
+
+    Generates synthetic addons.xml files of any size. About a fifth of
+    the addons are script modules, which the plugins depend on with a
+    skewed fan-out, so a few popular modules have thousands of
+    dependents like script.module.xbmcswift does in the real
+    repositories. Summaries and descriptions come in several languages.
+
+    The output only depends on the count and the seed.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import sys
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+
+LANGUAGES = ['en', 'de', 'fr', 'es', 'ja', 'ru']
+WORDS = [u'video', u'music', u'news', u'sports', u'lectures', u'movies',
+         u'radio', u'weather', u'podcasts', u'documentaries', u'kids',
+         u'comedy', u'science', u'history', u'cooking', u'travel',
+         u'gaming', u'anime', u'concerts', u'tutorials']
+# Summaries in each language, filled in with a word
+SUMMARIES = {
+    'en': u'Watch %s online',
+    'de': u'%s online ansehen',
+    'fr': u'Regardez des %s en ligne',
+    'es': u'Ver %s en l\xednea',
+    'ja': u'%sをオンラインで見る',
+    'ru': u'Смотреть %s',
+}
+POINTS = [('xbmc.python.pluginsource', 'video'),
+          ('xbmc.python.pluginsource', 'audio'),
+          ('xbmc.python.pluginsource', 'video audio'),
+          ('xbmc.python.script', 'executable'),
+          ('xbmc.python.weather', None)]
+MODULE_SHARE = 5
+
+
+def version(rand):
+    return '%d.%d.%d' % (rand.randint(0, 3), rand.randint(0, 20),
+                         rand.randint(0, 9))
+
+
+def generate_addon(rand, i, module_count):
+    '''Returns the xml of the i-th synthetic addon.'''
+    word = WORDS[i % len(WORDS)]
+    is_module = i % MODULE_SHARE == 0
+    if is_module:
+        addon_id = 'script.module.%s%d' % (word, i)
+    else:
+        addon_id = 'plugin.video.%s%d' % (word, i)
+    lines = ['<addon id=%s name=%s provider-name=%s version="%s">'
+             % (quoteattr(addon_id),
+                quoteattr(u'%s %d' % (word.title(), i)),
+                quoteattr(u'Provider %d' % rand.randint(0, 200)),
+                version(rand)),
+             '  <requires>',
+             '    <import addon="xbmc.python" version="2.0" />']
+
+    # Dependencies on modules are skewed towards the first modules
+    fan_out = 0 if is_module else min(int(rand.expovariate(0.6)), 8)
+    dependencies = set()
+    for _ in xrange(min(fan_out, module_count)):
+        module = min(int(rand.paretovariate(1.2)) - 1, module_count - 1)
+        dependencies.add(module)
+    for module in sorted(dependencies):
+        lines.append('    <import addon="script.module.%s%d" version="%s" />'
+                     % (WORDS[(module * MODULE_SHARE) % len(WORDS)],
+                        module * MODULE_SHARE, version(rand)))
+    lines.append('  </requires>')
+
+    if is_module:
+        lines.append('  <extension library="lib" '
+                     'point="xbmc.python.module" />')
+    else:
+        point, provides = POINTS[i % len(POINTS)]
+        lines.append('  <extension library="default.py" point="%s">'
+                     % point)
+        if provides:
+            lines.append('    <provides>%s</provides>' % provides)
+        lines.append('  </extension>')
+
+    lines.append('  <extension point="xbmc.addon.metadata">')
+    lines.append('    <platform>all</platform>')
+    languages = rand.sample(LANGUAGES, rand.randint(1, 4))
+    lines.append('    <language>%s</language>' % ' '.join(languages))
+    for lang in languages:
+        lines.append('    <summary lang="%s">%s</summary>'
+                     % (lang, escape(SUMMARIES[lang] % word)))
+    for lang in languages[:2]:
+        lines.append('    <description lang="%s">%s</description>'
+                     % (lang, escape(u' '.join(rand.sample(WORDS, 12)))))
+    lines.append('  </extension>')
+    lines.append('</addon>')
+    return u'\n'.join(lines)
+
+
+def generate_addons_xml(count, seed=0):
+    '''Returns a utf-8 encoded addons.xml with count addons.'''
+    rand = random.Random(seed)
+    module_count = max(1, (count + MODULE_SHARE - 1) // MODULE_SHARE)
+    parts = [u'<?xml version="1.0" encoding="UTF-8"?>', u'<addons>']
+    parts.extend(generate_addon(rand, i, module_count)
+                 for i in xrange(count))
+    parts.append(u'</addons>\n')
+    return u'\n'.join(parts).encode('utf-8')
+
+
+if __name__ == '__main__':
+    # python -m benchmarks.generate COUNT > addons.xml
+    sys.stdout.write(generate_addons_xml(int(sys.argv[1])))
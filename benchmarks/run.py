@@ -0,0 +1,283 @@
+'''
+    benchmarks.run
+    --------------
+
+    Runs the benchmarks and writes their results as JSON. Each benchmark
+    runs in a fresh interpreter, so its peak memory isn't hidden by an
+    earlier benchmark and no cache is shared. The setup of a benchmark,
+    e.g. writing the addon index for the indexed benchmarks, isn't
+    timed.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import sys
+import atexit
+import json
+import time
+import shutil
+import hashlib
+import platform
+import resource
+import tempfile
+from argparse import ArgumentParser, SUPPRESS
+from subprocess import Popen, PIPE, CalledProcessError, check_output
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+INFO_URL = 'http://localhost/addons.xml'
+CHECKSUM_URL = 'http://localhost/addons.xml.md5'
+SEARCH_QUERIES = [u'video', u'watch online', u'name:music', u'prov',
+                  u'lectures science', u'requires:script.module.video0']
+POPULAR_MODULES = 10
+
+
+def peak_rss_kb():
+    '''Returns the peak resident set size of this process in KB.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and in KB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def cached_repo(filename, index=False):
+    '''Returns an unparsed Repository whose cached addons.xml is a copy
+    of filename. HOME is pointed at a new temporary directory, so
+    nothing is read from or written to the real cache. If index is True,
+    the addon index is written first.'''
+    from xam.repository import Repository, safe_cache_fn
+    os.environ['HOME'] = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, os.environ['HOME'], True)
+    os.mkdir(os.path.join(os.environ['HOME'], '.xam_cache'))
+    with open(filename, 'rb') as inp:
+        checksum = hashlib.md5(inp.read()).hexdigest()
+    shutil.copy(filename, safe_cache_fn(INFO_URL))
+    with open(safe_cache_fn(CHECKSUM_URL), 'w') as out:
+        out.write(checksum)
+
+    def make_repo():
+        repo = Repository(INFO_URL, 'http://localhost/', CHECKSUM_URL,
+                          parse=False)
+        # The checksum is known, no request is needed
+        repo._remote_md5 = checksum
+        return repo
+
+    if index:
+        for _ in make_repo().iter_addons():
+            pass
+    return make_repo()
+
+
+def popular_modules(count):
+    '''Returns the ids of the modules with the most dependents in a
+    generated addons.xml.'''
+    from benchmarks.generate import WORDS, MODULE_SHARE
+    return ['script.module.%s%d' % (WORDS[(i * MODULE_SHARE) % len(WORDS)],
+                                   i * MODULE_SHARE)
+            for i in xrange(count)]
+
+
+def bench_parse(filename):
+    '''Parses addons.xml without an index, and writes the index.'''
+    repo = cached_repo(filename)
+    return repo.parse_addons
+
+
+def bench_parse_parallel(filename):
+    '''Parses addons.xml with a process per CPU, and writes the index.
+    The peak memory is that of the parent process only.'''
+    repo = cached_repo(filename)
+    repo.parse_processes = 0
+    return repo.parse_addons
+
+
+def bench_parse_indexed(filename):
+    '''Loads every addon from an up to date index.'''
+    repo = cached_repo(filename, index=True)
+    return repo.parse_addons
+
+
+def bench_properties(filename):
+    '''Reads every property of every parsed, mutable Addon.'''
+    from xam.parser import iterparse_addons
+    with open(filename, 'rb') as inp:
+        addons = list(iterparse_addons(inp))
+
+    def run():
+        for addon in addons:
+            (addon.id, addon.name, addon.version, addon.provider,
+             addon.dependencies, addon.extensions, addon.metadata,
+             addon.languages, addon.platform, addon.summary(),
+             addon.description(), addon.summary('de'))
+    return run
+
+
+def bench_serialize(filename):
+    '''Serializes every parsed, mutable Addon with to_dict and
+    to_xml_string.'''
+    from xam.parser import iterparse_addons
+    with open(filename, 'rb') as inp:
+        addons = list(iterparse_addons(inp))
+
+    def run():
+        for addon in addons:
+            addon.to_dict()
+            addon.to_xml_string()
+    return run
+
+
+def bench_search(filename):
+    '''Runs a few queries against the term index.'''
+    repo = cached_repo(filename, index=True)
+
+    def run():
+        for query in SEARCH_QUERIES:
+            repo.search(query, 20)
+    return run
+
+
+def bench_depends(filename):
+    '''Finds the direct and recursive dependents of popular modules.'''
+    repo = cached_repo(filename, index=True)
+
+    def run():
+        for module_id in popular_modules(POPULAR_MODULES):
+            repo.dependents(module_id)
+            repo.dependents(module_id, recursive=True)
+    return run
+
+
+def bench_list(filename):
+    '''Builds the addon table and sorts it like xam all --sort.'''
+    repo = cached_repo(filename, index=True)
+
+    def run():
+        rows = repo.table().select()
+        rows.sort('version').sort('id')
+        rows.sort('name')
+        rows.sort('provider', reverse=True)
+    return run
+
+
+BENCHMARKS = OrderedDict([
+    ('parse', bench_parse),
+    ('parse_parallel', bench_parse_parallel),
+    ('parse_indexed', bench_parse_indexed),
+    ('properties', bench_properties),
+    ('serialize', bench_serialize),
+    ('search', bench_search),
+    ('depends', bench_depends),
+    ('list', bench_list),
+])
+
+
+def run_child(name, filename):
+    '''Runs a single benchmark in this process and prints its result.'''
+    run = BENCHMARKS[name](filename)
+    setup_rss = peak_rss_kb()
+    start = time.time()
+    run()
+    wall = time.time() - start
+    print json.dumps({'wall': wall, 'setup_rss_kb': setup_rss,
+                      'peak_rss_kb': peak_rss_kb()})
+
+
+def run_benchmark(name, filename):
+    '''Returns the result dict of a benchmark run in a fresh
+    interpreter.'''
+    proc = Popen([sys.executable, '-m', 'benchmarks.run', '--child', name,
+                  filename], stdout=PIPE)
+    out, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError('Benchmark %s failed' % name)
+    return json.loads(out.splitlines()[-1])
+
+
+def addons_xml(workdir, size):
+    '''Returns the filename of a generated addons.xml with size addons,
+    generating it if needed.'''
+    from benchmarks.generate import generate_addons_xml
+    filename = os.path.join(workdir, 'addons-%d.xml' % size)
+    if not os.path.exists(filename):
+        with open(filename, 'wb') as out:
+            out.write(generate_addons_xml(size))
+    return filename
+
+
+def current_commit():
+    try:
+        return check_output(['git', 'rev-parse', 'HEAD'],
+                            stderr=PIPE).strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def run_all(sizes, names, workdir, repeat=1, log=sys.stderr):
+    '''Returns the results of every benchmark at every size, keyed by
+    "name/size". The fastest of repeat runs is kept, with the largest
+    peak memory.'''
+    results = OrderedDict()
+    for size in sizes:
+        filename = addons_xml(workdir, size)
+        for name in names:
+            runs = [run_benchmark(name, filename) for _ in xrange(repeat)]
+            result = {
+                'wall': min(run['wall'] for run in runs),
+                'setup_rss_kb': max(run['setup_rss_kb'] for run in runs),
+                'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+            }
+            results['%s/%d' % (name, size)] = result
+            log.write('%-24s %9.4fs %9d KB peak\n'
+                      % ('%s/%d' % (name, size), result['wall'],
+                         result['peak_rss_kb']))
+    return results
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Runs the xam benchmarks.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES,
+                        help='Numbers of addons to benchmark with.')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS.keys(),
+                        help='Benchmarks to run, by default all of them.')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs of each benchmark, the fastest is kept.')
+    parser.add_argument('--workdir',
+                        help='Directory for the generated addons.xml files, '
+                             'which are reused if present.')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='JSON file for the results.')
+    parser.add_argument('--child', nargs=2, metavar=('NAME', 'FILENAME'),
+                        help=SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return run_child(*args.child)
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    try:
+        results = run_all(args.sizes, args.only or BENCHMARKS.keys(),
+                          workdir, args.repeat)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    with open(args.output, 'w') as out:
+        json.dump({
+            'commit': current_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'results': results,
+        }, out, indent=2)
+    sys.stderr.write('Results written to %s\n' % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -47,9 +47,12 @@ setup(
     description='A utility for listing, searching and viewing source code for '
                 'XBMC addons.',
     long_description=__doc__,
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     platforms='any',
     install_requires=get_requires(),
+    extras_require={
+        'msgpack': ['msgpack-python'],
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
@@ -71,7 +74,15 @@ setup(
             'info = xam.cli:ShowAddonInfo',
             'depends = xam.cli:ShowDependentAddons',
             'get = xam.cli:GetAddon',
+            'mirror = xam.cli:MirrorRepository',
+            'build-repo = xam.cli:BuildRepository',
             'search = xam.cli:SearchAddons',
+            'check-deps = xam.cli:CheckDependencies',
+            'changes = xam.cli:ShowChanges',
+            'serve = xam.cli:Serve',
+            'cache_stats = xam.cli:CacheStats',
+            'cache_prune = xam.cli:PruneCache',
+            'cache_clear = xam.cli:ClearCache',
             'release = xam.cli.release:ReleaseAddon',
         ]
     },
@@ -0,0 +1,103 @@
+'''A local HTTP server standing in for a remote addon repository.'''
+import re
+import hashlib
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+
+LAST_MODIFIED = 'Sat, 01 Dec 2012 00:00:00 GMT'
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        status, headers = 200, {}
+        if self.server.validators:
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            headers['ETag'] = etag
+            headers['Last-Modified'] = LAST_MODIFIED
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                for key, val in headers.items():
+                    self.send_header(key, val)
+                self.end_headers()
+                return
+
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range not in headers.values():
+            # The partial copy is of another version, send the whole file
+            match = None
+        if match and self.server.ranges:
+            offset = int(match.group(1))
+            if self.server.range_start is not None:
+                # A misbehaving server sending another range
+                offset = self.server.range_start
+            if offset >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (
+                offset, len(body) - 1, len(body))
+            body = body[offset:]
+
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LocalServer(object):
+    '''Serves the provided dict of path -> body on localhost in a
+    background thread.'''
+
+    def __init__(self, files=None):
+        self.httpd = ThreadedHTTPServer(('127.0.0.1', 0), RequestHandler)
+        self.httpd.files = files or {}
+        self.httpd.requests = []
+        self.httpd.ranges = True
+        self.httpd.range_start = None
+        self.httpd.validators = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+
+    @property
+    def files(self):
+        return self.httpd.files
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.httpd.server_port, path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
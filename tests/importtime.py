@@ -0,0 +1,67 @@
+'''Reports the time spent importing modules, like python3 -X importtime.
+
+    $ python -m tests.importtime xam.main [command args...]
+
+Imports the module and, if arguments are given, loads the xam command
+they name and builds its parser the way `xam` does before running it. A
+line is printed to stderr for every module imported along the way, with
+the time spent in its own body and cumulatively, in microseconds. The
+last line on stdout is a JSON summary of the imported modules and the
+total time, used by test_startup.
+'''
+import sys
+import json
+import time
+import __builtin__
+
+
+def record_imports(records):
+    '''Wraps __import__ so a (depth, name, self us, cumulative us) tuple
+    is appended to records for every import which loads a new module.
+    Returns a function restoring the original __import__.'''
+    original = __builtin__.__import__
+    stack = []
+
+    def timed_import(name, *args, **kwargs):
+        count = len(sys.modules)
+        stack.append(0)
+        start = time.time()
+        try:
+            return original(name, *args, **kwargs)
+        finally:
+            elapsed = int((time.time() - start) * 1e6)
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if len(sys.modules) > count:
+                records.append((len(stack), name, elapsed - children,
+                                elapsed))
+
+    __builtin__.__import__ = timed_import
+    return lambda: setattr(__builtin__, '__import__', original)
+
+
+def main(argv):
+    records = []
+    restore = record_imports(records)
+    start = time.time()
+    try:
+        module = __import__(argv[0], fromlist=['main'])
+        if len(argv) > 1:
+            app = module.XAM()
+            factory, name, _ = app.command_manager.find_command(argv[1:])
+            factory(app, None).get_parser('xam ' + name)
+    finally:
+        restore()
+    elapsed = time.time() - start
+
+    sys.stderr.write('import time: self [us] | cumulative | imported '
+                     'package\n')
+    for depth, name, self_us, cumulative_us in records:
+        sys.stderr.write('import time: %9d | %10d | %s%s\n'
+                         % (self_us, cumulative_us, '  ' * depth, name))
+    print json.dumps({'modules': sorted(sys.modules), 'seconds': elapsed})
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
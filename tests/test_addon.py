@@ -2,6 +2,7 @@ import os
 from unittest import TestCase
 from xml.etree import ElementTree as ET
 from xam import Addon
+from xam.addon import AddonRecord, XmlString, FrozenPairs, freeze_pairs
 try:
     from collections import OrderedDict
 except ImportError:
@@ -92,6 +93,112 @@ class TestAddon(TestCase):
         for key, val in expected.items():
             if not key.startswith('_'):
                 self.assertEqual(val, actual[key])
+        # The original xml is kept, it isn't serialized again
+        self.assertEqual(xml, actual['_xml'])
+
+    def test_original_xml(self):
+        filename = os.path.join(os.path.dirname(__file__), 'data', 'addon.xml')
+        with open(filename) as inp:
+            xml = inp.read()
+        addon = Addon.from_filename(filename)
+        self.assertTrue(addon.to_xml_string() is addon.to_xml_string())
+        self.assertEqual(xml, addon.to_xml_string())
+
+        addon.set_dependency_version('plugin.video.missing', '1.0')
+        self.assertEqual(xml, addon.to_xml_string())
+        addon.set_dependency_version('xbmc.python', '2.1')
+        self.assertTrue('version="2.1"' in addon.to_xml_string())
+        self.assertTrue('version="2.1"' in addon.to_dict()['_xml'])
+
+        addon = Addon.from_filename(filename)
+        addon.version = '1.2.2'
+        self.assertTrue('version="1.2.2"' in addon.to_xml_string())
+
+    def test_to_dict_without_metadata(self):
+        addon = Addon(ET.fromstring('<addon id="a" name="A" version="1"/>'))
+        actual = addon.to_dict()
+        self.assertEqual((None, None, None), (actual['summaries'],
+                                              actual['descriptions'],
+                                              actual['platform']))
+        self.assertEqual('<addon id="a" name="A" version="1" />',
+                         actual['_xml'])
+
+
+class TestAddonRecord(TestCase):
+
+    def setUp(self):
+        filename = os.path.join(os.path.dirname(__file__), 'data', 'addon.xml')
+        self.addon = Addon.from_filename(filename)
+        self.record = AddonRecord.from_addon(self.addon)
+
+    def test_fields(self):
+        addon, record = self.addon, self.record
+        for attr in ['id', 'name', 'version', 'provider', 'dependencies',
+                     'summaries', 'descriptions', 'platform',
+                     'extension_items']:
+            self.assertEqual(getattr(addon, attr), getattr(record, attr))
+        self.assertEqual(('en', 'fr'), record.languages)
+        self.assertEqual(addon.summary(), record.summary())
+        self.assertEqual(addon.description(), record.description())
+        self.assertEqual(None, record.summary('de'))
+
+    def test_extension_items(self):
+        attrs, children = self.record.extension_items[0]
+        self.assertEqual((('library', 'addon.py'),
+                          ('point', 'xbmc.python.pluginsource')),
+                         tuple(sorted(attrs)))
+        self.assertEqual((('provides', 'video'),), children)
+        attrs, children = self.record.extension_items[1]
+        self.assertEqual([('language', 'en fr'), ('platform', 'all')],
+                         sorted(children))
+
+    def test_immutable(self):
+        def set_version():
+            self.record.version = '1.2.2'
+        self.assertRaises(AttributeError, set_version)
+        self.assertRaises(AttributeError, lambda: self.record.__dict__)
+
+        record = self.record
+        for field in [record.dependencies, record.summaries,
+                      record.descriptions]:
+            self.assertFalse(hasattr(field, '__setitem__'))
+            self.assertFalse(hasattr(field, '__delitem__'))
+            self.assertFalse(hasattr(field, 'update'))
+            self.assertFalse(hasattr(field, 'pop'))
+            self.assertRaises(AttributeError, lambda: field.__dict__)
+        for field in [record.languages, record.extension_items]:
+            self.assertTrue(isinstance(field, tuple))
+        # to_dict returns copies
+        data = record.to_dict()
+        data['summaries']['en'] = 'Changed'
+        self.assertEqual(self.addon.summaries, record.summaries)
+
+    def test_frozen_pairs(self):
+        pairs = FrozenPairs([('a', '1'), ('b', '2')])
+        self.assertEqual(['a', 'b'], list(pairs))
+        self.assertEqual(['1', '2'], pairs.values())
+        self.assertEqual([('a', '1'), ('b', '2')], pairs.items())
+        self.assertEqual('2', pairs['b'])
+        self.assertEqual('2', pairs.get('b'))
+        self.assertEqual(None, pairs.get('c'))
+        self.assertRaises(KeyError, lambda: pairs['c'])
+        self.assertTrue('a' in pairs)
+        self.assertFalse('c' in pairs)
+        self.assertEqual(OrderedDict([('a', '1'), ('b', '2')]), pairs)
+        self.assertEqual(pairs, {'b': '2', 'a': '1'})
+        self.assertNotEqual(pairs, {'a': '1'})
+        self.assertTrue(freeze_pairs({}) is freeze_pairs(None))
+        self.assertFalse(freeze_pairs(None))
+
+    def test_lazy_xml(self):
+        data = 'junk' + self.addon.to_xml_string()
+        record = AddonRecord.from_addon(self.addon, XmlString(data), 4,
+                                        len(data))
+        self.assertEqual(data[4:], record.to_xml_string())
+        self.assertEqual(None, record._addon)
+        self.assertEqual('all', record.metadata.find('platform').text)
+        self.assertEqual(self.addon.to_dict()['summaries'],
+                         record.to_dict()['summaries'])
 
 
 LANG_XML_TMP = '''
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from xam.parser import iterparse_addons
+from benchmarks.generate import generate_addons_xml
+from benchmarks.run import run_benchmark
+from benchmarks.compare import compare
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_generate(self):
+        data = generate_addons_xml(200)
+        self.assertEqual(data, generate_addons_xml(200))
+        addons = list(iterparse_addons(StringIO(data)))
+        self.assertEqual(200, len(addons))
+        ids = set(addon.id for addon in addons)
+        self.assertEqual(200, len(ids))
+        # Every dependency except xbmc.python is a generated module
+        dependency_ids = set(dependency_id for addon in addons
+                             for dependency_id in addon.dependencies)
+        self.assertEqual(set(), dependency_ids - ids - set(['xbmc.python']))
+        self.assertTrue(len(dependency_ids) > 5)
+        self.assertTrue(any(len(addon.summaries) > 1 for addon in addons))
+
+    def test_run_benchmark(self):
+        workdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(workdir, 'addons.xml')
+            with open(filename, 'wb') as out:
+                out.write(generate_addons_xml(50))
+            result = run_benchmark('search', filename)
+        finally:
+            shutil.rmtree(workdir)
+        self.assertTrue(result['wall'] >= 0)
+        self.assertTrue(result['peak_rss_kb'] >= result['setup_rss_kb'] > 0)
+
+    def test_compare(self):
+        old = {'results': {'parse/1000': {'wall': 1.0, 'peak_rss_kb': 100},
+                           'list/1000': {'wall': 0.001, 'peak_rss_kb': 10}}}
+        new = {'results': {'parse/1000': {'wall': 1.5, 'peak_rss_kb': 105},
+                           'list/1000': {'wall': 0.002, 'peak_rss_kb': 10},
+                           'new/1000': {'wall': 1.0, 'peak_rss_kb': 10}}}
+        regressed = [(key, metric) for key, metric, _, _, _, regressed
+                     in compare(old, new) if regressed]
+        self.assertEqual([('parse/1000', 'wall')], regressed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+import zipfile
+from xam.build import RepositoryBuilder, find_addon_dirs, source_files
+from xam.parser import iterparse_addons
+from xam.verify import verify_zip
+
+
+ADDON_XML = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<addon id="%s" name="Test" version="%s" provider-name="jbel">\n'
+             '</addon>\n')
+
+
+class TestBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sources = os.path.join(self.tmpdir, 'src')
+        self.output = os.path.join(self.tmpdir, 'repo')
+        os.mkdir(self.sources)
+        self.write_addon('plugin.video.one', '1.0')
+        self.write_addon('script.module.two', '2.0')
+        self.write_file('plugin.video.one', 'icon.png', 'icon')
+        self.write_file('plugin.video.one', 'changelog.txt', 'changes')
+        self.write_file('plugin.video.one', 'resources/lib/api.py', 'pass')
+        self.write_file('plugin.video.one', 'resources/lib/api.pyc', 'junk')
+        self.write_file('plugin.video.one', '.git/HEAD', 'junk')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, addon_id, relpath, contents):
+        filename = os.path.join(self.sources, addon_id, *relpath.split('/'))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as out:
+            out.write(contents)
+        return filename
+
+    def write_addon(self, addon_id, version):
+        self.write_file(addon_id, 'addon.xml', ADDON_XML % (addon_id, version))
+
+    def build(self, processes=1):
+        return RepositoryBuilder([self.sources], self.output,
+                                 processes).build()
+
+    def built_versions(self):
+        with open(os.path.join(self.output, 'addons.xml')) as inp:
+            return [(addon.id, addon.version)
+                    for addon in iterparse_addons(inp)]
+
+    def test_find_addon_dirs(self):
+        addon_dir = os.path.join(self.sources, 'plugin.video.one')
+        self.assertEqual([addon_dir,
+                          os.path.join(self.sources, 'script.module.two')],
+                         find_addon_dirs([self.sources]))
+        self.assertEqual([addon_dir], find_addon_dirs([addon_dir]))
+        self.assertEqual(['addon.xml', 'changelog.txt', 'icon.png',
+                          'resources/lib/api.py'],
+                         [relpath for relpath, _, _
+                          in source_files(addon_dir)])
+
+    def test_build(self):
+        result = self.build(processes=2)
+        self.assertEqual(['plugin.video.one', 'script.module.two'],
+                         sorted(result.built))
+        self.assertEqual([], result.errors)
+        self.assertEqual([('plugin.video.one', '1.0'),
+                          ('script.module.two', '2.0')],
+                         self.built_versions())
+        with open(os.path.join(self.output, 'addons.xml')) as inp:
+            data = inp.read()
+        self.assertEqual(1, data.count('<?xml'))
+        with open(os.path.join(self.output, 'addons.xml.md5')) as inp:
+            self.assertEqual(hashlib.md5(data).hexdigest(), inp.read())
+
+        addon_dir = os.path.join(self.output, 'plugin.video.one')
+        self.assertEqual(['changelog-1.0.txt', 'icon.png',
+                          'plugin.video.one-1.0.zip'],
+                         sorted(os.listdir(addon_dir)))
+        zip_filename = os.path.join(addon_dir, 'plugin.video.one-1.0.zip')
+        self.assertTrue(verify_zip(zip_filename, 'plugin.video.one',
+                                   '1.0').ok)
+        self.assertEqual(['plugin.video.one/addon.xml',
+                          'plugin.video.one/changelog.txt',
+                          'plugin.video.one/icon.png',
+                          'plugin.video.one/resources/lib/api.py'],
+                         zipfile.ZipFile(zip_filename).namelist())
+
+    def test_incremental(self):
+        self.build()
+        zip_filename = os.path.join(self.output, 'script.module.two',
+                                    'script.module.two-2.0.zip')
+        result = self.build()
+        self.assertEqual(([], 2), (result.built, len(result.unchanged)))
+
+        # Touching a file without changing it doesn't rezip the addon
+        filename = os.path.join(self.sources, 'plugin.video.one', 'icon.png')
+        os.utime(filename, (time.time() + 10, time.time() + 10))
+        self.write_file('script.module.two', 'lib.py', 'print 1')
+        result = self.build()
+        self.assertEqual(['script.module.two'], result.built)
+        self.assertEqual(['plugin.video.one'], result.unchanged)
+        self.assertTrue('script.module.two/lib.py'
+                        in zipfile.ZipFile(zip_filename).namelist())
+
+        self.write_addon('plugin.video.one', '1.1')
+        result = self.build()
+        self.assertEqual(['plugin.video.one'], result.built)
+        self.assertEqual([('plugin.video.one', '1.1'),
+                          ('script.module.two', '2.0')],
+                         self.built_versions())
+        self.assertTrue(os.path.exists(os.path.join(
+            self.output, 'plugin.video.one', 'plugin.video.one-1.1.zip')))
+
+    def test_errors(self):
+        self.write_file('plugin.video.broken', 'addon.xml', '<addon id="x">')
+        self.write_file('plugin.video.copy', 'addon.xml',
+                        ADDON_XML % ('plugin.video.one', '1.0'))
+        result = self.build()
+        self.assertEqual(['plugin.video.broken', 'plugin.video.one'],
+                         sorted(os.path.basename(path)
+                                for path, _ in result.errors))
+        self.assertEqual([('plugin.video.one', '1.0'),
+                          ('script.module.two', '2.0')],
+                         self.built_versions())
+
+
+if __name__ == '__main__':
+    unittest.main()
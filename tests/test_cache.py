@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import tempfile
+import unittest
+import subprocess
+from xam import cache
+from xam.cache import Cache, safe_cache_fn, parse_size, format_size
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self._home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmpdir
+        os.mkdir(os.path.join(self.tmpdir, '.xam_cache'))
+        self._accessed = dict(cache._accessed)
+        self._recorded = dict(cache._recorded)
+        cache._accessed.clear()
+        cache._recorded.clear()
+
+    def tearDown(self):
+        cache._accessed.clear()
+        cache._accessed.update(self._accessed)
+        cache._recorded.clear()
+        cache._recorded.update(self._recorded)
+        os.environ['HOME'] = self._home
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, url, size, age=0, suffix=''):
+        '''Writes a cached file of size bytes for url, last modified and
+        accessed age seconds ago, without recording it as used.'''
+        filename = cache.cache_fn(base64.urlsafe_b64encode(url)) + suffix
+        with open(filename, 'wb') as out:
+            out.write('x' * size)
+        mtime = time.time() - age
+        os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_sizes(self):
+        self.assertEqual(512, parse_size('512'))
+        self.assertEqual(2048, parse_size('2K'))
+        self.assertEqual(512 * 1024 * 1024, parse_size('512MB'))
+        self.assertEqual(1536 * 1024 * 1024, parse_size('1.5g'))
+        self.assertRaises(ValueError, parse_size, '2X')
+        self.assertEqual('100.0 B', format_size(100))
+        self.assertEqual('1.5 MB', format_size(1536 * 1024))
+
+    def test_entries(self):
+        self.write('http://a/addons.xml', 100, age=30000)
+        self.write('http://a/addons.xml', 50, age=30000, suffix='.idx')
+        self.write('http://b/addons.xml', 10, age=10000)
+        self.write('http://c/repo.zip', 20, age=20000)
+        entries = Cache().entries()
+        self.assertEqual(['http://a/addons.xml', 'http://c/repo.zip',
+                          'http://b/addons.xml'],
+                         [entry.url for entry in entries])
+        self.assertEqual([150, 20, 10], [entry.size for entry in entries])
+        self.assertEqual(180, Cache().size())
+
+    def test_prune(self):
+        self.write('http://a/addons.xml', 100, age=30000)
+        self.write('http://a/addons.xml', 50, age=30000, suffix='.idx')
+        self.write('http://b/addons.xml', 100, age=10000)
+        self.write('http://c/addons.xml', 100, age=20000)
+        # Used by this process, so kept even though it's the oldest
+        self.write('http://d/addons.xml', 100, age=40000)
+        safe_cache_fn('http://d/addons.xml')
+
+        evicted = Cache(max_size=250).prune()
+        self.assertEqual(['http://a/addons.xml', 'http://c/addons.xml'],
+                         [entry.url for entry in evicted])
+        self.assertEqual(['http://b/addons.xml', 'http://d/addons.xml'],
+                         sorted(entry.url for entry in Cache().entries()))
+        with open(os.path.join(cache.cache_dir(), cache.MANIFEST)) as inp:
+            manifest = json.load(inp)
+        self.assertEqual(['http://b/addons.xml', 'http://d/addons.xml'],
+                         sorted(entry['url'] for entry
+                                in manifest['entries'].values()))
+
+        # No limit
+        self.assertEqual([], Cache(max_size=0).prune())
+
+    def test_sync(self):
+        self.write('http://a/addons.xml', 100, age=30000)
+        self.write('http://b/addons.xml', 100, age=20000)
+        self.assertEqual([], Cache().sync())
+        self.assertFalse(os.path.exists(cache.cache_fn(cache.MANIFEST)))
+
+        # Reading a cached file makes it the most recently used
+        safe_cache_fn('http://a/addons.xml')
+        self.assertEqual([], Cache().sync())
+        cache._accessed.clear()
+        self.assertEqual(['http://b/addons.xml', 'http://a/addons.xml'],
+                         [entry.url for entry in Cache().entries()])
+        self.assertEqual(['http://b/addons.xml'],
+                         [entry.url for entry in Cache(max_size=150).sync()])
+
+    def manifest(self):
+        with open(os.path.join(cache.cache_dir(), cache.MANIFEST)) as inp:
+            return json.load(inp)['entries']
+
+    def test_record_access(self):
+        self.write('http://a/addons.xml', 100, age=30000)
+        before = time.time()
+        filename = safe_cache_fn('http://a/addons.xml')
+        entry = self.manifest()[os.path.basename(filename)]
+        self.assertEqual('http://a/addons.xml', entry['url'])
+        self.assertTrue(entry['accessed'] >= before)
+
+    def test_in_use(self):
+        # a was recorded an hour ago, but its file was written since by a
+        # process which didn't record it
+        self.write('http://a/addons.xml', 100, age=1800)
+        Cache().record_access(base64.urlsafe_b64encode('http://a/addons.xml'),
+                              'http://a/addons.xml', time.time() - 3600)
+        self.write('http://b/addons.xml', 100, age=30000)
+        Cache().record_access(base64.urlsafe_b64encode('http://b/addons.xml'),
+                              'http://b/addons.xml', time.time() - 30000)
+        # c was used by another process a minute ago
+        self.write('http://c/addons.xml', 100, age=30000)
+        Cache().record_access(base64.urlsafe_b64encode('http://c/addons.xml'),
+                              'http://c/addons.xml', time.time() - 60)
+
+        self.assertEqual(['http://b/addons.xml'],
+                         [entry.url for entry in Cache(max_size=100).prune()])
+
+    def test_two_processes(self):
+        self.write('http://a/addons.xml', 100, age=30000)
+        self.write('http://b/addons.xml', 100, age=20000)
+        # Another process opens the least recently used entry
+        env = dict(os.environ, HOME=self.tmpdir)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.check_call([
+            sys.executable, '-c',
+            'from xam.cache import safe_cache_fn\n'
+            'open(safe_cache_fn("http://a/addons.xml")).close()'],
+            env=env, cwd=root)
+        self.assertEqual({}, cache._accessed)
+        self.assertEqual(['http://b/addons.xml'],
+                         [entry.url for entry in Cache(max_size=100).sync()])
+        self.assertEqual(['http://a/addons.xml'],
+                         [entry.url for entry in Cache().entries()])
+
+    def test_clear(self):
+        self.write('http://a/addons.xml', 100)
+        self.write('http://a/addons.xml', 100, suffix='.part')
+        safe_cache_fn('http://a/addons.xml')
+        Cache().sync()
+        self.assertEqual(['http://a/addons.xml'],
+                         [entry.url for entry in Cache().clear()])
+        self.assertEqual([], os.listdir(cache.cache_dir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from xam.common import (urlretrieve, write_atomic, lock_file, fcntl,
+                        resume_validator, content_range_start)
+from tests.httpserver import LocalServer, LAST_MODIFIED
+
+
+BODY = ''.join(chr(i % 256) for i in range(100000))
+ETAG = '"%s"' % hashlib.md5(BODY).hexdigest()
+
+
+class FakeResponse(object):
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class TestUrlretrieve(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'addon.zip')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self):
+        with open(self.filename, 'rb') as inp:
+            return inp.read()
+
+    def write_part(self, content, validator=None):
+        with open(self.filename + '.part', 'wb') as out:
+            out.write(content)
+        if validator is not None:
+            with open(self.filename + '.part.validator', 'w') as out:
+                out.write(validator)
+
+    def test_download(self):
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename,
+                               chunk_size=1000)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(BODY, self.read())
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+
+    def test_not_found(self):
+        with LocalServer() as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+        self.assertEqual(404, resp.status_code)
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.part'))
+
+    def test_resume(self):
+        self.write_part(BODY[:30000], ETAG)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+            headers = server.requests[0][1]
+        self.assertEqual(206, resp.status_code)
+        self.assertEqual('bytes=30000-', headers['range'])
+        self.assertEqual(ETAG, headers['if-range'])
+        self.assertEqual(BODY, self.read())
+        self.assertEqual(['addon.zip'], os.listdir(self.tmpdir))
+
+    def test_resume_last_modified(self):
+        self.write_part(BODY[:30000], LAST_MODIFIED)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+        self.assertEqual(206, resp.status_code)
+        self.assertEqual(BODY, self.read())
+
+    def test_resume_wrong_range(self):
+        # The server ignores the requested offset, the partial file is
+        # downloaded again from the start
+        self.write_part(BODY[:30000], ETAG)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            server.httpd.range_start = 1000
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+            headers = [headers for _, headers in server.requests]
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('bytes=30000-', headers[0]['range'])
+        self.assertFalse('range' in headers[1])
+        self.assertEqual(BODY, self.read())
+        self.assertEqual(['addon.zip'], os.listdir(self.tmpdir))
+
+    def test_content_range_start(self):
+        self.assertEqual(30000, content_range_start(FakeResponse({
+            'Content-Range': 'bytes 30000-99999/100000'})))
+        self.assertEqual(0, content_range_start(FakeResponse({
+            'Content-Range': 'bytes 0-99/*'})))
+        self.assertEqual(None, content_range_start(FakeResponse({})))
+        self.assertEqual(None, content_range_start(FakeResponse({
+            'Content-Range': 'bytes */100000'})))
+
+    def test_resume_changed(self):
+        # The partial file is of a previous version of addon.zip
+        self.write_part('x' * 30000, '"%s"' % hashlib.md5('old').hexdigest())
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(BODY, self.read())
+        self.assertEqual(['addon.zip'], os.listdir(self.tmpdir))
+
+    def test_resume_without_validator(self):
+        self.write_part('x' * 30000)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+            headers = server.requests[0][1]
+        self.assertEqual(200, resp.status_code)
+        self.assertFalse('range' in headers)
+        self.assertEqual(BODY, self.read())
+
+    def test_resume_validator(self):
+        self.assertEqual(ETAG, resume_validator(FakeResponse({
+            'ETag': ETAG, 'Last-Modified': LAST_MODIFIED})))
+        self.assertEqual(LAST_MODIFIED, resume_validator(FakeResponse({
+            'ETag': 'W/' + ETAG, 'Last-Modified': LAST_MODIFIED})))
+        self.assertEqual(None, resume_validator(FakeResponse({})))
+
+    def test_resume_unsupported(self):
+        self.write_part('garbage', ETAG)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            server.httpd.ranges = False
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(BODY, self.read())
+
+    def test_resume_range_not_satisfiable(self):
+        self.write_part(BODY + 'extra', ETAG)
+        with LocalServer({'/addon.zip': BODY}) as server:
+            resp = urlretrieve(server.url('/addon.zip'), self.filename)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(BODY, self.read())
+
+    @unittest.skipIf(fcntl is None, 'Downloads are only locked with fcntl')
+    def test_concurrent_download(self):
+        # Another process is downloading to addon.zip.part
+        lock = lock_file(self.filename + '.part')
+        try:
+            self.assertEqual(None, lock_file(self.filename + '.part'))
+            with LocalServer({'/addon.zip': BODY}) as server:
+                resp = urlretrieve(server.url('/addon.zip'), self.filename)
+            self.assertEqual(200, resp.status_code)
+            self.assertEqual(BODY, self.read())
+            self.assertEqual(['addon.zip', 'addon.zip.part'],
+                             sorted(os.listdir(self.tmpdir)))
+        finally:
+            lock.close()
+
+    def test_write_atomic(self):
+        write_atomic(self.filename, 'first')
+        write_atomic(self.filename, 'second')
+        self.assertEqual('second', self.read())
+        self.assertEqual(['addon.zip'], os.listdir(self.tmpdir))
+
+
+if __name__ == '__main__':
+    unittest.main()
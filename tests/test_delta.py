@@ -0,0 +1,127 @@
+import os
+import hashlib
+import unittest
+from StringIO import StringIO
+from xam.addon import AddonRecord, XmlString
+from xam.delta import ChangeSet, scan_addons, addon_id
+from xam.index import IndexedAddon
+from xam.parser import iterparse_elements
+from tests.test_repository import RepositoryTestCase
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+SIMILAR_TAGS_XML = os.path.join(os.path.dirname(__file__), 'data',
+                                'addons_similar_tags.xml')
+
+
+class TestScanAddons(unittest.TestCase):
+
+    def test_matches_parser(self):
+        with open(ADDONS_XML) as inp:
+            data = inp.read()
+        self.assertEqual([(start, end) for _, start, end
+                          in iterparse_elements(StringIO(data))],
+                         list(scan_addons(data)))
+
+    def test_similar_tags(self):
+        # <addon-info>, <addon.group> and the like aren't addons
+        with open(SIMILAR_TAGS_XML) as inp:
+            data = inp.read()
+        found = list(scan_addons(data))
+        self.assertEqual([(start, end) for _, start, end
+                          in iterparse_elements(StringIO(data))], found)
+        self.assertEqual([u'plugin.video.a', u'plugin.video.b'],
+                         [addon_id(data[start:end]) for start, end in found])
+
+    def test_skipped_markup(self):
+        data = ('<?xml version="1.0"?>\n<addons>\n'
+                '<!-- <addon id="commented"> -->\n'
+                '<addon id="a" name="a > b"><![CDATA[</addon>]]></addon>\n'
+                '<addon id=\'b&amp;c\' version="1.0"/>\n'
+                '</addons>\n')
+        slices = [data[start:end] for start, end in scan_addons(data)]
+        self.assertEqual(['<addon id="a" name="a > b">'
+                          '<![CDATA[</addon>]]></addon>',
+                          '<addon id=\'b&amp;c\' version="1.0"/>'], slices)
+        self.assertEqual([u'a', u'b&c'], [addon_id(xml) for xml in slices])
+        self.assertRaises(ValueError, list, scan_addons('<addon id="a">'))
+
+
+class TestDeltaUpdate(RepositoryTestCase):
+
+    def update_addons_xml(self):
+        addons_xml = (self.addons_xml
+            .replace('version="1.4.2"', 'version="1.4.3"')
+            .replace('Jonathan Beluch (jbel)" version="0.2.0"',
+                     'Jonathan Beluch (jbel)" version="0.2.0" ')
+            .replace('<addon id="script.module.beautifulsoup"',
+                     '<addon id="plugin.video.new" name="New" '
+                     'provider-name="New" version="0.1"/>\n'
+                     '<addon id="script.module.removed"'))
+        self.server.files['/addons.xml'] = addons_xml
+        self.server.files['/addons.xml.md5'] = hashlib.md5(
+            addons_xml).hexdigest()
+        return addons_xml
+
+    def assert_delta(self, checksum):
+        list(self.make_repo(checksum).iter_addons())
+        addons_xml = self.update_addons_xml()
+
+        repo = self.make_repo(checksum)
+        addons = list(repo.iter_addons())
+        # Only the new and changed addons were parsed
+        self.assertEqual(['plugin.video.academicearth'],
+                         [addon.id for addon in addons
+                          if isinstance(addon, IndexedAddon)])
+
+        changes = repo.changes()
+        self.assertEqual(hashlib.md5(self.addons_xml).hexdigest(),
+                         changes.old_checksum)
+        self.assertEqual(hashlib.md5(addons_xml).hexdigest(),
+                         changes.new_checksum)
+        self.assertEqual([(u'plugin.video.new', u'0.1'),
+                          (u'script.module.removed', u'3.0.8')],
+                         changes.added)
+        self.assertEqual([(u'script.module.beautifulsoup', u'3.0.8')],
+                         changes.removed)
+        self.assertEqual([(u'plugin.video.khanacademy', u'1.4.2', u'1.4.3')],
+                         changes.upgraded)
+        self.assertEqual([(u'script.module.xbmcswift', u'0.2.0')],
+                         changes.modified)
+
+        # The index written by the delta update matches a full parse
+        source = XmlString(addons_xml)
+        expected = [AddonRecord.from_element(elem, source, start, end)
+                    for elem, start, end
+                    in iterparse_elements(StringIO(addons_xml))]
+        indexed = list(self.make_repo(checksum).iter_addons())
+        self.assertTrue(all(isinstance(addon, IndexedAddon)
+                            for addon in indexed))
+        self.assertEqual([addon.to_dict() for addon in expected],
+                         [addon.to_dict() for addon in indexed])
+        self.assertEqual([addon.extension_items for addon in expected],
+                         [addon.extension_items for addon in indexed])
+
+    def test_delta_update(self):
+        self.assertEqual(None, self.make_repo().changes())
+        self.assert_delta(True)
+
+    def test_delta_update_no_checksum_url(self):
+        self.assert_delta(False)
+
+    def test_change_set_round_trip(self):
+        changes = ChangeSet('a' * 32, 'b' * 32, [(u'a', u'1.0')],
+                            [(u'b', u'1.0')], [(u'c', u'1.0', u'2.0')])
+        copy = ChangeSet.from_dict(changes.to_dict())
+        self.assertEqual(changes.to_dict(), copy.to_dict())
+        self.assertEqual(3, len(copy))
+        self.assertEqual(['+ a 1.0', '- b 1.0', '^ c 1.0 -> 2.0'],
+                         copy.lines())
+        self.assertEqual([('added', u'a', None, u'1.0'),
+                          ('removed', u'b', None, u'1.0'),
+                          ('upgraded', u'c', u'1.0', u'2.0')],
+                         copy.rows())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+from xam.download import Downloader, format_rate
+from tests.httpserver import LocalServer
+
+
+FILES = dict(('/addon%d.zip' % i, os.urandom(1024 * (i + 1)))
+             for i in range(6))
+
+
+class TestDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_download(self):
+        completed = []
+        with LocalServer(dict(FILES)) as server:
+            items = [(server.url(path), os.path.join(self.tmpdir, path[1:]))
+                     for path in sorted(FILES)]
+            results = Downloader(jobs=3).download(items, completed.append)
+
+        self.assertEqual([url for url, _ in items],
+                         [result.url for result in results])
+        self.assertEqual(len(items), len(completed))
+        for result in results:
+            self.assertTrue(result.ok)
+            path = '/' + os.path.basename(result.filename)
+            with open(result.filename, 'rb') as inp:
+                self.assertEqual(FILES[path], inp.read())
+            self.assertEqual(len(FILES[path]), result.size)
+
+    def test_missing_file(self):
+        filename = os.path.join(self.tmpdir, 'icon.png')
+        with LocalServer() as server:
+            result, = Downloader().download([(server.url('/icon.png'),
+                                              filename)])
+        self.assertFalse(result.ok)
+        self.assertEqual('HTTP 404', result.error)
+        self.assertFalse(os.path.exists(filename))
+
+    def test_format_rate(self):
+        self.assertEqual('512.0 B/s', format_rate(1024, 2))
+        self.assertEqual('1.5 MB/s', format_rate(1024 * 1024 * 3, 2))
+        self.assertEqual('10.0 B/s', format_rate(10, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from StringIO import StringIO
+from xam.formats import BufferedStream, get_writer, write_rows
+
+
+COLUMNS = ['id', 'version', 'dependencies']
+ROWS = [(u'plugin.video.caf\xe9', u'1.0', {u'xbmc.python': u'2.0'}),
+        (u'script.module.a', u'0.1', {})]
+
+
+def msgpack_available():
+    try:
+        import msgpack
+    except ImportError:
+        return False
+    return True
+
+
+class CountingStream(StringIO):
+
+    def __init__(self):
+        StringIO.__init__(self)
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        StringIO.write(self, data)
+
+
+class TestFormats(unittest.TestCase):
+
+    def write(self, name, text_format=None):
+        out = StringIO()
+        write_rows(name, out, COLUMNS, ROWS, text_format)
+        return out.getvalue()
+
+    def test_text(self):
+        self.assertEqual('plugin.video.caf\xc3\xa9 1.0\nscript.module.a 0.1\n',
+                         self.write('text', '%(id)s %(version)s\n'))
+
+    def test_ndjson(self):
+        lines = self.write('ndjson').splitlines()
+        self.assertEqual([dict(zip(COLUMNS, row)) for row in ROWS],
+                         [json.loads(line) for line in lines])
+        self.assertTrue(lines[0].startswith('{"id":'))
+
+    def test_csv(self):
+        self.assertEqual('id,version,dependencies\n'
+                         'plugin.video.caf\xc3\xa9,1.0,'
+                         '"{""xbmc.python"": ""2.0""}"\n'
+                         'script.module.a,0.1,{}\n', self.write('csv'))
+
+    @unittest.skipUnless(msgpack_available(), 'msgpack-python is missing')
+    def test_msgpack(self):
+        import msgpack
+        unpacker = msgpack.Unpacker(encoding='utf-8')
+        unpacker.feed(self.write('msgpack'))
+        self.assertEqual([dict(zip(COLUMNS, row)) for row in ROWS],
+                         list(unpacker))
+
+    def test_buffered(self):
+        out = CountingStream()
+        writer = get_writer('text', out, ['id', 'version'])
+        for i in xrange(10000):
+            writer.writerow(('script.module.%d' % i, '1.0'))
+        writer.close()
+        self.assertEqual(10000, len(out.getvalue().splitlines()))
+        self.assertTrue(out.writes < 10)
+
+        out = CountingStream()
+        stream = BufferedStream(out, size=10)
+        stream.write('12345')
+        self.assertEqual(0, out.writes)
+        stream.write('67890')
+        self.assertEqual(('1234567890', 1), (out.getvalue(), out.writes))
+
+
+if __name__ == '__main__':
+    unittest.main()
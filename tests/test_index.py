@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+from xam import Repository
+from xam.addon import AddonRecord
+from xam.index import AddonIndex, IndexedAddon, IndexWriter
+from xam.repository import safe_cache_fn
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+MD5 = '0123456789abcdef0123456789abcdef'
+
+
+class CachedRepoTestCase(unittest.TestCase):
+    '''Runs each test with HOME set to a temporary directory containing an
+    up to date cached copy of the addons.xml fixture.'''
+
+    info_url = 'http://localhost/addons.xml'
+    checksum_url = 'http://localhost/addons.xml.md5'
+
+    def setUp(self):
+        self._home = os.environ.get('HOME')
+        self.tmpdir = tempfile.mkdtemp()
+        os.environ['HOME'] = self.tmpdir
+        os.mkdir(os.path.join(self.tmpdir, '.xam_cache'))
+        shutil.copy(ADDONS_XML, safe_cache_fn(self.info_url))
+        with open(safe_cache_fn(self.checksum_url), 'w') as out:
+            out.write(MD5)
+
+    def tearDown(self):
+        os.environ['HOME'] = self._home
+        shutil.rmtree(self.tmpdir)
+
+    def make_repo(self):
+        repo = Repository(self.info_url, 'http://localhost/',
+                          self.checksum_url, parse=False)
+        repo._remote_md5 = MD5
+        return repo
+
+
+class TestAddonIndex(CachedRepoTestCase):
+
+    def test_index_written_and_used(self):
+        repo = self.make_repo()
+        self.assertEqual(None, repo.load_index())
+        parsed = list(repo.iter_addons())
+        self.assertTrue(all(type(addon) is AddonRecord for addon in parsed))
+
+        repo = self.make_repo()
+        self.assertNotEqual(None, repo.load_index())
+        indexed = list(repo.iter_addons())
+        self.assertTrue(all(isinstance(addon, IndexedAddon)
+                            for addon in indexed))
+        self.assertEqual([addon.id for addon in parsed],
+                         [addon.id for addon in indexed])
+        for old, new in zip(parsed, indexed):
+            self.assertEqual(old.version, new.version)
+            self.assertEqual(old.name, new.name)
+            self.assertEqual(old.provider, new.provider)
+            self.assertEqual(old.dependencies, new.dependencies)
+            self.assertEqual(old.summaries, new.summaries)
+            self.assertEqual(old.descriptions, new.descriptions)
+            self.assertEqual(old.languages, new.languages)
+            self.assertEqual(old.platform, new.platform)
+            self.assertEqual(old.extension_items, new.extension_items)
+            self.assertEqual(old.to_xml_string(), new.to_xml_string())
+
+    def test_index_checksum_mismatch(self):
+        list(self.make_repo().iter_addons())
+        repo = self.make_repo()
+        self.assertEqual(None, AddonIndex.open(repo.index_filename,
+                                               'f' * 32, ADDONS_XML))
+
+    def test_get_and_xml_bytes(self):
+        list(self.make_repo().iter_addons())
+        index = self.make_repo().load_index()
+        self.assertEqual(4, len(index))
+
+        addon = index.get('script.module.xbmcswift')
+        self.assertEqual(u'0.2.0', addon.version)
+        self.assertTrue(isinstance(addon.version, unicode))
+        xml = addon.to_xml_string()
+        self.assertTrue(xml.startswith('<addon id="script.module.xbmcswift"'))
+        self.assertTrue(xml.endswith('</addon>'))
+        self.assertEqual(['all'], [addon.platform])
+        self.assertEqual(None, index.get('plugin.video.missing'))
+        self.assertEqual(None, index.get('0'))
+        self.assertEqual(None, index.get('zzz'))
+
+    def test_addons_xml_replaced(self):
+        list(self.make_repo().iter_addons())
+        index = self.make_repo().load_index()
+        addon = index.get('script.module.xbmcswift')
+
+        # e.g. another xam process updates the cached addons.xml, the
+        # records keep reading the addons.xml they were indexed from
+        filename = safe_cache_fn(self.info_url)
+        with open(filename + '.new', 'wb') as out:
+            out.write('<addons>\n' + 'x' * 10000 + '\n</addons>\n')
+        os.rename(filename + '.new', filename)
+        xml = addon.to_xml_string()
+        self.assertTrue(xml.startswith('<addon id="script.module.xbmcswift"'))
+        self.assertTrue(xml.endswith('</addon>'))
+
+    def test_repository_get_uses_index(self):
+        list(self.make_repo().iter_addons())
+        repo = self.make_repo()
+        addon = repo.get('plugin.video.khanacademy')
+        self.assertTrue(isinstance(addon, IndexedAddon))
+        self.assertEqual(None, repo._addons)
+        self.assertEqual(None, repo.get('plugin.video.missing'))
+
+    def test_empty_index(self):
+        filename = os.path.join(self.tmpdir, 'empty.idx')
+        IndexWriter().write(filename, MD5 + '  addons.xml\n')
+        index = AddonIndex.open(filename, MD5, ADDONS_XML)
+        self.assertEqual(0, len(index))
+        self.assertEqual(None, index.get('plugin.video.academicearth'))
+        self.assertEqual([], index.dependents('xbmc.python'))
+
+    def test_dependents(self):
+        list(self.make_repo().iter_addons())
+        index = self.make_repo().load_index()
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy'],
+                         [addon.id for addon in
+                          index.dependents('script.module.xbmcswift')])
+        self.assertEqual(4, len(index.dependents('xbmc.python')))
+        self.assertEqual([], index.dependents('plugin.video.khanacademy'))
+        self.assertEqual([], index.dependents('zzz'))
+        self.assertEqual(['plugin.video.academicearth',
+                          'script.module.xbmcswift',
+                          'plugin.video.khanacademy'],
+                         [addon.id for addon in index.dependents(
+                             'script.module.beautifulsoup', recursive=True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
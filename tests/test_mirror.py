@@ -0,0 +1,133 @@
+import os
+import hashlib
+import zipfile
+from StringIO import StringIO
+from xam.mirror import Mirror
+from xam.parser import iterparse_addons
+from tests.test_repository import RepositoryTestCase
+
+
+VERSIONS = [('plugin.video.academicearth', '1.2.1'),
+            ('plugin.video.khanacademy', '1.4.2'),
+            ('script.module.xbmcswift', '0.2.0'),
+            ('script.module.beautifulsoup', '3.0.8')]
+
+
+def make_zip(addon_id, version):
+    buf = StringIO()
+    archive = zipfile.ZipFile(buf, 'w')
+    archive.writestr('%s/addon.xml' % addon_id,
+                     '<addon id="%s" name="x" version="%s"/>'
+                     % (addon_id, version))
+    archive.close()
+    return buf.getvalue()
+
+
+class TestMirror(RepositoryTestCase):
+
+    def setUp(self):
+        super(TestMirror, self).setUp()
+        self.directory = os.path.join(self.tmpdir, 'mirror')
+        for addon_id, version in VERSIONS:
+            self.publish(addon_id, version)
+
+    def publish(self, addon_id, version):
+        files = self.server.files
+        files['/%s/%s-%s.zip' % (addon_id, addon_id, version)] = \
+            make_zip(addon_id, version)
+        files['/%s/icon.png' % addon_id] = 'icon %s' % version
+        files['/%s/changelog-%s.txt' % (addon_id, version)] = 'changes'
+
+    def upgrade_khanacademy(self):
+        self.publish('plugin.video.khanacademy', '1.4.3')
+        addons_xml = self.addons_xml.replace('version="1.4.2"',
+                                             'version="1.4.3"')
+        self.server.files['/addons.xml'] = addons_xml
+        self.server.files['/addons.xml.md5'] = hashlib.md5(
+            addons_xml).hexdigest()
+
+    def mirrored_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name),
+                                      self.directory)
+                      for root, _, names in os.walk(self.directory)
+                      for name in names)
+
+    def mirrored_versions(self):
+        with open(os.path.join(self.directory, 'addons.xml')) as inp:
+            return [(addon.id, addon.version)
+                    for addon in iterparse_addons(inp)]
+
+    def sync(self, **kwargs):
+        del self.server.requests[:]
+        verify = kwargs.pop('verify', False)
+        return Mirror(self.make_repo(), self.directory,
+                      verify=verify).sync(**kwargs)
+
+    def test_sync(self):
+        result = self.sync()
+        self.assertEqual((0, 4, []), (result.current, len(result.updated),
+                                      result.failed))
+        self.assertEqual(VERSIONS, self.mirrored_versions())
+        with open(os.path.join(self.directory, 'addons.xml')) as inp:
+            data = inp.read()
+        with open(os.path.join(self.directory, 'addons.xml.md5')) as inp:
+            self.assertEqual(hashlib.md5(data).hexdigest(), inp.read())
+        self.assertTrue('plugin.video.khanacademy/icon.png'
+                        in self.mirrored_files())
+
+        # A second sync doesn't download any assets
+        result = self.sync()
+        self.assertEqual((4, []), (result.current, result.updated))
+        self.assertEqual([], [path for path in self.requested()
+                              if 'plugin.video' in path])
+
+    def test_upgrade(self):
+        self.sync()
+        self.upgrade_khanacademy()
+        result = self.sync(prune=True)
+        self.assertEqual(['plugin.video.khanacademy'], result.updated)
+        self.assertEqual(3, result.current)
+        self.assertEqual(['/plugin.video.khanacademy/changelog-1.4.3.txt',
+                          '/plugin.video.khanacademy/fanart.jpg',
+                          '/plugin.video.khanacademy/icon.png',
+                          '/plugin.video.khanacademy/'
+                          'plugin.video.khanacademy-1.4.3.zip'],
+                         sorted(path for path in self.requested()
+                                if 'plugin.video' in path))
+        files = [path for path in self.mirrored_files()
+                 if path.startswith('plugin.video.khanacademy/')]
+        self.assertEqual(['plugin.video.khanacademy/changelog-1.4.3.txt',
+                          'plugin.video.khanacademy/icon.png',
+                          'plugin.video.khanacademy/'
+                          'plugin.video.khanacademy-1.4.3.zip'], files)
+        with open(os.path.join(self.directory, 'plugin.video.khanacademy',
+                               'icon.png')) as inp:
+            self.assertEqual('icon 1.4.3', inp.read())
+
+    def test_failed_upgrade_keeps_previous_version(self):
+        self.sync()
+        self.upgrade_khanacademy()
+        # The new zip is corrupt
+        zip_path = ('/plugin.video.khanacademy/'
+                    'plugin.video.khanacademy-1.4.3.zip')
+        self.server.files[zip_path] = make_zip('plugin.video.khanacademy',
+                                               '1.4.2')
+        result = self.sync(verify=True)
+        self.assertEqual(['plugin.video.khanacademy'], result.failed)
+        self.assertEqual(VERSIONS, self.mirrored_versions())
+
+        # The next sync retries the zip
+        self.server.files[zip_path] = make_zip('plugin.video.khanacademy',
+                                               '1.4.3')
+        result = self.sync(verify=True)
+        self.assertEqual(['plugin.video.khanacademy'], result.updated)
+        self.assertEqual('1.4.3', dict(self.mirrored_versions())[
+            'plugin.video.khanacademy'])
+
+    def test_prune_removed_addons(self):
+        self.sync()
+        os.mkdir(os.path.join(self.directory, 'plugin.video.removed'))
+        result = self.sync(prune=True)
+        self.assertEqual(['plugin.video.removed'], result.removed)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.directory, 'plugin.video.removed')))
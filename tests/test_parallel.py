@@ -0,0 +1,81 @@
+import os
+import hashlib
+import unittest
+from xam import parallel
+from xam.addon import AddonRecord
+from xam.repository import safe_cache_fn
+from benchmarks.generate import generate_addons_xml
+from tests.test_repository import RepositoryTestCase
+
+
+FIELDS = [slot for slot in AddonRecord.__slots__ if not slot.startswith('_')]
+
+
+class TestShards(unittest.TestCase):
+
+    def test_shards(self):
+        ranges = [(10, 20), (20, 30), (31, 40), (40, 90), (90, 100)]
+        found = parallel.shards(ranges, 3)
+        self.assertEqual(ranges, sum(found, []))
+        self.assertEqual([[(10, 20), (20, 30), (31, 40)], [(40, 90)],
+                          [(90, 100)]], found)
+        self.assertEqual([], parallel.shards([], 3))
+
+    def test_is_utf8(self):
+        self.assertTrue(parallel.is_utf8('<?xml version="1.0"?><addons>'))
+        self.assertTrue(parallel.is_utf8(
+            '<?xml version="1.0" encoding="UTF-8"?><addons>'))
+        self.assertTrue(parallel.is_utf8('<addons>'))
+        self.assertFalse(parallel.is_utf8(
+            "<?xml version='1.0' encoding='ISO-8859-1'?><addons>"))
+
+
+class TestParallelParse(RepositoryTestCase):
+
+    def setUp(self):
+        super(TestParallelParse, self).setUp()
+        self.addons_xml = generate_addons_xml(300)
+        self.server.files['/addons.xml'] = self.addons_xml
+        self.server.files['/addons.xml.md5'] = hashlib.md5(
+            self.addons_xml).hexdigest()
+        self._min_size = parallel.MIN_PARALLEL_SIZE
+        parallel.MIN_PARALLEL_SIZE = 0
+
+    def tearDown(self):
+        parallel.MIN_PARALLEL_SIZE = self._min_size
+        super(TestParallelParse, self).tearDown()
+
+    def parse(self, processes):
+        '''Returns the addons and the index written by parsing addons.xml
+        with processes processes.'''
+        repo = self.make_repo()
+        if os.path.exists(repo.index_filename):
+            os.remove(repo.index_filename)
+        repo.parse_processes = processes
+        addons = list(repo.iter_addons())
+        with open(repo.index_filename, 'rb') as inp:
+            return addons, inp.read()
+
+    def test_identical_to_serial(self):
+        serial, serial_index = self.parse(1)
+        found, index = self.parse(3)
+        self.assertEqual(300, len(found))
+        self.assertEqual(serial_index, index)
+        for expected, addon in zip(serial, found):
+            self.assertEqual([getattr(expected, field) for field in FIELDS],
+                             [getattr(addon, field) for field in FIELDS])
+            self.assertEqual(expected.to_xml_string(), addon.to_xml_string())
+
+    def test_parse_processes(self):
+        filename = safe_cache_fn(self.server.url('/addons.xml'))
+        with open(filename, 'wb') as out:
+            out.write(self.addons_xml)
+        self.assertEqual(1, parallel.parse_processes(filename))
+        self.assertEqual(4, parallel.parse_processes(filename, 4))
+        self.assertTrue(parallel.parse_processes(filename, 0) >= 1)
+        parallel.MIN_PARALLEL_SIZE = len(self.addons_xml) + 1
+        self.assertEqual(1, parallel.parse_processes(filename, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
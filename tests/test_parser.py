@@ -0,0 +1,87 @@
+import os
+import unittest
+from StringIO import StringIO
+from xam import Addon
+from xam.parser import (iterparse_addons, iterparse_elements,
+                        AddonTreeBuilder, tag_end)
+from xam.common import UnicodeBuilder
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+
+
+class TestIterparseAddons(unittest.TestCase):
+
+    def test_iterparse(self):
+        with open(ADDONS_XML) as inp:
+            addons = list(iterparse_addons(inp, chunk_size=64))
+
+        self.assertEqual([
+            'plugin.video.academicearth',
+            'plugin.video.khanacademy',
+            'script.module.xbmcswift',
+            'script.module.beautifulsoup',
+        ], [addon.id for addon in addons])
+        self.assertTrue(all(isinstance(addon, Addon) for addon in addons))
+
+        khan = addons[1]
+        self.assertEqual(u'1.4.2', khan.version)
+        self.assertTrue(isinstance(khan.version, unicode))
+        self.assertEqual({u'xbmc.python': u'2.0',
+                          u'script.module.xbmcswift': u'0.2.0'},
+                         khan.dependencies)
+        self.assertEqual(u'Khan Academy Videos ansehen', khan.summary('de'))
+
+    def test_original_xml(self):
+        data = open(ADDONS_XML).read()
+        for chunk_size in [7, 64]:
+            addons = list(iterparse_addons(StringIO(data), chunk_size))
+            xml = [data[start:end] for _, start, end
+                   in iterparse_elements(StringIO(data))]
+            self.assertEqual(xml, [addon.to_xml_string() for addon in addons])
+
+    def test_iterparse_is_lazy(self):
+        inp = StringIO(open(ADDONS_XML).read())
+        addons = iterparse_addons(inp, chunk_size=64)
+        self.assertEqual('plugin.video.academicearth', addons.next().id)
+        self.assertNotEqual(len(inp.getvalue()), inp.tell())
+
+    def test_completed_addons_are_detached(self):
+        builder = AddonTreeBuilder()
+        parser = UnicodeBuilder(target=builder)
+        parser.feed(open(ADDONS_XML).read())
+        self.assertEqual(4, len(builder.pop_completed()))
+        self.assertEqual([], builder.pop_completed())
+        root = parser.close()
+        self.assertEqual(0, len(root))
+
+
+class TestIterparseElements(unittest.TestCase):
+
+    def test_offsets(self):
+        data = open(ADDONS_XML).read()
+        for chunk_size in [7, 64, 1024 * 64]:
+            items = list(iterparse_elements(StringIO(data), chunk_size))
+            self.assertEqual(4, len(items))
+            for elem, start, end in items:
+                xml = data[start:end]
+                self.assertTrue(xml.startswith('<addon id="%s"'
+                                               % elem.get('id')))
+                self.assertTrue(xml.endswith('</addon>'))
+
+    def test_self_closing_offsets(self):
+        data = ('<addons><addon id="a" name="a>b" version="1"/>\n'
+                '<addon id="b" name="b" version="2"></addon ></addons>')
+        items = list(iterparse_elements(StringIO(data), 5))
+        self.assertEqual(['<addon id="a" name="a>b" version="1"/>',
+                          '<addon id="b" name="b" version="2"></addon >'],
+                         [data[start:end] for _, start, end in items])
+
+    def test_tag_end(self):
+        self.assertEqual(8, tag_end('</addon>', 0))
+        self.assertEqual(13, tag_end("<a b='>' c/>", 0) + 1)
+        self.assertRaises(ValueError, tag_end, '<addon', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
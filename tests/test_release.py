@@ -3,7 +3,12 @@ try:
     from collections import OrderedDict
 except ImportError:
     from collective.ordereddict import OrderedDict
-from xam.cli.release import compare_versions
+from StringIO import StringIO
+from xml.etree import ElementTree as ET
+from xam import Addon
+from xam.cli import release
+from xam.version import compare
+from tests.test_resolver import FakeRepo, record
 
 
 class TestRelease(unittest.TestCase):
@@ -13,14 +18,61 @@ class TestRelease(unittest.TestCase):
             (('1.0', '1.1'), -1),
             (('1.1', '0.4'), 1),
             (('1.0', '1.0'), 0),
-            (('0.0.1', '.1'), 0),
+            (('0.0.1', '.1'), -1),
             (('0.0.0', '0'), 0),
             (('1', '0'), 1),
             (('.12', '.2'), 1),
             (('1.3', '1.3'), 0),
         ]
         for inp, expected in known_values:
-            self.assertEqual(compare_versions(*inp), expected)
+            self.assertEqual(compare(*inp), expected)
+
+
+class FakeApp(object):
+
+    def __init__(self):
+        self.stdout = StringIO()
+
+
+class TestUpdateDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self._get_repo = release.get_repo
+        self.repo = FakeRepo([
+            record('script.module.a', '1.0', [('script.module.b', '2.0')]),
+            record('script.module.b', '1.0'),
+        ])
+        release.get_repo = lambda reponames, parse=True: self.repo
+        self.command = release.ReleaseAddon(FakeApp(), None)
+        self.command.yes_no = lambda msg: self.fail('Unexpected prompt')
+
+    def tearDown(self):
+        release.get_repo = self._get_repo
+
+    def addon(self, dependencies):
+        return Addon(ET.fromstring(
+            '<addon id="plugin.video.x" version="1.0" name="X">'
+            '<requires>%s</requires></addon>' % ''.join(
+                '<import addon="%s" version="%s"/>' % dependency
+                for dependency in dependencies)))
+
+    def test_direct_problem(self):
+        addon = self.addon([('xbmc.python', '2.0'),
+                            ('script.module.b', '1.0'),
+                            ('script.module.missing', '1.0')])
+        self.assertRaises(SystemExit, self.command.update_dependencies,
+                          addon, ['FRODO'])
+
+    def test_deep_problem(self):
+        # script.module.a requires a newer script.module.b than the
+        # repository has, which only the addon's dependency can fix
+        addon = self.addon([('script.module.a', '1.0')])
+        self.command.update_dependencies(addon, ['FRODO'])
+        output = self.command.app.stdout.getvalue()
+        self.assertTrue('Warning' in output)
+        self.assertTrue('script.module.a requires script.module.b 2.0' in
+                        output)
+        self.assertTrue('already at the newest version' in output)
 
 
 if __name__ == '__main__':
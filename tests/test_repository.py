@@ -0,0 +1,285 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from StringIO import StringIO
+from xam import Repository, RepositorySet
+from xam.parser import iterparse_addons
+from xam.repository import safe_cache_fn, read_meta, RepositoryError
+from tests.httpserver import LocalServer
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+
+
+class RepositoryTestCase(unittest.TestCase):
+    '''Runs each test with HOME set to a temporary directory and a local
+    server hosting the addons.xml fixture.'''
+
+    def setUp(self):
+        self._home = os.environ.get('HOME')
+        self.tmpdir = tempfile.mkdtemp()
+        os.environ['HOME'] = self.tmpdir
+        os.mkdir(os.path.join(self.tmpdir, '.xam_cache'))
+
+        with open(ADDONS_XML) as inp:
+            self.addons_xml = inp.read()
+        self.server = LocalServer({
+            '/addons.xml': self.addons_xml,
+            '/addons.xml.md5': hashlib.md5(self.addons_xml).hexdigest(),
+        })
+        self.server.__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+        os.environ['HOME'] = self._home
+        shutil.rmtree(self.tmpdir)
+
+    def make_repo(self, checksum=True):
+        checksum_url = self.server.url('/addons.xml.md5') if checksum else None
+        return Repository(self.server.url('/addons.xml'),
+                          self.server.url('/'), checksum_url, parse=False)
+
+    def requested(self):
+        '''Returns the list of requested paths and clears it.'''
+        paths = [path for path, _ in self.server.requests]
+        del self.server.requests[:]
+        return paths
+
+
+class TestRepository(RepositoryTestCase):
+
+    def test_iter_addons(self):
+        repo = self.make_repo()
+        ids = [addon.id for addon in repo.iter_addons()]
+        self.assertEqual(4, len(ids))
+        self.assertEqual('plugin.video.academicearth', ids[0])
+        # Streaming shouldn't populate the addons list
+        self.assertEqual(None, repo._addons)
+
+    def test_addons_parsed_on_demand(self):
+        repo = self.make_repo()
+        self.assertEqual(4, len(repo.addons))
+        self.assertTrue(repo.addons[0] is list(repo.iter_addons())[0])
+
+    def test_addon_data_urls(self):
+        repo = self.make_repo()
+        urls = repo.addon_data_urls(repo.addons[0])
+        self.assertEqual(self.server.url('/plugin.video.academicearth/'
+                                         'plugin.video.academicearth-1.2.1.zip'),
+                         urls['zip'])
+
+    def test_get(self):
+        repo = self.make_repo(checksum=False)
+        repo.parse_addons()
+        addon = repo.get('script.module.xbmcswift')
+        self.assertEqual('0.2.0', addon.version)
+        self.assertTrue(addon is repo['script.module.xbmcswift'])
+        self.assertEqual(None, repo.get('plugin.video.missing'))
+        self.assertEqual('default', repo.get('plugin.video.missing',
+                                             'default'))
+        self.assertRaises(KeyError, lambda: repo['plugin.video.missing'])
+        self.assertTrue('plugin.video.khanacademy' in repo)
+        self.assertFalse('plugin.video.missing' in repo)
+
+    def test_get_many(self):
+        repo = self.make_repo()
+        found = repo.get_many(['script.module.xbmcswift',
+                               'plugin.video.missing',
+                               'plugin.video.academicearth'])
+        self.assertEqual(['script.module.xbmcswift',
+                          'plugin.video.academicearth'], found.keys())
+        self.assertEqual('1.2.1', found['plugin.video.academicearth'].version)
+
+    def test_to_dicts(self):
+        expected = [addon.to_dict() for addon
+                    in iterparse_addons(StringIO(self.addons_xml))]
+        # Written from the parsed xml, then read from the index
+        self.assertEqual(expected, self.make_repo().to_dicts())
+        self.assertEqual(expected, self.make_repo().to_dicts())
+        self.assertTrue(expected[0]['_xml'] in self.addons_xml)
+
+    def test_dependents(self):
+        repo = self.make_repo(checksum=False)
+        repo.parse_addons()
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy'],
+                         [addon.id for addon in
+                          repo.dependents('script.module.xbmcswift')])
+        self.assertEqual([], repo.dependents('plugin.video.khanacademy'))
+
+    def test_recursive_dependents(self):
+        repo = self.make_repo(checksum=False)
+        repo.parse_addons()
+        self.assertEqual(['plugin.video.academicearth',
+                          'script.module.xbmcswift'],
+                         [addon.id for addon in repo.dependents(
+                             'script.module.beautifulsoup')])
+        self.assertEqual(['plugin.video.academicearth',
+                          'script.module.xbmcswift',
+                          'plugin.video.khanacademy'],
+                         [addon.id for addon in repo.dependents(
+                             'script.module.beautifulsoup', recursive=True)])
+
+
+class TestRevalidation(RepositoryTestCase):
+
+    def test_checksum_revalidated(self):
+        self.assertEqual(4, len(self.make_repo().addons))
+        self.assertEqual(['/addons.xml.md5', '/addons.xml'], self.requested())
+
+        repo = self.make_repo()
+        self.assertEqual(4, len(repo.addons))
+        self.assertEqual(['/addons.xml.md5'], self.requested())
+        self.assertEqual(repo.local_md5, repo.remote_md5)
+
+    def test_checksum_not_modified(self):
+        list(self.make_repo().iter_addons())
+        self.requested()
+        list(self.make_repo().iter_addons())
+        path, headers = self.server.requests[0]
+        self.assertTrue('if-none-match' in headers)
+        self.assertTrue('if-modified-since' in headers)
+
+    def test_checksum_changed(self):
+        list(self.make_repo().iter_addons())
+        addons_xml = self.addons_xml.replace('version="1.4.2"',
+                                             'version="1.4.3"')
+        self.server.files['/addons.xml'] = addons_xml
+        self.server.files['/addons.xml.md5'] = hashlib.md5(
+            addons_xml).hexdigest()
+        repo = self.make_repo()
+        self.assertEqual('1.4.3', repo['plugin.video.khanacademy'].version)
+        self.assertEqual(hashlib.md5(addons_xml).hexdigest(), repo.local_md5)
+
+    def test_no_checksum_url(self):
+        repo = self.make_repo(checksum=False)
+        self.assertEqual(4, len(repo.addons))
+        filename = safe_cache_fn(repo.info_url)
+        meta = read_meta(filename)
+        self.assertEqual(hashlib.md5(self.addons_xml).hexdigest(),
+                         meta['md5'])
+        self.assertTrue('etag' in meta)
+        self.requested()
+
+        # The second run gets a 304 and reads the index
+        repo = self.make_repo(checksum=False)
+        self.assertEqual('1.4.2', repo['plugin.video.khanacademy'].version)
+        self.assertTrue(repo.load_index() is not None)
+        self.assertEqual(['/addons.xml'], self.requested())
+        self.assertEqual(self.addons_xml, open(filename).read())
+
+    def test_no_checksum_url_changed(self):
+        list(self.make_repo(checksum=False).iter_addons())
+        self.server.files['/addons.xml'] = self.addons_xml.replace(
+            'version="1.4.2"', 'version="1.4.3"')
+        repo = self.make_repo(checksum=False)
+        self.assertEqual('1.4.3', repo['plugin.video.khanacademy'].version)
+
+
+class TestRepositorySet(RepositoryTestCase):
+
+    def setUp(self):
+        super(TestRepositorySet, self).setUp()
+        # A second repository with a newer khanacademy, an older xbmcswift
+        # and an addon of its own
+        newer_xml = (self.addons_xml
+            .replace('version="1.4.2"', 'version="1.10.0"')
+            .replace('name="xbmcswift" provider-name="Jonathan Beluch (jbel)"'
+                     ' version="0.2.0"',
+                     'name="xbmcswift" provider-name="Jonathan Beluch (jbel)"'
+                     ' version="0.1.9"')
+            .replace('<addon id="plugin.video.academicearth"',
+                     '<addon id="plugin.video.other" name="Other" '
+                     'provider-name="Other" version="1.0.0">\n'
+                     '  <requires>\n'
+                     '    <import addon="plugin.video.khanacademy" '
+                     'version="1.10.0" />\n'
+                     '  </requires>\n'
+                     '</addon>\n'
+                     '<addon id="plugin.video.academicearth"'))
+        self.server.files['/other/addons.xml'] = newer_xml
+        self.server.files['/other/addons.xml.md5'] = hashlib.md5(
+            newer_xml).hexdigest()
+
+    def make_repos(self):
+        other = Repository(self.server.url('/other/addons.xml'),
+                           self.server.url('/other/'),
+                           self.server.url('/other/addons.xml.md5'),
+                           parse=False)
+        return RepositorySet([self.make_repo(), other])
+
+    def test_refresh(self):
+        repos = self.make_repos()
+        repos.refresh()
+        self.assertEqual(['/addons.xml', '/addons.xml.md5',
+                          '/other/addons.xml', '/other/addons.xml.md5'],
+                         sorted(self.requested()))
+        for repo in repos.repositories:
+            self.assertEqual(repo.remote_md5, repo.local_md5)
+
+    def test_invalid_zip(self):
+        # Raised in the pool's threads, which must not hang on it
+        self.server.files['/repo.zip'] = 'not a zip'
+        self.assertRaises(RepositoryError, RepositorySet.from_names,
+                          [self.server.url('/repo.zip'),
+                           self.server.url('/missing.zip')], parse=False)
+
+    def test_newest_version_wins(self):
+        repos = self.make_repos()
+        self.assertEqual([
+            ('plugin.video.academicearth', '1.2.1'),
+            ('plugin.video.khanacademy', '1.10.0'),
+            ('script.module.xbmcswift', '0.2.0'),
+            ('script.module.beautifulsoup', '3.0.8'),
+            ('plugin.video.other', '1.0.0'),
+        ], [(addon.id, addon.version) for addon in repos.iter_addons()])
+
+    def test_get(self):
+        repos = self.make_repos()
+        self.assertEqual('1.10.0', repos['plugin.video.khanacademy'].version)
+        self.assertEqual('0.2.0', repos.get('script.module.xbmcswift').version)
+        self.assertEqual(None, repos.get('plugin.video.missing'))
+        self.assertRaises(KeyError, lambda: repos['plugin.video.missing'])
+        self.assertTrue('plugin.video.other' in repos)
+        self.assertEqual(['plugin.video.other', 'plugin.video.academicearth'],
+                         repos.get_many(['plugin.video.other',
+                                         'plugin.video.missing',
+                                         'plugin.video.academicearth']).keys())
+
+    def test_addon_data_urls(self):
+        repos = self.make_repos()
+        khan = repos['plugin.video.khanacademy']
+        self.assertEqual(self.server.url('/other/plugin.video.khanacademy/'
+                                         'plugin.video.khanacademy-1.10.0.zip'),
+                         repos.addon_data_urls(khan)['zip'])
+        swift = repos['script.module.xbmcswift']
+        self.assertEqual(self.server.url('/script.module.xbmcswift/'
+                                         'script.module.xbmcswift-0.2.0.zip'),
+                         repos.addon_data_urls(swift)['zip'])
+
+    def test_search(self):
+        repos = self.make_repos()
+        results = repos.search('name:khan')
+        self.assertEqual([('plugin.video.khanacademy', '1.10.0')],
+                         [(addon.id, addon.version) for _, addon in results])
+        self.assertEqual(['plugin.video.other'],
+                         [addon.id for _, addon in
+                          repos.search('provider:other')])
+
+    def test_dependents(self):
+        repos = self.make_repos()
+        self.assertEqual(['plugin.video.other'],
+                         [addon.id for addon in repos.dependents(
+                             'plugin.video.khanacademy')])
+        self.assertEqual(['plugin.video.academicearth',
+                          'script.module.xbmcswift',
+                          'plugin.video.khanacademy',
+                          'plugin.video.other'],
+                         [addon.id for addon in repos.dependents(
+                             'script.module.beautifulsoup', recursive=True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
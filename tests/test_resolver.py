@@ -0,0 +1,130 @@
+import os
+import unittest
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+from xam.addon import AddonRecord
+from xam.parser import iterparse_addons
+from xam.resolver import Resolver, MISSING, CONFLICT, CYCLE
+from tests.test_repository import RepositoryTestCase
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+
+
+def record(addon_id, version='1.0', dependencies=()):
+    return AddonRecord(addon_id, addon_id, version, None,
+                       OrderedDict(dependencies), {}, {}, (), None, ())
+
+
+class FakeRepo(object):
+    '''A minimal repository of AddonRecords.'''
+
+    def __init__(self, addons):
+        self.addons = addons
+        self.by_id = dict((addon.id, addon) for addon in addons)
+        self.lookups = 0
+
+    def get(self, addon_id, default=None):
+        self.lookups += 1
+        return self.by_id.get(addon_id, default)
+
+    def iter_addons(self):
+        return iter(self.addons)
+
+
+class TestResolver(unittest.TestCase):
+
+    def test_fixture_resolves(self):
+        with open(ADDONS_XML) as inp:
+            repo = FakeRepo([AddonRecord.from_addon(addon)
+                             for addon in iterparse_addons(inp)])
+        resolver = Resolver(repo)
+        resolution = resolver.resolve('plugin.video.academicearth')
+        self.assertTrue(resolution.ok)
+        # Dependencies come before the addons requiring them
+        self.assertEqual(['script.module.beautifulsoup',
+                          'script.module.xbmcswift'],
+                         [addon.id for addon in resolution.closure])
+        self.assertEqual(OrderedDict(), resolver.check())
+        self.assertRaises(KeyError, resolver.resolve, 'plugin.video.missing')
+
+    def test_every_problem_reported(self):
+        repo = FakeRepo([
+            record('plugin.a', dependencies=[('script.b', '2.0'),
+                                             ('script.missing', '1.0'),
+                                             ('xbmc.python', '2.0')]),
+            record('script.b', '1.5', [('script.c', '1.0~beta')]),
+            record('script.c', '1.0~alpha', [('script.d', '1.0')]),
+            record('script.d', '1.0', [('script.c', '1.0')]),
+        ])
+        problems = Resolver(repo).resolve('plugin.a').problems
+        self.assertEqual([
+            (CONFLICT, 'plugin.a', 'script.b'),
+            (MISSING, 'plugin.a', 'script.missing'),
+            (CONFLICT, 'script.b', 'script.c'),
+            (CYCLE, 'script.c', None),
+            (CONFLICT, 'script.d', 'script.c'),
+        ], [(problem.kind, problem.addon_id, problem.dependency_id)
+            for problem in problems])
+        self.assertEqual(('script.c', 'script.d'), problems[3].cycle)
+        self.assertEqual('plugin.a requires script.b 2.0, but the newest '
+                         'version available is 1.5', str(problems[0]))
+
+    def test_cycle_closure(self):
+        repo = FakeRepo([
+            record('a', dependencies=[('b', '1.0')]),
+            record('b', dependencies=[('c', '1.0')]),
+            record('c', dependencies=[('b', '1.0')]),
+            record('d', dependencies=[('d', '1.0')]),
+        ])
+        resolver = Resolver(repo)
+        self.assertEqual(['b', 'c'], [addon.id for addon in
+                                      resolver.resolve('a').closure])
+        self.assertEqual(['c'], [addon.id for addon in
+                                 resolver.resolve('b').closure])
+        self.assertEqual(['a', 'b', 'c', 'd'], resolver.check().keys())
+        self.assertEqual([('d',)], [problem.cycle for problem
+                                    in resolver.resolve('d').problems])
+
+    def test_local_addon(self):
+        repo = FakeRepo([record('script.b', '1.0')])
+        addon = record('plugin.a', dependencies=[('script.b', '1.1')])
+        resolution = Resolver(repo).resolve(addon)
+        self.assertEqual([CONFLICT], [problem.kind for problem
+                                      in resolution.problems])
+        self.assertEqual(['script.b'], [dependency.id for dependency
+                                        in resolution.closure])
+
+    def test_memoized(self):
+        # A long chain with a shared tail is only examined once
+        addons = [record('addon.%d' % i, dependencies=[('addon.%d' % (i + 1),
+                                                        '1.0')])
+                  for i in range(3000)]
+        addons.append(record('addon.3000'))
+        repo = FakeRepo(addons)
+        resolver = Resolver(repo)
+        self.assertEqual(OrderedDict(), resolver.check())
+        # One lookup per addon id and one per dependency
+        self.assertEqual(2 * 3000 + 1, repo.lookups)
+        self.assertEqual(3000, len(resolver.resolve('addon.0').closure))
+
+
+class TestCheckRepository(RepositoryTestCase):
+
+    def test_check_parses_once(self):
+        repo = self.make_repo()
+        parse = repo._parse_elements
+        calls = []
+
+        def counting_parse(*args):
+            calls.append(args)
+            return parse(*args)
+        repo._parse_elements = counting_parse
+        self.assertEqual(OrderedDict(), Resolver(repo).check())
+        self.assertEqual(1, len(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
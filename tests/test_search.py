@@ -0,0 +1,96 @@
+import os
+import unittest
+from xam.parser import iterparse_addons
+from xam.search import tokenize, parse_query, TermIndex, FIELDS
+from tests.test_index import CachedRepoTestCase
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+
+
+def ids(results):
+    return [addon.id for _, addon in results]
+
+
+class TestQuery(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual([u'plugin', u'video', u'khanacademy'],
+                         tokenize('plugin.video.khanacademy'))
+        self.assertEqual([u'jonathan', u'beluch', u'jbel'],
+                         tokenize(u'Jonathan Beluch (jbel)'))
+        self.assertEqual([], tokenize(None))
+
+    def test_parse_query(self):
+        self.assertEqual([(['name'], u'khan'),
+                          (FIELDS.keys(), u'video'),
+                          (FIELDS.keys(), u'foo'), (FIELDS.keys(), u'bar')],
+                         parse_query('Name:Khan video foo:bar'))
+        self.assertEqual([], parse_query('  '))
+
+
+class TestTermIndex(unittest.TestCase):
+
+    def setUp(self):
+        with open(ADDONS_XML) as inp:
+            self.index = TermIndex(iterparse_addons(inp))
+
+    def test_ranking(self):
+        # A match in the id outranks a match in the summary
+        self.assertEqual(['script.module.xbmcswift',
+                          'plugin.video.academicearth',
+                          'plugin.video.khanacademy'],
+                         ids(self.index.search('xbmcswift')))
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(['plugin.video.khanacademy'],
+                         ids(self.index.search('videos khan')))
+        self.assertEqual([], ids(self.index.search('khan scholars')))
+
+    def test_prefix(self):
+        self.assertEqual(['plugin.video.khanacademy'],
+                         ids(self.index.search('khan')))
+
+    def test_case_insensitive(self):
+        self.assertEqual(ids(self.index.search('beautifulsoup')),
+                         ids(self.index.search('BeautifulSoup')))
+
+    def test_field_filters(self):
+        self.assertEqual(['script.module.beautifulsoup'],
+                         ids(self.index.search('provider:leonard')))
+        self.assertEqual([], ids(self.index.search('name:leonard')))
+        self.assertEqual(['plugin.video.khanacademy'],
+                         ids(self.index.search('description:math')))
+        self.assertEqual(['script.module.xbmcswift',
+                          'script.module.beautifulsoup'],
+                         ids(self.index.search('extension:python.module')))
+        self.assertEqual(['plugin.video.academicearth',
+                          'script.module.xbmcswift'],
+                         ids(self.index.search('requires:beautifulsoup')))
+
+    def test_limit(self):
+        self.assertEqual(4, len(self.index.search('xbmc')))
+        self.assertEqual(['script.module.xbmcswift'],
+                         ids(self.index.search('xbmcswift', limit=1)))
+
+
+class TestIndexedSearch(CachedRepoTestCase):
+
+    def test_index_matches_memory(self):
+        repo = self.make_repo()
+        repo.parse_addons()
+        self.assertEqual(None, repo._index)
+
+        indexed = self.make_repo()
+        self.assertNotEqual(None, indexed.load_index())
+        for query in ['xbmcswift', 'khan', 'provider:jbel video',
+                      'extension:module', 'missing']:
+            expected = repo.search(query)
+            results = indexed.search(query)
+            self.assertEqual(ids(expected), ids(results))
+            for (score, _), (expected_score, _) in zip(results, expected):
+                self.assertAlmostEqual(expected_score, score)
+
+
+if __name__ == '__main__':
+    unittest.main()
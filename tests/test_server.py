@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from xam import repos
+from xam.query import Queries
+from xam import server
+from xam.server import QueryServer, Client, ServerError
+from tests.test_repository import RepositoryTestCase
+
+
+class TestQueryServer(RepositoryTestCase):
+
+    def setUp(self):
+        super(TestQueryServer, self).setUp()
+        repos.TEST = (self.server.url('/addons.xml'), self.server.url('/'),
+                      self.server.url('/addons.xml.md5'))
+        self.query_server = QueryServer(('127.0.0.1', 0), [['TEST']],
+                                        interval=None)
+        thread = threading.Thread(target=self.query_server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = Client(self.query_server.url, ['TEST'])
+
+    def tearDown(self):
+        self.query_server.shutdown()
+        self.query_server.server_close()
+        del repos.TEST
+        if hasattr(repos, 'TEST2'):
+            del repos.TEST2
+        super(TestQueryServer, self).tearDown()
+
+    def test_queries_match_local(self):
+        local = Queries.from_names(['TEST'])
+        local.repo.refresh()
+        self.requested()
+        self.assertEqual(local.all(), self.client.all())
+        self.assertEqual(local.all(requires=('xbmc.python', '2.0'),
+                                   sort='version', reverse=True),
+                         self.client.all(requires=('xbmc.python', '2.0'),
+                                         sort='version', reverse=True))
+        self.assertEqual(local.depends('script.module.xbmcswift'),
+                         self.client.depends('script.module.xbmcswift'))
+        self.assertEqual(local.depends('script.module.beautifulsoup', True),
+                         self.client.depends('script.module.beautifulsoup',
+                                             True))
+        self.assertEqual(local.depends('xbmc.python', min_version='2.0'),
+                         self.client.depends('xbmc.python',
+                                             min_version='2.0'))
+        self.assertEqual(local.search('khan academy'),
+                         self.client.search('khan academy'))
+
+        addon = self.client.info('plugin.video.khanacademy')
+        expected = local.info('plugin.video.khanacademy')
+        self.assertEqual(expected.to_dict(), addon.to_dict())
+        self.assertEqual(None, self.client.info('plugin.video.missing'))
+        # Every query was answered from memory
+        self.assertEqual([], self.requested())
+
+    def test_refresh(self):
+        self.assertEqual(False, self.query_server.hot[('TEST',)].refresh())
+        addons_xml = self.addons_xml.replace('version="1.4.2"',
+                                             'version="1.4.3"')
+        self.server.files['/addons.xml'] = addons_xml
+        self.server.files['/addons.xml.md5'] = hashlib.md5(
+            addons_xml).hexdigest()
+        self.query_server.refresh()
+        self.assertEqual(u'1.4.3',
+                         self.client.info('plugin.video.khanacademy').version)
+
+    def test_errors(self):
+        self.assertRaises(ServerError, self.client._query, '/missing')
+        self.assertEqual(400, Client(self.query_server.url, [])
+                         ._get('/all')[0])
+        self.assertRaises(ServerError, Client('http://127.0.0.1:1', ['TEST'])
+                          .all)
+
+    def test_unknown_repo(self):
+        # Only the repositories in xam.repos are loaded, never a url
+        self.requested()
+        status, data = Client(self.query_server.url,
+                              [self.server.url('/repo.zip')])._get('/all')
+        self.assertEqual(400, status)
+        self.assertTrue('Unknown repository' in data['error'])
+        self.assertEqual(400, Client(self.query_server.url, ['TEST', '_x'])
+                         ._get('/all')[0])
+        self.assertEqual([], self.requested())
+
+    def test_repo_key(self):
+        self.assertEqual(len(self.client.all()),
+                         len(Client(self.query_server.url,
+                                    ['test', 'TEST']).all()))
+        self.assertEqual([('TEST',)], self.query_server.hot.keys())
+
+    def test_max_hot(self):
+        repos.TEST2 = repos.TEST
+        self.query_server.max_hot = 1
+        Client(self.query_server.url, ['TEST2', 'TEST']).all()
+        self.assertEqual([('TEST', 'TEST2')], self.query_server.hot.keys())
+        # The same set in another order
+        Client(self.query_server.url, ['TEST', 'TEST2']).all()
+        self.client.all()
+        self.assertEqual([('TEST',)], self.query_server.hot.keys())
+
+    def test_load_outside_lock(self):
+        repos.TEST2 = repos.TEST
+        started, release = threading.Event(), threading.Event()
+        hot_repository = server.HotRepository
+
+        class SlowHotRepository(hot_repository):
+            def __init__(self, reponames):
+                started.set()
+                release.wait(10)
+                hot_repository.__init__(self, reponames)
+
+        server.HotRepository = SlowHotRepository
+        try:
+            loader = threading.Thread(
+                target=Client(self.query_server.url, ['TEST2']).all)
+            loader.start()
+            self.assertTrue(started.wait(10))
+            # The loaded repository answers while TEST2 is being loaded
+            self.assertTrue(Client(self.query_server.url, ['TEST'],
+                                   timeout=2).all())
+            self.assertTrue(loader.is_alive())
+            release.set()
+            loader.join(10)
+        finally:
+            release.set()
+            server.HotRepository = hot_repository
+        self.assertEqual([('TEST',), ('TEST2',)],
+                         self.query_server.hot.keys())
@@ -0,0 +1,54 @@
+import unittest
+from xam import session
+from tests.httpserver import LocalServer
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self._settings = dict(session.SETTINGS)
+        session.configure()
+        session.COUNTERS.reset()
+
+    def tearDown(self):
+        session.configure(**self._settings)
+
+    def test_shared_session(self):
+        self.assertTrue(session.get_session() is session.get_session())
+        old = session.get_session()
+        session.configure(timeout=5)
+        self.assertFalse(old is session.get_session())
+
+    def test_connections_reused(self):
+        with LocalServer({'/addons.xml': '<addons/>'}) as server:
+            for _ in range(3):
+                resp = session.get(server.url('/addons.xml'))
+                self.assertEqual('<addons/>', resp.content)
+        self.assertEqual({'opened': 1, 'reused': 2, 'requests': 3},
+                         session.COUNTERS.to_dict())
+
+    def test_no_keep_alive(self):
+        session.configure(keep_alive=False)
+        with LocalServer({'/addons.xml': '<addons/>'}) as server:
+            for _ in range(2):
+                session.get(server.url('/addons.xml'))
+        self.assertEqual(2, session.COUNTERS.opened)
+
+    def test_default_timeout(self):
+        session.configure(timeout=7)
+        adapter = session.get_session().get_adapter('http://localhost/')
+        self.assertEqual(7, adapter.timeout)
+
+    def test_reserve(self):
+        session.configure(pool_maxsize=2)
+        session.reserve(1)
+        self.assertEqual(2, session.SETTINGS['pool_maxsize'])
+        session.reserve(8)
+        self.assertEqual(8, session.SETTINGS['pool_maxsize'])
+
+    def test_unknown_setting(self):
+        self.assertRaises(TypeError, session.configure, pool=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+import json
+import unittest
+from subprocess import Popen, PIPE
+
+
+# Modules the common commands shouldn't import before running
+SLOW_MODULES = ['requests', 'colorama', 'termcolor', 'multiprocessing',
+                'urllib2', 'BaseHTTPServer', 'xam.download', 'xam.server',
+                'xam.cli.release']
+# Generous upper bound on the startup time of a command, the expected
+# time is about 0.1s, most of it spent importing cliff
+STARTUP_BUDGET = 1.0
+
+
+def startup(argv):
+    '''Returns the JSON summary and the import time report for loading
+    the xam command given in argv in a fresh interpreter.'''
+    proc = Popen([sys.executable, '-m', 'tests.importtime', 'xam.main']
+                 + argv, stdout=PIPE, stderr=PIPE)
+    out, report = proc.communicate()
+    if proc.returncode != 0:
+        raise AssertionError(report)
+    return json.loads(out.splitlines()[-1]), report
+
+
+class TestStartup(unittest.TestCase):
+
+    def assert_fast_startup(self, argv):
+        summary, report = startup(argv)
+        modules = set(summary['modules'])
+        slow = [name for name in SLOW_MODULES if name in modules]
+        self.assertEqual([], slow, 'xam %s imported %s\n%s'
+                         % (' '.join(argv), ', '.join(slow), report))
+        self.assertTrue(summary['seconds'] < STARTUP_BUDGET,
+                        'xam %s took %.3fs to start\n%s'
+                        % (' '.join(argv), summary['seconds'], report))
+
+    def test_all(self):
+        self.assert_fast_startup(['all'])
+
+    def test_info(self):
+        self.assert_fast_startup(['info', 'plugin.video.example'])
+
+    def test_depends(self):
+        self.assert_fast_startup(['depends', 'plugin.video.example'])
+
+    def test_search(self):
+        self.assert_fast_startup(['search', 'example'])
+
+
+if __name__ == '__main__':
+    unittest.main()
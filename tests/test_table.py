@@ -0,0 +1,144 @@
+import os
+import unittest
+from StringIO import StringIO
+from xam.addon import AddonRecord
+from xam.parser import iterparse_addons
+from xam.table import AddonTable, pack_version
+from xam.version import Version
+
+
+ADDONS_XML = os.path.join(os.path.dirname(__file__), 'data', 'addons.xml')
+
+
+class TestPackVersion(unittest.TestCase):
+
+    def test_pack_version(self):
+        self.assertEqual((1, 2, 0, 0, 1), pack_version('1.2'))
+        self.assertEqual(pack_version('1.0'), pack_version('1.0.0'))
+        self.assertEqual((1, 2, 0, 0, 0), pack_version('1.2~beta'))
+        self.assertEqual((0, 1, 0, 0, 1), pack_version('.1'))
+        self.assertEqual((0, 0, 0, 0, 1), pack_version(None))
+        self.assertTrue(pack_version('1.10') > pack_version('1.9'))
+        self.assertTrue(pack_version('1.0~beta') < pack_version('1.0'))
+
+
+class TestAddonTable(unittest.TestCase):
+
+    def setUp(self):
+        with open(ADDONS_XML) as inp:
+            self.addons = [AddonRecord.from_addon(addon)
+                           for addon in iterparse_addons(inp)]
+        self.table = AddonTable.from_addons(self.addons)
+
+    def test_columns(self):
+        table = self.table
+        self.assertEqual(4, len(table))
+        self.assertEqual([addon.id for addon in self.addons],
+                         table.select().ids())
+        self.assertEqual(u'1.4.2', table.version(1))
+        self.assertEqual((1, 4, 2, 0, 1), table.version_key(1))
+        self.assertEqual([(u'xbmc.python', (2, 0, 0, 0, 1)),
+                          (u'script.module.xbmcswift', (0, 2, 0, 0, 1))],
+                         table.dependencies(1))
+        self.assertEqual([u'xbmc.python.module', u'xbmc.addon.metadata'],
+                         table.extension_points(2))
+        self.assertEqual(2, table.find('script.module.xbmcswift'))
+        self.assertEqual(None, table.find('plugin.video.missing'))
+
+    def test_strings_interned(self):
+        table = self.table
+        providers = table.columns['provider']
+        self.assertEqual(providers[0], providers[1])
+        self.assertEqual(1, len([string for string in table.pool.strings
+                                 if string == u'xbmc.python']))
+
+    def test_filters(self):
+        rows = self.table.select()
+        self.assertEqual(['script.module.beautifulsoup'],
+                         rows.provider('Leonard Richardson').ids())
+        self.assertEqual([], rows.provider('Nobody').ids())
+        self.assertEqual(['script.module.xbmcswift',
+                          'script.module.beautifulsoup'],
+                         rows.extension_point('xbmc.python.module').ids())
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy'],
+                         rows.extension_point('xbmc.python.pluginsource')
+                         .provider('Jonathan Beluch (jbel)').ids())
+        self.assertEqual(['plugin.video.khanacademy',
+                          'script.module.beautifulsoup'],
+                         rows.min_version('1.3').ids())
+
+    def test_depends_on(self):
+        rows = self.table.select()
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy',
+                          'script.module.xbmcswift'],
+                         rows.depends_on('xbmc.python', '2.0').ids())
+        self.assertEqual(4, len(rows.depends_on('xbmc.python')))
+        self.assertEqual([], rows.depends_on('xbmc.python', '2.1').ids())
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy'],
+                         self.table.dependents('script.module.xbmcswift')
+                         .ids())
+
+    def test_sort_and_count(self):
+        rows = self.table.select()
+        self.assertEqual(['script.module.xbmcswift',
+                          'plugin.video.academicearth',
+                          'plugin.video.khanacademy',
+                          'script.module.beautifulsoup'],
+                         rows.sort('version').ids())
+        self.assertEqual(['script.module.beautifulsoup',
+                          'plugin.video.khanacademy'],
+                         rows.sort('version', reverse=True).ids()[:2])
+        self.assertEqual(['plugin.video.academicearth',
+                          'plugin.video.khanacademy',
+                          'script.module.beautifulsoup',
+                          'script.module.xbmcswift'],
+                         rows.sort().ids())
+        self.assertEqual({u'Jonathan Beluch (jbel)': 3,
+                          u'Leonard Richardson': 1},
+                         rows.count_by('provider'))
+
+
+class TestVersionOrder(unittest.TestCase):
+    '''The table orders versions like xam.version, also those its packed
+    tuples can't tell apart.'''
+
+    versions = ['1.2.3.4.6', '1.0~beta', '1.0', '1.2.3.4.5', '1.0~alpha',
+                '1.0-1', '1.2.3.4', '1.2.3.4.5~rc1', '0.9', '1.0~beta2',
+                '99999999999', '5000000000.1', '6000000000',
+                '4294967295.2', '4294967295']
+
+    def setUp(self):
+        xml = '<addons>%s</addons>' % ''.join(
+            '<addon id="addon.%d" version="%s" name="a" provider-name="p">'
+            '<requires><import addon="xbmc.python" version="%s"/>'
+            '</requires></addon>' % (i, version, version)
+            for i, version in enumerate(self.versions))
+        self.addons = [AddonRecord.from_addon(addon)
+                       for addon in iterparse_addons(StringIO(xml))]
+        self.table = AddonTable.from_addons(self.addons)
+
+    def ids(self, versions):
+        return ['addon.%d' % self.versions.index(version)
+                for version in versions]
+
+    def test_sort(self):
+        self.assertEqual(self.ids(sorted(self.versions, key=Version)),
+                         self.table.select().sort('version').ids())
+
+    def test_min_version(self):
+        rows = self.table.select()
+        for minimum in ['1.0~beta', '1.2.3.4.5', '1.2.3.4.5~rc2', '1.0',
+                        '5000000000.2', '4294967295.1', '99999999999']:
+            expected = [version for version in self.versions
+                        if Version(version) >= Version(minimum)]
+            self.assertEqual(self.ids(expected),
+                             rows.min_version(minimum).ids())
+            self.assertEqual(self.ids(expected),
+                             rows.depends_on('xbmc.python', minimum).ids())
+
+
+if __name__ == '__main__':
+    unittest.main()
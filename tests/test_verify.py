@@ -0,0 +1,101 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+import zipfile
+from xam.verify import verify_zip, verify_zips, find_addon_xml
+
+
+ADDON_XML = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<addon id="plugin.video.test" name="Test" version="1.0.2" '
+             'provider-name="jbel"/>\n')
+PAYLOAD = 'All work and no play makes Jack a dull boy. ' * 200
+
+
+class TestVerify(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_zip(self, name='test.zip', addon_xml=ADDON_XML):
+        filename = os.path.join(self.tmpdir, name)
+        archive = zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED)
+        archive.writestr('plugin.video.test/addon.xml', addon_xml)
+        archive.writestr('plugin.video.test/default.py', PAYLOAD)
+        archive.writestr('plugin.video.test/resources/addon.xml', '<nope/>')
+        archive.close()
+        return filename
+
+    def md5(self, filename):
+        with open(filename, 'rb') as inp:
+            return hashlib.md5(inp.read()).hexdigest()
+
+    def test_find_addon_xml(self):
+        self.assertEqual('a/addon.xml',
+                         find_addon_xml(['a/b/addon.xml', 'a/addon.xml',
+                                         'a/myaddon.xml']))
+        self.assertEqual(None, find_addon_xml(['a/default.py']))
+
+    def test_valid(self):
+        filename = self.make_zip()
+        result = verify_zip(filename, 'plugin.video.test', '1.0.2',
+                            self.md5(filename) + '  test.zip\n')
+        self.assertTrue(result.ok, result.errors)
+        self.assertEqual('plugin.video.test', result.addon.id)
+
+    def test_corrupt_member(self):
+        filename = self.make_zip()
+        with open(filename, 'rb') as inp:
+            data = inp.read()
+        pos = data.index('Jack')
+        with open(filename, 'wb') as out:
+            out.write(data[:pos] + 'Jill' + data[pos + 4:])
+        result = verify_zip(filename, 'plugin.video.test', '1.0.2')
+        self.assertFalse(result.ok)
+        self.assertEqual(1, len(result.errors))
+        self.assertTrue(result.errors[0].startswith(
+            'plugin.video.test/default.py: Bad CRC-32'), result.errors)
+
+    def test_not_a_zip(self):
+        filename = os.path.join(self.tmpdir, 'test.zip')
+        with open(filename, 'wb') as out:
+            out.write('<html>Not found</html>')
+        result = verify_zip(filename)
+        self.assertFalse(result.ok)
+        self.assertEqual(None, result.addon)
+
+    def test_mismatches(self):
+        filename = self.make_zip()
+        result = verify_zip(filename, 'plugin.video.other', '1.0.3',
+                            '0' * 32)
+        self.assertEqual(3, len(result.errors))
+        self.assertTrue('md5' in result.errors[0])
+        self.assertTrue('plugin.video.other' in result.errors[1])
+        self.assertTrue('1.0.3' in result.errors[2])
+
+    def test_invalid_addon_xml(self):
+        filename = self.make_zip(addon_xml='<addon id="no.version"/>')
+        result = verify_zip(filename)
+        self.assertFalse(result.ok)
+        self.assertTrue('could not be parsed' in result.errors[0])
+
+    def test_verify_zips(self):
+        good = self.make_zip('good.zip')
+        bad = self.make_zip('bad.zip')
+        items = [(good, 'plugin.video.test', '1.0.2', None),
+                 (bad, 'plugin.video.test', '2.0', None)]
+        reported = []
+        for processes in [1, 2]:
+            results = verify_zips(items, processes, reported.append)
+            self.assertEqual([True, False], [r.ok for r in results])
+            self.assertEqual([good, bad], [r.filename for r in results])
+            self.assertEqual('1.0.2', results[1].addon.version)
+        self.assertEqual(4, len(reported))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from xam.addon import AddonRecord
+from xam.version import (Version, parse, compare, newest, newest_by_id,
+                         sort_addons, PRE_RELEASE, FINAL, POST_RELEASE)
+
+
+def record(addon_id, version):
+    return AddonRecord(addon_id, addon_id, version, None, {}, {}, {}, (),
+                       None, ())
+
+
+class TestVersion(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(((1, 2), FINAL, ()), parse('1.2.0'))
+        self.assertEqual(((0, 1), FINAL, ()), parse('.1'))
+        self.assertEqual(((), FINAL, ()), parse('0.0'))
+        self.assertEqual(((1,), PRE_RELEASE, ((1, 0, u'beta'),
+                                              (0, 2, u''))),
+                         parse('1.0.0~beta2'))
+        self.assertEqual(PRE_RELEASE, parse('2.0b1')[1])
+        self.assertEqual(POST_RELEASE, parse('1.0-1')[1])
+        self.assertEqual(((), FINAL, ()), parse(None))
+
+    def test_ordering(self):
+        ordered = ['0.9', '1.0.0~alpha', '1.0~beta', '1.0.0~beta2',
+                   '1.0.0~rc1', '1.0', '1.0.0-1', '1.0.1', '1.10']
+        versions = [Version(string) for string in ordered]
+        self.assertEqual(ordered, [str(version) for version in
+                                   sorted(reversed(versions))])
+        for smaller, larger in zip(versions, versions[1:]):
+            self.assertTrue(smaller < larger, (smaller, larger))
+
+    def test_trailing_zeros(self):
+        self.assertEqual(Version('1.0'), Version('1.0.0'))
+        self.assertEqual(hash(Version('1.0')), hash(Version('1')))
+        self.assertEqual(0, compare('1.0', Version('1.0.0')))
+        self.assertEqual(-1, compare('1.0.0~beta', '1.0'))
+        self.assertEqual(1, compare('1.10', '1.9'))
+        self.assertTrue(Version('1.0') >= '1')
+        self.assertTrue(Version('1.0.0~beta').is_prerelease)
+
+
+class TestBulkVersions(unittest.TestCase):
+
+    def setUp(self):
+        self.addons = [record('a', '1.0'), record('b', '2.0~beta'),
+                       record('a', '1.1'), record('b', '2.0'),
+                       record('a', '1.1.0'), record('c', '0.1')]
+
+    def test_cached_on_record(self):
+        addon = self.addons[0]
+        self.assertTrue(addon.parsed_version is addon.parsed_version)
+        self.assertEqual(Version('1'), addon.parsed_version)
+
+    def test_sort(self):
+        self.assertEqual(['0.1', '1.0', '1.1', '1.1.0', '2.0~beta', '2.0'],
+                         [addon.version for addon
+                          in sort_addons(self.addons)])
+
+    def test_newest(self):
+        self.assertTrue(newest(self.addons) is self.addons[3])
+        # The first of equal versions wins
+        self.assertTrue(newest(self.addons[:5:2]) is self.addons[2])
+        self.assertEqual(None, newest([]))
+
+    def test_newest_by_id(self):
+        found = newest_by_id(self.addons)
+        self.assertEqual(['a', 'b', 'c'], found.keys())
+        self.assertEqual(['1.1', '2.0', '0.1'],
+                         [addon.version for addon in found.values()])
+
+
+if __name__ == '__main__':
+    unittest.main()
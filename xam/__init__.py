@@ -1,6 +1,6 @@
 import repos
-from addon import Addon
-from repository import Repository
+from addon import Addon, AddonRecord
+from repository import Repository, RepositorySet
 
 del addon
 del common
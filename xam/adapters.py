@@ -0,0 +1,73 @@
+'''
+    xam.adapters
+    ------------
+
+    Contains the requests adapter used by the shared session, which
+    applies a default timeout and counts connections and requests. It's
+    imported by xam.session when the session is first created.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import (HTTPConnection,
+                                                   HTTPSConnection)
+from requests.packages.urllib3.connectionpool import (HTTPConnectionPool,
+                                                       HTTPSConnectionPool)
+from requests.packages.urllib3.util.retry import Retry
+from .session import COUNTERS
+
+
+class CountingHTTPConnection(HTTPConnection):
+
+    def connect(self):
+        COUNTERS.incr('opened')
+        return super(CountingHTTPConnection, self).connect()
+
+
+class CountingHTTPSConnection(HTTPSConnection):
+
+    def connect(self):
+        COUNTERS.incr('opened')
+        return super(CountingHTTPSConnection, self).connect()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+
+    ConnectionCls = CountingHTTPConnection
+
+    def _make_request(self, *args, **kwargs):
+        COUNTERS.incr('requests')
+        return super(CountingHTTPConnectionPool, self)._make_request(
+            *args, **kwargs)
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+
+    ConnectionCls = CountingHTTPSConnection
+
+    def _make_request(self, *args, **kwargs):
+        COUNTERS.incr('requests')
+        return super(CountingHTTPSConnectionPool, self)._make_request(
+            *args, **kwargs)
+
+
+class SessionAdapter(HTTPAdapter):
+    '''An HTTPAdapter which applies a default timeout and counts opened
+    connections and sent requests in COUNTERS.'''
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super(SessionAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(SessionAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(SessionAdapter, self).send(request, **kwargs)
@@ -8,6 +8,8 @@
     :license: BSD, see LICENSE for more details.
 
 '''
+import os
+import mmap
 from functools import wraps
 from xml.etree import ElementTree as ET
 try:
@@ -15,6 +17,7 @@ try:
 except ImportError:
     from collective.ordereddict import OrderedDict
 from .common import UnicodeBuilder
+from .version import Version
 
 
 def silence_attr_error(func):
@@ -37,9 +40,13 @@ def silence_attr_error(func):
 class Addon(object):
     '''A class to hold information regarding an XBMC addon.'''
 
-    def __init__(self, xml):
-        '''Intializes an addon object for the provided addon xml'''
+    def __init__(self, xml, xml_bytes=None):
+        '''Intializes an addon object for the provided addon xml. If the
+        xml was parsed from a string, xml_bytes can be the original
+        string, which is returned by to_xml_string until the addon is
+        modified.'''
         self._xml = xml
+        self._xml_bytes = xml_bytes
         # These three properties are required, everything else is optional
         required_attrs = ['id', 'name', 'version']
         for attr in required_attrs:
@@ -48,19 +55,30 @@ class Addon(object):
 
     @classmethod
     def from_filename(cls, filename):
-        xml = ET.parse(filename, parser=UnicodeBuilder())
-        return cls(xml.getroot())
+        with open(filename, 'rb') as inp:
+            data = inp.read()
+        return cls(ET.fromstring(data, parser=UnicodeBuilder()), data)
 
     def __repr__(self):
         return '<Addon %s %s>' % (self.id, self.version)
 
     @property
     def xml(self):
-        '''Returns the root xml element for the addon'''
+        '''Returns the root xml element for the addon. Call
+        xml_modified after changing it.'''
         return self._xml
 
+    def xml_modified(self):
+        '''Forgets the original xml string, to_xml_string serializes the
+        element from now on.'''
+        self._xml_bytes = None
+
     def to_xml_string(self):
-        '''Returns a string containing the addon's xml'''
+        '''Returns a string containing the addon's xml. The original
+        string is returned as is if it's known and the addon wasn't
+        modified.'''
+        if self._xml_bytes is not None:
+            return self._xml_bytes
         return ET.tostring(self.xml, encoding='utf-8')
 
     def _get_version(self):
@@ -70,10 +88,16 @@ class Addon(object):
     def _set_version(self, version):
         '''Sets the addon's version'''
         self.xml.set('version', version)
+        self.xml_modified()
 
     version = property(_get_version, _set_version)
     del _get_version, _set_version
 
+    @property
+    def parsed_version(self):
+        '''Returns the addon's version as a Version'''
+        return Version(self.version)
+
     @property
     def id(self):
         '''Returns the addon's id'''
@@ -108,6 +132,7 @@ class Addon(object):
         addon = self.xml.find('./requires/import[@addon="%s"]' % addon_id)
         if addon is not None:
             addon.set('version', addon_version)
+            self.xml_modified()
 
     @property
     def extensions(self):
@@ -119,17 +144,27 @@ class Addon(object):
             return dict((ext.get('point'), ext) for ext in extensions)
 
     @property
-    @silence_attr_error
+    def extension_items(self):
+        '''Returns a tuple of (attributes, children) tuples for each
+        extension, where attributes is a tuple of (name, value) pairs and
+        children is a tuple of (tag, text) pairs. Summaries and
+        descriptions are left out of children.
+        '''
+        return tuple(
+            (tuple(ext.items()),
+             tuple((child.tag, child.text) for child in ext
+                   if child.tag not in ('summary', 'description')))
+            for ext in self.xml.findall('extension'))
+
+    @property
     def metadata(self):
         '''The addon's metadata xml element'''
-        try:
-            return self.xml.find('./extension[@point="xbmc.addon.metadata"]')
-        except SyntaxError:
-            # ElementTree < 1.3 (python < 2.7) doesn't include xpath support
-            for tag in self.xml.findall('extension'):
-                if tag.get('point') == 'xbmc.addon.metadata':
-                    return tag
-            return None
+        # A plain loop works with every ElementTree version, xpath
+        # predicates need ElementTree >= 1.3
+        for tag in self.xml.findall('extension'):
+            if tag.get('point') == 'xbmc.addon.metadata':
+                return tag
+        return None
 
     #@property
     #@silence_attr_error
@@ -199,18 +234,284 @@ class Addon(object):
         return self.descriptions.get(lang)
 
     def to_dict(self):
+        # The metadata fields are read in a single pass over the metadata
+        # element, they are None if the addon has no metadata
+        summaries = descriptions = platform = None
+        metadata = self.metadata
+        if metadata is not None:
+            summaries, descriptions = OrderedDict(), OrderedDict()
+            for child in metadata:
+                if child.tag == 'summary':
+                    summaries[child.get('lang')] = child.text
+                elif child.tag == 'description':
+                    descriptions[child.get('lang')] = child.text
+                elif child.tag == 'platform' and platform is None:
+                    platform = child.text
+        xml = self._xml_bytes
+        if xml is None:
+            xml = ET.tostring(self.xml)
         return {
             'id': self.id,
             'name': self.name,
             'version': self.version,
             'provider': self.provider,
             'dependencies': self.dependencies,
-            'summaries': self.summaries,
-            'descriptions': self.descriptions,
-            'platform': self.platform,
-            '_xml': ET.tostring(self.xml),
+            'summaries': summaries,
+            'descriptions': descriptions,
+            'platform': platform,
+            '_xml': xml,
         }
 
 
+class FrozenPairs(object):
+    '''A read-only mapping, in insertion order, backed by a tuple of
+    (key, value) pairs. Lookups scan the pairs, which is fast for the
+    handful of dependencies, summaries and descriptions of an addon and
+    takes a fraction of the memory of a dict.
+    '''
+
+    __slots__ = ('_pairs',)
+
+    def __init__(self, pairs=()):
+        super(FrozenPairs, self).__setattr__('_pairs', tuple(pairs))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FrozenPairs is immutable')
+
+    def __getitem__(self, key):
+        for item_key, value in self._pairs:
+            if item_key == key:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        for item_key, value in self._pairs:
+            if item_key == key:
+                return value
+        return default
+
+    def __contains__(self, key):
+        return any(item_key == key for item_key, _ in self._pairs)
+
+    def __iter__(self):
+        return (key for key, _ in self._pairs)
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def keys(self):
+        return [key for key, _ in self._pairs]
+
+    def values(self):
+        return [value for _, value in self._pairs]
+
+    def items(self):
+        return list(self._pairs)
+
+    def iteritems(self):
+        return iter(self._pairs)
+
+    def __eq__(self, other):
+        if not hasattr(other, 'items'):
+            return NotImplemented
+        return dict(self._pairs) == dict(other.items())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'FrozenPairs(%r)' % (self._pairs,)
+
+
+EMPTY_PAIRS = FrozenPairs()
+
+
+def freeze_pairs(mapping):
+    '''Returns a FrozenPairs with the items of mapping, a dict, a
+    sequence of (key, value) pairs or None. Empty mappings share
+    EMPTY_PAIRS.'''
+    if isinstance(mapping, FrozenPairs):
+        return mapping
+    if not mapping:
+        return EMPTY_PAIRS
+    if hasattr(mapping, 'items'):
+        mapping = mapping.items()
+    return FrozenPairs(mapping)
+
+
+class AddonRecord(object):
+    '''An immutable, compact record of an addon. Every field is read once
+    when the record is created, so attribute access never touches the
+    xml. The addon's xml can optionally be read back from its source, an
+    object with an xml_bytes(start, end) method, e.g. the cached
+    addons.xml the addon was parsed from. dependencies, summaries and
+    descriptions are FrozenPairs, the other containers are tuples.
+    '''
+
+    __slots__ = ('id', 'name', 'version', 'provider', 'dependencies',
+                 'summaries', 'descriptions', 'languages', 'platform',
+                 'extension_items', '_source', '_start', '_end', '_addon',
+                 '_version')
+
+    def __init__(self, id, name, version, provider, dependencies,
+                 summaries, descriptions, languages, platform,
+                 extension_items, source=None, start=None, end=None):
+        init = super(AddonRecord, self).__setattr__
+        init('id', id)
+        init('name', name)
+        init('version', version)
+        init('provider', provider)
+        init('dependencies', freeze_pairs(dependencies))
+        init('summaries', freeze_pairs(summaries))
+        init('descriptions', freeze_pairs(descriptions))
+        init('languages', tuple(languages or ()))
+        init('platform', platform)
+        init('extension_items', tuple(extension_items))
+        init('_source', source)
+        init('_start', start)
+        init('_end', end)
+        init('_addon', None)
+        init('_version', None)
+
+    @classmethod
+    def from_addon(cls, addon, source=None, start=None, end=None):
+        '''Returns a record of the provided Addon whose xml is found at
+        [start:end] in source. If no source is given, the addon's xml is
+        serialized up front.'''
+        if source is None:
+            source, start, end = XmlString(addon.to_xml_string()), 0, None
+        return cls(addon.id, addon.name, addon.version, addon.provider,
+                   addon.dependencies, addon.summaries, addon.descriptions,
+                   addon.languages, addon.platform,
+                   addon.extension_items, source, start, end)
+
+    @classmethod
+    def from_element(cls, xml, source=None, start=None, end=None):
+        '''Returns a record for the provided addon xml element.'''
+        return cls.from_addon(Addon(xml), source, start, end)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('AddonRecord is immutable')
+
+    def __repr__(self):
+        return '<Addon %s %s>' % (self.id, self.version)
+
+    def to_xml_string(self):
+        '''Returns a string containing the addon's xml, as found in its
+        source.'''
+        return self._source.xml_bytes(self._start, self._end)
+
+    @property
+    def parsed_version(self):
+        '''Returns the addon's version as a Version. It's parsed on first
+        access and cached on the record.'''
+        if self._version is None:
+            super(AddonRecord, self).__setattr__('_version',
+                                                 Version(self.version))
+        return self._version
+
+    @property
+    def addon(self):
+        '''Returns a full Addon parsed from this addon's xml, for the
+        rarely needed parts of an addon which aren't kept in the
+        record.'''
+        if self._addon is None:
+            data = self.to_xml_string()
+            xml = ET.fromstring(data, parser=UnicodeBuilder())
+            super(AddonRecord, self).__setattr__('_addon', Addon(xml, data))
+        return self._addon
+
+    @property
+    def xml(self):
+        return self.addon.xml
+
+    @property
+    def extensions(self):
+        return self.addon.extensions
+
+    @property
+    def metadata(self):
+        return self.addon.metadata
+
+    def summary(self, lang=None):
+        '''Returns the summary for the provided language code or the
+        first summary available if no language is provided.'''
+        if not lang:
+            try:
+                return self.summaries.values()[0]
+            except IndexError:
+                return None
+        return self.summaries.get(lang)
+
+    def description(self, lang=None):
+        '''Returns the description for the provided language code or the
+        first description available if no language is provided.'''
+        if not lang:
+            try:
+                return self.descriptions.values()[0]
+            except IndexError:
+                return None
+        return self.descriptions.get(lang)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'version': self.version,
+            'provider': self.provider,
+            'dependencies': OrderedDict(self.dependencies.iteritems()),
+            'summaries': OrderedDict(self.summaries.iteritems()),
+            'descriptions': OrderedDict(self.descriptions.iteritems()),
+            'platform': self.platform,
+            '_xml': self.to_xml_string(),
+        }
 
 
+class XmlString(object):
+    '''An xml source for AddonRecords backed by an in memory string.'''
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def xml_bytes(self, start, end):
+        '''Returns the bytes found at [start:end].'''
+        return self.data[start:end]
+
+
+class XmlFile(object):
+    '''An xml source for AddonRecords backed by a file. The file is
+    memory mapped as soon as the XmlFile is created, from fileobj if
+    given, so the records' offsets keep pointing into that file even if
+    it's replaced afterwards, e.g. by a refresh or by another xam process
+    updating the cache.'''
+
+    def __init__(self, filename, fileobj=None):
+        self.filename = filename
+        if fileobj is None:
+            with open(filename, 'rb') as inp:
+                self._map(inp)
+        else:
+            self._map(fileobj)
+
+    def _map(self, fileobj):
+        stat = os.fstat(fileobj.fileno())
+        # Identifies the mapped file, see parallel.parse_shard
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_size,
+                         stat.st_mtime)
+        if stat.st_size == 0:
+            # Empty files can't be memory mapped
+            self.data = ''
+        else:
+            self.data = mmap.mmap(fileobj.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+    def xml_bytes(self, start, end):
+        '''Returns the bytes found at [start:end] in the file.'''
+        return self.data[start:end]
@@ -0,0 +1,265 @@
+'''
+    xam.build
+    ---------
+
+    Contains the RepositoryBuilder which builds a repository from
+    directories of addon sources. Each addon is zipped to
+    <id>/<id>-<version>.zip, next to its icon, fanart and changelog, which
+    is the layout Repository.addon_data_urls expects, and an addons.xml
+    and addons.xml.md5 are written for all of them.
+
+    Addons are scanned and zipped by a pool of processes. A manifest in
+    the output directory records the size, mtime and md5 of every source
+    file, so a rebuild only hashes the files whose size or mtime changed
+    and only zips the addons whose contents changed.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import zipfile
+from .addon import Addon
+from .common import write_atomic, file_md5
+from .mirror import write_addons_xml
+
+
+MANIFEST = '.xam-build.json'
+MANIFEST_VERSION = 1
+IGNORED_DIRS = set(['.git', '.hg', '.svn', '.bzr'])
+IGNORED_FILES_RE = re.compile(r'(\.py[co]|~|\.swp|^\.DS_Store|^Thumbs\.db)$')
+XML_DECLARATION_RE = re.compile(r'^\s*<\?xml[^>]*\?>\s*')
+# Assets copied next to the zip, (source filename, published filename)
+ASSETS = [('icon.png', 'icon.png'), ('fanart.jpg', 'fanart.jpg'),
+          ('changelog.txt', 'changelog-%s.txt')]
+
+
+def find_addon_dirs(sources):
+    '''Returns the addon directories in sources. Each source is either an
+    addon directory, containing an addon.xml, or a directory of addon
+    directories.'''
+    found = []
+    for source in sources:
+        source = os.path.abspath(source)
+        if os.path.exists(os.path.join(source, 'addon.xml')):
+            found.append(source)
+            continue
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.exists(os.path.join(path, 'addon.xml')):
+                found.append(path)
+    return found
+
+
+def source_files(path):
+    '''Returns a sorted list of (relative path, size, mtime) tuples for
+    the files of the addon at path. Version control directories and
+    compiled or backup files are skipped.'''
+    found = []
+    for root, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(name for name in dirnames
+                             if name not in IGNORED_DIRS)
+        for name in filenames:
+            if IGNORED_FILES_RE.search(name):
+                continue
+            filename = os.path.join(root, name)
+            stat = os.stat(filename)
+            relpath = os.path.relpath(filename, path).replace(os.sep, '/')
+            found.append((relpath, stat.st_size, stat.st_mtime))
+    found.sort()
+    return found
+
+
+def addon_entry(filename):
+    '''Returns the contents of an addon.xml without its xml declaration,
+    ready to be listed in an addons.xml.'''
+    with open(filename, 'rb') as inp:
+        return XML_DECLARATION_RE.sub('', inp.read()).strip()
+
+
+def scan_addon(item):
+    '''Pool worker which scans an addon directory. item is a (path,
+    files) tuple, where files are the addon's files recorded in the
+    manifest. A file's md5 is reused if its size and mtime are unchanged.
+    Returns a dict with the addon's id, version, addons.xml entry, files
+    and a digest of all of its files, or with an error.'''
+    path, previous = item
+    try:
+        addon = Addon.from_filename(os.path.join(path, 'addon.xml'))
+        files = {}
+        digest = hashlib.md5()
+        for relpath, size, mtime in source_files(path):
+            known = previous.get(relpath)
+            if known is not None and known[:2] == [size, mtime]:
+                md5 = known[2]
+            else:
+                md5 = file_md5(os.path.join(path, relpath))
+            files[relpath] = [size, mtime, md5]
+            digest.update('%s\0%s\n' % (relpath, md5))
+        return {'path': path, 'id': addon.id, 'version': addon.version,
+                'entry': addon_entry(os.path.join(path, 'addon.xml')),
+                'files': files, 'digest': digest.hexdigest()}
+    except Exception, exc:
+        return {'path': path, 'error': str(exc)}
+
+
+def zip_addon(item):
+    '''Pool worker which zips an addon. item is a (path, addon id, list
+    of relative paths, zip filename) tuple. Members are stored under a
+    directory named after the addon id. Returns None or an error.'''
+    path, addon_id, relpaths, zip_filename = item
+    tmp_filename = zip_filename + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp_filename, 'w', zipfile.ZIP_DEFLATED) as out:
+            for relpath in relpaths:
+                out.write(os.path.join(path, *relpath.split('/')),
+                          '%s/%s' % (addon_id, relpath))
+        if os.name == 'nt' and os.path.exists(zip_filename):
+            os.remove(zip_filename)
+        os.rename(tmp_filename, zip_filename)
+    except (IOError, OSError, zipfile.LargeZipFile), exc:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return str(exc)
+    return None
+
+
+class BuildResult(object):
+    '''The outcome of a build. built and unchanged are lists of addon
+    ids and errors is a list of (addon directory, error) tuples.'''
+
+    def __init__(self):
+        self.built = []
+        self.unchanged = []
+        self.errors = []
+
+
+class RepositoryBuilder(object):
+    '''Builds a repository in directory from the addons found in sources,
+    see find_addon_dirs.
+
+    :param processes: The number of processes which scan and zip addons,
+                      by default one per CPU. If 1, no processes are
+                      started.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, sources, directory, processes=None):
+        self.sources = sources
+        self.directory = directory
+        self.processes = processes
+
+    @property
+    def manifest_fn(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def load_manifest(self):
+        '''Returns the addons recorded by the last build, a dict of addon
+        id -> dict of source, version, digest and files.'''
+        try:
+            with open(self.manifest_fn) as inp:
+                manifest = json.load(inp)
+        except (IOError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest['addons']
+
+    def save_manifest(self, addons):
+        write_atomic(self.manifest_fn, json.dumps({
+            'version': MANIFEST_VERSION,
+            'addons': addons,
+        }, sort_keys=True))
+
+    def zip_filename(self, addon_id, version):
+        return os.path.join(self.directory, addon_id,
+                            '%s-%s.zip' % (addon_id, version))
+
+    def copy_assets(self, scanned):
+        '''Copies an addon's icon, fanart and changelog next to its zip.'''
+        for source_name, name in ASSETS:
+            filename = os.path.join(scanned['path'], source_name)
+            if os.path.exists(filename):
+                if '%s' in name:
+                    name = name % scanned['version']
+                shutil.copy2(filename, os.path.join(self.directory,
+                                                    scanned['id'], name))
+
+    def build(self):
+        '''Builds or updates the repository and returns a BuildResult.
+        Addons which fail to scan or zip are left out of addons.xml and
+        retried by the next build.'''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        previous = self.load_manifest()
+        previous_files = dict((addon['source'], addon['files'])
+                              for addon in previous.values())
+        items = [(path, previous_files.get(path, {}))
+                 for path in find_addon_dirs(self.sources)]
+
+        pool = None
+        if self.processes != 1 and len(items) > 1:
+            # Only a build of several addons needs a process pool
+            from multiprocessing import Pool
+            pool = Pool(self.processes)
+        pool_map = pool.map if pool is not None else map
+        try:
+            result = BuildResult()
+            addons, pending = {}, []
+            for scanned in pool_map(scan_addon, items):
+                if 'error' in scanned:
+                    result.errors.append((scanned['path'], scanned['error']))
+                    continue
+                if scanned['id'] in addons:
+                    result.errors.append((scanned['path'],
+                        '%s is also found in %s' % (
+                            scanned['id'], addons[scanned['id']]['source'])))
+                    continue
+                addons[scanned['id']] = {
+                    'source': scanned['path'],
+                    'version': scanned['version'],
+                    'digest': scanned['digest'],
+                    'files': scanned['files'],
+                    'entry': scanned['entry'],
+                }
+                known = previous.get(scanned['id'], {})
+                zip_filename = self.zip_filename(scanned['id'],
+                                                 scanned['version'])
+                if (known.get('digest') == scanned['digest'] and
+                        known.get('version') == scanned['version'] and
+                        os.path.exists(zip_filename)):
+                    result.unchanged.append(scanned['id'])
+                else:
+                    pending.append(scanned)
+
+            for scanned in pending:
+                addon_dir = os.path.join(self.directory, scanned['id'])
+                if not os.path.isdir(addon_dir):
+                    os.mkdir(addon_dir)
+            errors = pool_map(zip_addon, [
+                (scanned['path'], scanned['id'], sorted(scanned['files']),
+                 self.zip_filename(scanned['id'], scanned['version']))
+                for scanned in pending])
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        for scanned, error in zip(pending, errors):
+            if error is not None:
+                result.errors.append((scanned['path'], error))
+                del addons[scanned['id']]
+                continue
+            self.copy_assets(scanned)
+            result.built.append(scanned['id'])
+
+        write_addons_xml(os.path.join(self.directory, 'addons.xml'),
+                         [addons[addon_id].pop('entry')
+                          for addon_id in sorted(addons)])
+        self.save_manifest(addons)
+        return result
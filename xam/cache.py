@@ -0,0 +1,356 @@
+'''
+    xam.cache
+    ---------
+
+    Contains the managed cache of downloaded files in ~/.xam_cache. Each
+    url is cached under its urlsafe base64 encoding, and the files
+    derived from it, e.g. the .meta, .idx and .changes.json of an
+    addons.xml, share that name up to the first dot. Together they make
+    up one cache entry, which is evicted as a whole.
+
+    A manifest records the origin url, size and last access of every
+    entry. It's shared by every xam process: the use of an entry is
+    recorded in the manifest when it's opened, under a lock, and the
+    least recently used entries are evicted once a command is done until
+    the cache fits its byte budget. Entries which may be in use by
+    another process are never evicted, see Cache.in_use. Entries missing
+    from the manifest, e.g. cached by an older xam, are counted with the
+    newest atime or mtime of their files as their last access.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import re
+import json
+import time
+import base64
+import logging
+import threading
+from contextlib import contextmanager
+from .common import write_atomic, lock_file, fcntl
+
+
+log = logging.getLogger(__name__)
+
+SETTINGS = {
+    # Byte budget of the cache, 0 for no limit
+    'max_size': 512 * 1024 * 1024,
+}
+
+# Environment variable with the default byte budget
+CACHE_SIZE_ENV = 'XAM_CACHE_SIZE'
+MANIFEST = 'manifest.json'
+MANIFEST_LOCK = MANIFEST + '.lock'
+MANIFEST_VERSION = 1
+# Seconds between two records of the use of an entry by one process
+ACCESS_INTERVAL = 60
+# Seconds an entry is considered in use by another process after its
+# last recorded use
+IN_USE_TIME = 10 * 60
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.I)
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3,
+              't': 1024 ** 4}
+
+_lock = threading.Lock()
+# Entry name -> (url, time) of the entries used by this process
+_accessed = {}
+# Entry name -> time the use of the entry was last recorded in the
+# manifest by this process
+_recorded = {}
+
+
+def configure(max_size=None):
+    '''Sets the byte budget of the cache. 0 means no limit.'''
+    if max_size is not None:
+        SETTINGS['max_size'] = max_size
+
+
+def parse_size(inp):
+    '''Returns the number of bytes of a size given as a number of bytes
+    or with a K, M, G or T suffix, e.g. 512M.'''
+    match = SIZE_RE.match(inp)
+    if match is None:
+        raise ValueError('Invalid size %r' % inp)
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.lower()])
+
+
+def format_size(size):
+    '''Returns a human readable size for size bytes.'''
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024.0
+    return '%.1f TB' % size
+
+
+def cache_dir():
+    '''Returns the absolute path of the xam cache folder.'''
+    return os.path.join(os.getenv('HOME'), '.xam_cache')
+
+
+def cache_fn(filename):
+    '''Returns an absolute filename in the xam cache folder for the
+    given base filename.
+    '''
+    return os.path.join(cache_dir(), filename)
+
+
+def safe_cache_fn(key):
+    '''Returns an absolute path name for a cached file based on the
+    provided key. The same file will always be returned for a given
+    key. key, usually the url the file is downloaded from, is recorded
+    as used by this process.
+    '''
+    name = base64.urlsafe_b64encode(key)
+    touch(name, key)
+    return cache_fn(name)
+
+
+def touch(name, url=None):
+    '''Records the entry name as used now, in memory and, at most every
+    ACCESS_INTERVAL seconds, in the shared manifest so other processes
+    know it's in use.'''
+    now = time.time()
+    with _lock:
+        _accessed[name] = (url, now)
+        if now - _recorded.get(name, 0) < ACCESS_INTERVAL:
+            return
+        _recorded[name] = now
+    try:
+        Cache().record_access(name, url, now)
+    except (IOError, OSError):
+        log.debug('* Could not record the use of %s', url or name)
+
+
+def entry_name(filename):
+    '''Returns the name of the entry a cached file belongs to.'''
+    return filename.split('.', 1)[0]
+
+
+def entry_url(name):
+    '''Returns the url an entry was cached for, or None if name isn't one
+    given by safe_cache_fn to a url.'''
+    try:
+        url = base64.urlsafe_b64decode(name)
+    except (TypeError, ValueError):
+        return None
+    if base64.urlsafe_b64encode(url) == name and '://' in url:
+        return url
+    return None
+
+
+class CacheEntry(object):
+    '''The files cached for a url. recorded is the last use recorded in
+    the manifest or by this process, file_time the newest atime or mtime
+    of the files and accessed the later of both.'''
+
+    def __init__(self, name, url=None, recorded=0):
+        self.name = name
+        self.url = url
+        self.recorded = recorded
+        self.file_time = 0
+        self.size = 0
+        self.filenames = []
+
+    @property
+    def accessed(self):
+        return max(self.recorded, self.file_time)
+
+    def to_dict(self):
+        return {'url': self.url, 'size': self.size,
+                'accessed': self.accessed}
+
+
+class Cache(object):
+    '''The cache folder at directory, by default ~/.xam_cache.
+
+    :param max_size: The byte budget of the cache, 0 for no limit.
+                     Defaults to the configured budget.
+    '''
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or cache_dir()
+        if max_size is None:
+            max_size = SETTINGS['max_size']
+        self.max_size = max_size
+
+    @property
+    def manifest_fn(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def load_manifest(self):
+        '''Returns the entries recorded in the manifest, a dict of entry
+        name -> dict of url, size and accessed.'''
+        try:
+            with open(self.manifest_fn) as inp:
+                manifest = json.load(inp)
+        except (IOError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest['entries']
+
+    def save_manifest(self, entries):
+        self._write_manifest(dict((entry.name, entry.to_dict())
+                                  for entry in entries))
+
+    def _write_manifest(self, entries):
+        write_atomic(self.manifest_fn, json.dumps({
+            'version': MANIFEST_VERSION,
+            'entries': entries,
+        }, sort_keys=True))
+
+    @contextmanager
+    def locked(self):
+        '''Holds the manifest's lock, so the manifest is read and updated
+        by one process at a time. Not locked on Windows.'''
+        if fcntl is None:
+            yield
+            return
+        lock = lock_file(os.path.join(self.directory, MANIFEST_LOCK), True)
+        try:
+            yield
+        finally:
+            lock.close()
+
+    def record_access(self, name, url=None, accessed=None):
+        '''Records the use of the entry name in the manifest.'''
+        if not os.path.isdir(self.directory):
+            return
+        if accessed is None:
+            accessed = time.time()
+        with self.locked():
+            entries = self.load_manifest()
+            entry = entries.setdefault(name, {'size': 0})
+            entry['url'] = url or entry.get('url')
+            entry['accessed'] = max(entry.get('accessed', 0), accessed)
+            self._write_manifest(entries)
+
+    def entries(self):
+        '''Returns the entries found in the cache folder, least recently
+        used first. The last access of an entry is the latest of the one
+        recorded in the manifest or by this process and the mtime of its
+        newest file.'''
+        try:
+            filenames = os.listdir(self.directory)
+        except OSError:
+            return []
+        recorded = self.load_manifest()
+        with _lock:
+            accessed = dict(_accessed)
+
+        found = {}
+        for filename in filenames:
+            name = entry_name(filename)
+            if name == entry_name(MANIFEST):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                # Removed by another process
+                continue
+            if name not in found:
+                info = recorded.get(name, {})
+                found[name] = CacheEntry(name,
+                                         info.get('url') or entry_url(name),
+                                         info.get('accessed', 0))
+                if name in accessed:
+                    url, atime = accessed[name]
+                    found[name].url = url or found[name].url
+                    found[name].recorded = max(found[name].recorded, atime)
+            entry = found[name]
+            entry.size += stat.st_size
+            entry.file_time = max(entry.file_time, stat.st_atime,
+                                  stat.st_mtime)
+            entry.filenames.append(filename)
+        return sorted(found.values(), key=lambda entry: entry.accessed)
+
+    def size(self, entries=None):
+        '''Returns the total size of entries, by default of the whole
+        cache.'''
+        if entries is None:
+            entries = self.entries()
+        return sum(entry.size for entry in entries)
+
+    def remove(self, entry):
+        '''Removes the files of entry.'''
+        for filename in entry.filenames:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+
+    def in_use(self, entry, now=None):
+        '''Returns True if entry may be in use by another process: its
+        last use, recorded or seen on its files, is less than IN_USE_TIME
+        seconds old, or its files were read or written after its last
+        recorded use, i.e. by a process which didn't record it.'''
+        if now is None:
+            now = time.time()
+        if now - entry.accessed < IN_USE_TIME:
+            return True
+        return bool(entry.recorded and
+                    entry.file_time > entry.recorded + ACCESS_INTERVAL)
+
+    def prune(self, max_size=None):
+        '''Evicts the least recently used entries until the cache fits in
+        max_size bytes, by default its budget. Entries used by this
+        process or which may be in use by another one are kept. Returns
+        the list of evicted entries.'''
+        if max_size is None:
+            max_size = self.max_size
+        if not max_size:
+            return []
+        with self.locked():
+            return self._prune(max_size)
+
+    def _prune(self, max_size):
+        entries = self.entries()
+        size = self.size(entries)
+        with _lock:
+            used = set(_accessed)
+        now = time.time()
+        evicted = []
+        for entry in entries:
+            if size <= max_size:
+                break
+            if entry.name in used or self.in_use(entry, now):
+                continue
+            log.debug('* Evicting %s (%d bytes)', entry.url or entry.name,
+                      entry.size)
+            self.remove(entry)
+            size -= entry.size
+            evicted.append(entry)
+        if evicted:
+            self.save_manifest([entry for entry in entries
+                                if entry not in evicted])
+        return evicted
+
+    def clear(self):
+        '''Removes every entry and the manifest. Returns the list of
+        removed entries.'''
+        with self.locked():
+            entries = self.entries()
+            for entry in entries:
+                self.remove(entry)
+            for filename in [self.manifest_fn,
+                             os.path.join(self.directory, MANIFEST_LOCK)]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+        return entries
+
+    def sync(self):
+        '''Records the entries used by this process in the manifest,
+        evicts the least recently used entries if the cache is over its
+        budget and returns the evicted entries.'''
+        if not os.path.isdir(self.directory):
+            return []
+        with self.locked():
+            evicted = self._prune(self.max_size) if self.max_size else []
+            with _lock:
+                used = bool(_accessed)
+            if used and not evicted:
+                self.save_manifest(self.entries())
+        return evicted
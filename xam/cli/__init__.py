@@ -1,9 +1,15 @@
 import os
+import time
 import logging
-from urllib import urlretrieve
 from cliff.command import Command
 from xam import repos
 from xam.repository import get_repo
+from xam.resolver import Resolver
+from xam.query import get_queries, SERVER_ENV
+from xam.formats import FORMATS, DEFAULT_FORMAT, write_rows
+# Modules which are slow to import, e.g. xam.download which needs
+# requests, are imported by the commands using them, so the other
+# commands start quickly.
 
 
 REPO_NAMES = [attr for attr in repos.__dict__.keys()
@@ -14,9 +20,65 @@ def uppercase(inp):
     return inp.upper()
 
 
+DEFAULT_REPO = 'FRODO'
+
+
 def add_repo_arg(parser):
     parser.add_argument('--repo', type=uppercase, choices=REPO_NAMES,
-                        default='FRODO')
+                        action='append',
+                        help='Repository to use. Can be given more than '
+                             'once, in which case the newest version of '
+                             'each addon wins. Defaults to %s.'
+                             % DEFAULT_REPO)
+
+
+def repo_names(parsed_args):
+    '''Returns the list of repository names given with --repo.'''
+    return parsed_args.repo or [DEFAULT_REPO]
+
+
+def add_server_arg(parser):
+    parser.add_argument('--server', default=os.getenv(SERVER_ENV),
+                        help='Url of a running `xam serve` to send the '
+                             'query to instead of loading the repository. '
+                             'Defaults to $%s.' % SERVER_ENV)
+
+
+def queries(parsed_args):
+    '''Returns the Queries, or server Client, for the repositories given
+    with --repo and the server given with --server.'''
+    return get_queries(repo_names(parsed_args), parsed_args.server)
+
+
+def add_format_arg(parser):
+    parser.add_argument('--format', '-f', choices=FORMATS.keys(),
+                        default=DEFAULT_FORMAT,
+                        help='Output format. msgpack needs msgpack-python.')
+
+
+# The columns of an addon in the machine readable formats
+INFO_COLUMNS = ['id', 'name', 'version', 'provider', 'platform',
+                'dependencies', 'summaries', 'descriptions', 'xml']
+
+
+def addon_row(addon):
+    '''Returns the values of INFO_COLUMNS for an addon.'''
+    data = addon.to_dict()
+    data['xml'] = data.pop('_xml')
+    return [data[column] for column in INFO_COLUMNS]
+
+
+# The columns of a dependency problem and of a change
+PROBLEM_COLUMNS = ['id', 'version', 'kind', 'dependency', 'required',
+                   'available', 'cycle', 'problem']
+CHANGE_COLUMNS = ['repo', 'change', 'id', 'old_version', 'version']
+
+
+def problem_row(addon, problem):
+    '''Returns the values of PROBLEM_COLUMNS for a problem of addon.'''
+    return [addon.id, addon.version, problem.kind, problem.dependency_id,
+            problem.required, problem.available,
+            list(problem.cycle) if problem.cycle else None, str(problem)]
 
 
 def generate_addon_output(addon):
@@ -29,6 +91,13 @@ def generate_addon_output(addon):
     return '\n'.join(lines)
 
 
+def requirement(inp):
+    '''Returns an (addon id, minimum version) tuple for an ADDON_ID or
+    ADDON_ID:MIN_VERSION argument.'''
+    addon_id, _, min_version = inp.partition(':')
+    return addon_id, min_version or None
+
+
 class ListAddons(Command):
     '''List addon id and addon version for every addon in the provided
     repo.
@@ -39,16 +108,33 @@ class ListAddons(Command):
     def get_parser(self, prog_name):
         parser = super(ListAddons, self).get_parser(prog_name)
         add_repo_arg(parser)
+        parser.add_argument('--provider',
+                            help='Only list addons by this provider.')
+        parser.add_argument('--point',
+                            help='Only list addons with an extension for '
+                                 'this extension point, e.g. '
+                                 'xbmc.python.pluginsource.')
+        parser.add_argument('--requires', type=requirement,
+                            metavar='ADDON_ID[:MIN_VERSION]',
+                            help='Only list addons which require this '
+                                 'addon, optionally at least this version.')
+        parser.add_argument('--sort', default='id',
+                            choices=['id', 'name', 'provider', 'version'])
+        parser.add_argument('--reverse', action='store_true')
+        add_server_arg(parser)
+        add_format_arg(parser)
         return parser
 
     def take_action(self, parsed_args):
+        reponames = repo_names(parsed_args)
         self.log.debug('Showing addon ids and versions for %s repo.'
-                      % parsed_args.repo)
-
-        repo = get_repo(parsed_args.repo)
-        for addon in sorted(repo.addons, key=lambda addon: addon.id):
-            self.app.stdout.write('%s %s\n' % (addon.id, addon.version))
+                      % ', '.join(reponames))
 
+        addons = queries(parsed_args).all(
+            parsed_args.provider, parsed_args.point, parsed_args.requires,
+            parsed_args.sort, parsed_args.reverse)
+        write_rows(parsed_args.format, self.app.stdout, ['id', 'version'],
+                   addons)
 
 
 class ShowAddonInfo(Command):
@@ -59,24 +145,27 @@ class ShowAddonInfo(Command):
     def get_parser(self, prog_name):
         parser = super(ShowAddonInfo, self).get_parser(prog_name)
         add_repo_arg(parser)
+        add_server_arg(parser)
+        add_format_arg(parser)
         parser.add_argument('addon_id')
         return parser
 
     def take_action(self, parsed_args):
         addonid = parsed_args.addon_id
-        reponame = parsed_args.repo
+        reponames = repo_names(parsed_args)
 
-        self.log.debug('Showing info for %s in %s' % (addonid, reponame))
+        self.log.debug('Showing info for %s in %s'
+                       % (addonid, ', '.join(reponames)))
 
-        repo = get_repo(reponame)
-        try:
-            addon = (addon for addon in repo.addons
-                     if addon.id == addonid).next()
-        except StopIteration:
+        addon = queries(parsed_args).info(addonid)
+        if addon is None:
             raise RuntimeError('No addon found with id %s' % addonid)
 
-        self.app.stdout.write(generate_addon_output(addon))
-
+        if parsed_args.format == 'text':
+            self.app.stdout.write(generate_addon_output(addon))
+        else:
+            write_rows(parsed_args.format, self.app.stdout, INFO_COLUMNS,
+                       [addon_row(addon)])
 
 
 class ShowDependentAddons(Command):
@@ -89,22 +178,116 @@ class ShowDependentAddons(Command):
     def get_parser(self, prog_name):
         parser = super(ShowDependentAddons, self).get_parser(prog_name)
         add_repo_arg(parser)
+        parser.add_argument('--recursive', action='store_true',
+                            help='Include addons which depend on the addon '
+                                 'indirectly.')
+        parser.add_argument('--min-version',
+                            help='Only list addons which require at least '
+                                 'this version of the addon.')
+        add_server_arg(parser)
+        add_format_arg(parser)
         parser.add_argument('addon_id')
         return parser
 
     def take_action(self, parsed_args):
         addonid = parsed_args.addon_id
-        reponame = parsed_args.repo
+        reponames = repo_names(parsed_args)
 
         self.log.debug('Listing dependent addons for info for %s in %s'
-                       % (addonid, reponame))
+                       % (addonid, ', '.join(reponames)))
 
-        repo = get_repo(reponame)
-        dependents = [addon for addon in repo.addons
-                      if addonid in addon.dependencies.keys()]
+        if parsed_args.min_version and parsed_args.recursive:
+            raise RuntimeError('--min-version can\'t be combined with '
+                               '--recursive')
+        dependents = queries(parsed_args).depends(
+            addonid, parsed_args.recursive, parsed_args.min_version)
 
-        for addon in dependents:
-            self.app.stdout.write('%s %s\n' % (addon.id, addon.version))
+        write_rows(parsed_args.format, self.app.stdout, ['id', 'version'],
+                   dependents)
+
+
+class CheckDependencies(Command):
+    '''Checks that the complete dependency tree of the provided addons,
+    or of every addon with --all, can be satisfied by the repo. Every
+    missing dependency, dependency which is too old and dependency cycle
+    is listed. Exits with a status of 1 if any problem was found.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(CheckDependencies, self).get_parser(prog_name)
+        add_repo_arg(parser)
+        parser.add_argument('--all', action='store_true',
+                            help='Check every addon in the repository.')
+        add_format_arg(parser)
+        parser.add_argument('addon_id', nargs='*')
+        return parser
+
+    def take_action(self, parsed_args):
+        if not parsed_args.all and not parsed_args.addon_id:
+            raise RuntimeError('Provide addon ids to check or use --all.')
+        reponames = repo_names(parsed_args)
+
+        repo = get_repo(reponames, parse=False)
+        resolver = Resolver(repo)
+        addonids = None if parsed_args.all else parsed_args.addon_id
+        for addonid in addonids or []:
+            if repo.get(addonid) is None:
+                raise RuntimeError("Couldn't find %s in %s"
+                                   % (addonid, ', '.join(reponames)))
+
+        found = resolver.check(addonids)
+        if parsed_args.format == 'text':
+            for addonid, problems in found.items():
+                self.app.stdout.write('%s %s\n'
+                                      % (addonid, repo.get(addonid).version))
+                for problem in problems:
+                    self.app.stdout.write('  * %s\n' % problem)
+        else:
+            write_rows(parsed_args.format, self.app.stdout, PROBLEM_COLUMNS,
+                       [problem_row(repo.get(addonid), problem)
+                        for addonid, problems in found.items()
+                        for problem in problems])
+
+        self.log.info('* %d addons with unsatisfiable dependencies'
+                      % len(found))
+        return 1 if found else 0
+
+
+class ShowChanges(Command):
+    '''Updates the repo and lists the changes between the last two
+    versions of its addons.xml: added (+), removed (-), upgraded (^) and
+    modified (~) addons. With --format, every change of every repo is
+    written as a row instead.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(ShowChanges, self).get_parser(prog_name)
+        add_repo_arg(parser)
+        add_format_arg(parser)
+        return parser
+
+    def take_action(self, parsed_args):
+        rows = []
+        for reponame in repo_names(parsed_args):
+            changes = get_repo(reponame, parse=False).changes()
+            if changes is None:
+                self.log.info('* No changes recorded for %s yet' % reponame)
+                continue
+            if parsed_args.format != 'text':
+                rows.extend((reponame,) + row for row in changes.rows())
+                continue
+            self.log.info('* %s: %d changes from %s to %s'
+                          % (reponame, len(changes), changes.old_checksum,
+                             changes.new_checksum))
+            for line in changes.lines():
+                self.app.stdout.write(line + '\n')
+        if parsed_args.format != 'text':
+            write_rows(parsed_args.format, self.app.stdout, CHANGE_COLUMNS,
+                       rows)
 
 
 class GetAddon(Command):
@@ -117,19 +300,70 @@ class GetAddon(Command):
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
+        from xam.download import DEFAULT_JOBS
         parser = super(GetAddon, self).get_parser(prog_name)
         add_repo_arg(parser)
+        parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                            help='Number of files to download at once.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Check the downloaded zips for corrupt '
+                                 'members and a mismatched addon.xml.')
+        parser.add_argument('--md5', action='store_true',
+                            help='Also download each zip\'s published md5 '
+                                 'and check it. Implies --verify.')
         parser.add_argument('addon_id', nargs='+')
         return parser
 
+    def report(self, result):
+        '''Logs the outcome of a single download.'''
+        if result.ok:
+            self.log.info('* Downloaded %s (%d bytes, %s)'
+                          % (result.filename, result.size, result.rate))
+        else:
+            self.log.warning('* Failed to download %s: %s'
+                             % (result.url, result.error))
+
+    def report_verification(self, result):
+        '''Logs the outcome of verifying a single zip.'''
+        if result.ok:
+            self.log.info('* Verified %s' % result.filename)
+        else:
+            for error in result.errors:
+                self.log.warning('* %s is corrupt: %s'
+                                 % (result.filename, error))
+
+    def verify(self, zips, results, check_md5):
+        '''Verifies the downloaded zips, a list of (filename, addon id,
+        version) tuples, and returns True if all of them are valid.'''
+        from xam.verify import verify_zips
+        downloaded = set(result.filename for result in results if result.ok)
+        items, ok = [], True
+        for filename, addonid, version in zips:
+            if filename not in downloaded:
+                continue
+            md5 = None
+            if check_md5:
+                if filename + '.md5' not in downloaded:
+                    self.log.warning('* No md5 was published for %s'
+                                     % filename)
+                    ok = False
+                    continue
+                with open(filename + '.md5') as inp:
+                    md5 = inp.read()
+            items.append((filename, addonid, version, md5))
+        verified = verify_zips(items, callback=self.report_verification)
+        return ok and all(result.ok for result in verified)
+
     def take_action(self, parsed_args):
+        from xam.download import Downloader, format_rate
         addonids = parsed_args.addon_id
-        reponame = parsed_args.repo
+        reponame = ', '.join(repo_names(parsed_args))
 
-        repo = get_repo(reponame)
-        addons = [addon for addon in repo.addons if addon.id in addonids]
+        repo = get_repo(repo_names(parsed_args), parse=False)
+        addons = repo.get_many(addonids).values()
         data_urls = [repo.addon_data_urls(addon) for addon in addons]
 
+        downloads, zips = [], []
         for addon, urls in zip(addons, data_urls):
             addonids.remove(addon.id)
             self.log.info('Downloading %s from %s to %s'
@@ -145,17 +379,231 @@ class GetAddon(Command):
             for _, url in urls.items():
                 filename = os.path.join(addon.id, url.rsplit('/', 1)[1])
                 self.log.debug('Downloading %s to %s' % (url, filename))
-                urlretrieve(url, filename)
+                downloads.append((url, filename))
+            zip_filename = os.path.join(addon.id,
+                                        urls['zip'].rsplit('/', 1)[1])
+            zips.append((zip_filename, addon.id, addon.version))
+            if parsed_args.md5:
+                downloads.append((urls['zip'] + '.md5', zip_filename + '.md5'))
+
+        start = time.time()
+        results = Downloader(parsed_args.jobs).download(downloads,
+                                                        self.report)
+        elapsed = time.time() - start
+        total = sum(result.size for result in results)
+        self.log.info('* Downloaded %d files, %d bytes in %.2fs (%s)'
+                      % (len([result for result in results if result.ok]),
+                         total, elapsed, format_rate(total, elapsed)))
 
         for addonid in addonids:
             # we couldn't find an addon with that id
             self.log.warning("Couldn't find %s in %s" % (addonid, reponame))
 
+        if parsed_args.verify or parsed_args.md5:
+            if not self.verify(zips, results, parsed_args.md5):
+                return 1
+
+
+class MirrorRepository(Command):
+    '''Mirrors the zip, icon, fanart and changelog of every addon in the
+    repo to a local directory and writes an addons.xml and addons.xml.md5
+    for it, so the directory can be served as a repository. Only the
+    assets of new and upgraded addons are downloaded when an existing
+    mirror is synced.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        from xam.download import DEFAULT_JOBS
+        parser = super(MirrorRepository, self).get_parser(prog_name)
+        add_repo_arg(parser)
+        parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                            help='Number of files to download at once.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Check the downloaded zips and delete the '
+                                 'corrupt ones.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete the addons which were removed from '
+                                 'the repo and the assets of old versions.')
+        parser.add_argument('directory')
+        return parser
+
+    def report(self, result):
+        '''Logs the outcome of a single download.'''
+        if result.ok:
+            self.log.debug('* Downloaded %s (%d bytes)'
+                           % (result.filename, result.size))
+        else:
+            self.log.debug('* Failed to download %s: %s'
+                           % (result.url, result.error))
+
+    def take_action(self, parsed_args):
+        from xam.download import format_rate
+        from xam.mirror import Mirror
+        repo = get_repo(repo_names(parsed_args), parse=False)
+        mirror = Mirror(repo, parsed_args.directory, parsed_args.jobs,
+                        parsed_args.verify)
+        self.log.info('Mirroring %s to %s' % (', '.join(
+            repo_names(parsed_args)), parsed_args.directory))
+
+        start = time.time()
+        result = mirror.sync(parsed_args.prune, self.report)
+        elapsed = time.time() - start
+        self.log.info('* %d addons up to date, %d updated, %d failed, '
+                      '%d removed' % (result.current, len(result.updated),
+                                      len(result.failed),
+                                      len(result.removed)))
+        self.log.info('* Downloaded %d files, %d bytes in %.2fs (%s)'
+                      % (len([res for res in result.downloads if res.ok]),
+                         result.size, elapsed,
+                         format_rate(result.size, elapsed)))
+        for addonid in result.failed:
+            self.log.warning("* Couldn't mirror %s" % addonid)
+        if result.failed:
+            return 1
+
+
+class BuildRepository(Command):
+    '''Builds a repository in the output directory from addon source
+    directories: each addon is zipped to <id>/<id>-<version>.zip, next to
+    its icon, fanart and changelog, and an addons.xml and addons.xml.md5
+    are written. A source is an addon directory or a directory of addon
+    directories. Rebuilds only zip the addons whose files changed. With
+    --serve, the repository is served over HTTP once built.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(BuildRepository, self).get_parser(prog_name)
+        parser.add_argument('--output', '-o', required=True,
+                            help='Directory to build the repository in.')
+        parser.add_argument('--jobs', '-j', type=int,
+                            help='Number of processes scanning and zipping '
+                                 'addons. Defaults to one per CPU.')
+        parser.add_argument('--serve', type=int, metavar='PORT',
+                            help='Serve the repository on PORT once built.')
+        parser.add_argument('source', nargs='+')
+        return parser
+
+    def serve(self, directory, port):
+        from SimpleHTTPServer import SimpleHTTPRequestHandler
+        from BaseHTTPServer import HTTPServer
+        # SimpleHTTPRequestHandler serves the current directory
+        os.chdir(directory)
+        server = HTTPServer(('', port), SimpleHTTPRequestHandler)
+        self.log.info('* Serving %s at http://localhost:%d/addons.xml'
+                      % (directory, port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def take_action(self, parsed_args):
+        from xam.build import RepositoryBuilder
+        start = time.time()
+        result = RepositoryBuilder(parsed_args.source, parsed_args.output,
+                                   parsed_args.jobs).build()
+        for addonid in result.built:
+            self.log.debug('* Zipped %s' % addonid)
+        for path, error in result.errors:
+            self.log.warning('* Skipped %s: %s' % (path, error))
+        self.log.info('* Built %d addons, %d unchanged, %d failed in %.2fs'
+                      % (len(result.built), len(result.unchanged),
+                         len(result.errors), time.time() - start))
+        if parsed_args.serve:
+            self.serve(parsed_args.output, parsed_args.serve)
+        if result.errors:
+            return 1
+
+
+class CacheStats(Command):
+    '''Shows the number of entries in ~/.xam_cache, their size and the
+    cache's budget. With --list, lists every entry, least recently used
+    first.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(CacheStats, self).get_parser(prog_name)
+        parser.add_argument('--list', action='store_true',
+                            help='List the url, size and last access of '
+                                 'each entry.')
+        add_format_arg(parser)
+        return parser
+
+    def take_action(self, parsed_args):
+        from xam.cache import Cache, format_size
+        cache = Cache()
+        entries = cache.entries()
+        if parsed_args.list:
+            return write_rows(parsed_args.format, self.app.stdout,
+                              ['url', 'size', 'accessed'],
+                              ([entry.url or entry.name, entry.size,
+                                time.strftime('%Y-%m-%d %H:%M:%S',
+                                              time.localtime(entry.accessed))]
+                               for entry in entries))
+        size = cache.size(entries)
+        if parsed_args.format == DEFAULT_FORMAT:
+            budget = (format_size(cache.max_size) if cache.max_size
+                      else 'no limit')
+            self.app.stdout.write('%s: %d entries, %s of %s\n'
+                                  % (cache.directory, len(entries),
+                                     format_size(size), budget))
+        else:
+            write_rows(parsed_args.format, self.app.stdout,
+                       ['directory', 'entries', 'size', 'max_size'],
+                       [[cache.directory, len(entries), size,
+                         cache.max_size]])
+
+
+class PruneCache(Command):
+    '''Evicts the least recently used entries of ~/.xam_cache until it
+    fits in its budget, set with `xam --cache-size`, or in --max-size.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        from xam.cache import parse_size
+        parser = super(PruneCache, self).get_parser(prog_name)
+        parser.add_argument('--max-size', type=parse_size,
+                            help='Size to prune the cache to, e.g. 100M.')
+        return parser
+
+    def take_action(self, parsed_args):
+        from xam.cache import Cache, format_size
+        evicted = Cache().prune(parsed_args.max_size)
+        for entry in evicted:
+            self.log.debug('* Evicted %s' % (entry.url or entry.name))
+        self.log.info('* Evicted %d entries, %s'
+                      % (len(evicted),
+                         format_size(sum(entry.size for entry in evicted))))
+
+
+class ClearCache(Command):
+    '''Removes every file of ~/.xam_cache.'''
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        from xam.cache import Cache, format_size
+        removed = Cache().clear()
+        self.log.info('* Removed %d entries, %s'
+                      % (len(removed),
+                         format_size(sum(entry.size for entry in removed))))
 
 
 class SearchAddons(Command):
-    '''Does a case insensitive (and xml ignorant) search of all addons'
-    addon.xml file and lists matches.
+    '''Searches the ids, names, providers, summaries, descriptions and
+    extensions of all addons and lists the matches, best match first.
+    Terms can be restricted to a field, e.g. name:khan or provider:jbel.
+    With --grep, does a case insensitive (and xml ignorant) search of all
+    addons' addon.xml files and lists the matching lines instead.
     '''
 
     log = logging.getLogger(__name__)
@@ -163,22 +611,76 @@ class SearchAddons(Command):
     def get_parser(self, prog_name):
         parser = super(SearchAddons, self).get_parser(prog_name)
         add_repo_arg(parser)
-        parser.add_argument('search_term')
+        parser.add_argument('--grep', action='store_true',
+                            help='List the lines of addon.xml containing '
+                                 'the search term.')
+        parser.add_argument('--limit', type=int,
+                            help='Maximum number of results to list.')
+        add_server_arg(parser)
+        add_format_arg(parser)
+        parser.add_argument('search_term', nargs='+')
         return parser
 
+    def grep(self, repo, text):
+        '''Yields an (addon id, line number, line) tuple for each line of
+        addon xml which contains text.'''
+        text = text.lower()
+        for addon in repo.iter_addons():
+            xml = addon.to_xml_string()
+            if text not in xml.lower():
+                continue
+            for i, line in enumerate(xml.splitlines()):
+                if text in line.lower():
+                    yield addon.id, i + 1, line
+
     def take_action(self, parsed_args):
-        reponame = parsed_args.repo
-        search_term = parsed_args.search_term
+        reponames = repo_names(parsed_args)
+        search_term = ' '.join(parsed_args.search_term)
 
-        self.log.debug('Searching for %s in %s' % (search_term, reponame))
+        self.log.debug('Searching for %s in %s'
+                       % (search_term, ', '.join(reponames)))
 
-        repo = get_repo(reponame)
-        text = search_term.lower()
+        if parsed_args.grep:
+            lines = self.grep(get_repo(reponames, parse=False), search_term)
+            return write_rows(parsed_args.format, self.app.stdout,
+                              ['id', 'line', 'text'], lines,
+                              '%(id)s:%(line)d: %(text)s\n')
 
-        for addon in repo.addons:
-            if text in addon.to_xml_string():
-                lines = addon.to_xml_string().splitlines()
-                matching_lines = [line for line in lines if text in line.lower()]
-                for i, line in enumerate(matching_lines):
-                    self.app.stdout.write('%s:%d: %s\n' % (addon.id, i + 1,
-                                                         line))
+        results = queries(parsed_args).search(search_term,
+                                                  parsed_args.limit)
+        write_rows(parsed_args.format, self.app.stdout,
+                   ['score', 'id', 'version'], results,
+                   '%(id)s %(version)s\n')
+
+
+class Serve(Command):
+    '''Runs a local query server which keeps the repositories parsed in
+    memory and refreshes them in the background. Point the all, info,
+    depends and search commands at it with --server or $XAM_SERVER.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        from xam.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_INTERVAL
+        parser = super(Serve, self).get_parser(prog_name)
+        add_repo_arg(parser)
+        parser.add_argument('--host', default=DEFAULT_HOST)
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+        parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                            help='Seconds between checks for repository '
+                                 'updates.')
+        return parser
+
+    def take_action(self, parsed_args):
+        from xam.server import QueryServer
+        server = QueryServer((parsed_args.host, parsed_args.port),
+                             [repo_names(parsed_args)], parsed_args.interval)
+        self.log.info('* Serving on %s, set %s=%s to use it'
+                      % (server.url, SERVER_ENV, server.url))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
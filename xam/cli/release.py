@@ -15,13 +15,13 @@ from subprocess import check_call, check_output
 import logging
 
 from cliff.command import Command
-from colorama import init
-init(strip=not sys.stdout.isatty()) # strip colors if stdout is redirected
 from termcolor import cprint, colored
 
 from xam.addon import Addon
+from xam.version import compare
+from xam.resolver import Resolver, is_builtin
 from xam.repository import get_repo
-from xam.cli import REPO_NAMES, add_repo_arg
+from xam.cli import REPO_NAMES, add_repo_arg, repo_names
 
 
 
@@ -30,6 +30,19 @@ BLUE = lambda text: colored(text, 'blue')
 GREEN = lambda text: colored(text, 'green')
 RED = lambda text: colored(text, 'red')
 
+_colors_initialized = False
+
+
+def init_colors():
+    '''Initializes colorama on first use, so colors work on Windows.
+    Colors are stripped if stdout is redirected.'''
+    global _colors_initialized
+    if not _colors_initialized:
+        from colorama import init
+        init(strip=not sys.stdout.isatty())
+        _colors_initialized = True
+
+
 def bump_minor(version_str):
     '''Given a version string, increments the right-most number by 1 and
     returns the new value.
@@ -42,42 +55,6 @@ def bump_minor(version_str):
     return '%s.%s' % (left, right)
 
 
-def compare_versions(version_a, version_b):
-    '''Compares two versions strings and returns 1 if version_a is greater, -1
-    is version_b is greater or 0 if they are equal.
-
-    >>> compare_versions('1.0', '1.1')
-    -1
-    >>> compare_versions('1.1', '0.4')
-    1
-    >>> compare_versions('0.0.1', '.1')
-    0
-    '''
-    if version_a == version_b:
-        return 0
-
-    # Convert parts to ints and strip out blank parts:
-    # '.1'.split('.') will result in ['', '1']
-    aparts = [int(part) for part in version_a.split('.') if part]
-    bparts = [int(part) for part in version_b.split('.') if part]
-
-    # if part lengths are unequal prepend with zeros
-    if len(aparts) > len(bparts):
-        bparts = [0] * (len(aparts) - len(bparts)) + bparts
-    elif len(bparts) > len(aparts):
-        aparts = [0] * (len(bparts) - len(aparts)) + aparts
-
-    # same number of parts now, start comparing from leftmost part
-    for a, b in zip(aparts, bparts):
-        if a > b:
-            return 1
-        elif b > a:
-            return -1
-    # the only way we can get here, is if the versions strings aren't equal,
-    # but when prepended with zeros they are equal. e.g.: .1 and 0.0.1
-    return 0
-
-
 def write_file(path, contents):
     '''Writes the given contents to the given path'''
     with open(path, 'w') as out:
@@ -153,26 +130,36 @@ class ReleaseAddon(Command):
     def update_dependencies(self, addon_to_release, xbmc_version):
         '''For any required dependencies, attempts to to update the version number
         to the newest version available in the XBMC official repository.
+        xbmc_version can also be a list of repository names.
         '''
-        repo = get_repo(xbmc_version)
-        addons = repo.addons
+        repo = get_repo(xbmc_version, parse=False)
+        if isinstance(xbmc_version, list):
+            xbmc_version = ', '.join(xbmc_version)
+
+        # Check the whole dependency tree first and report every problem.
+        # Only problems with the addon's own requirements abort the
+        # release, deeper ones are in addons the user can't fix.
+        resolution = Resolver(repo).resolve(addon_to_release)
+        direct = [problem for problem in resolution.problems
+                  if problem.addon_id == addon_to_release.id]
+        for problem in resolution.problems:
+            if problem not in direct:
+                self.app.stdout.write('%s %s\n' % (RED('[!] Warning:'),
+                                                   problem))
+        if direct:
+            sys.exit('I found problems with the dependencies of your addon in '
+                     'the %s repository:\n%s\nAborting.'
+                     % (xbmc_version, '\n'.join('  * %s' % problem
+                                                for problem in direct)))
+
         for addon_id, addon_version in addon_to_release.dependencies.items():
-            if addon_id != 'xbmc.python':  # skip python dependency
-                try:
-                    addon = (addon for addon in repo.addons if addon.id == addon_id).next()
-                except StopIteration:
-                    # ERROR: no addon with that id
-                    sys.exit('You have a dependency listed on "%s" but I can\'t '
-                             'find an addon with that ID in the %s repository. '
-                             'Aborting.' % (addon_id, xbmc_version))
-
-                if compare_versions(addon_version, addon.version) > 0:
-                    # ERROR: newest version available is < specified version
-                    sys.exit('You require version %s for addon %s, but the newest '
-                             'version I can find in the repository is %s. '
-                             'Aborting.' % (addon_version, addon_id,
-                                            addon.version))
-                elif compare_versions(addon_version, addon.version) < 0:
+            if not is_builtin(addon_id):  # skip xbmc.python and friends
+                addon = repo.get(addon_id)
+
+                # Parse both versions once, a pre-release such as
+                # 1.0.0~beta sorts before 1.0.0
+                order = compare(addon_version, addon.parsed_version)
+                if order < 0:
                     # found newer version, prompt for update
                     msg = ('[?] There is a newer version of %s available. '
                            'Would you like to update the dependency from %s to'
@@ -189,9 +176,13 @@ class ReleaseAddon(Command):
 
     def take_action(self, parsed_args):
         '''Performs a release of an XBMC addon.'''
+        init_colors()
         # Parse addon.xml
         addon = self.get_cwd_addon()
-        reponame = parsed_args.repo
+        # The first repository decides the XBMC version of the release,
+        # dependencies are checked against all of them.
+        reponames = repo_names(parsed_args)
+        reponame = reponames[0]
 
         # determine local git branch
         current_branch = check_output('git symbolic-ref HEAD 2>/dev/null',
@@ -258,7 +249,7 @@ class ReleaseAddon(Command):
         if len(addon.dependencies) > 1:
             msg = '[?] I see your addon has a few dependencies. Would you like to check for new versions?'
             if self.yes_no(msg):
-                self.update_dependencies(addon, reponame)
+                self.update_dependencies(addon, reponames)
 
         if os.path.exists('changelog.txt'):
             msg = '[?] I see you have a %s. Would you like to update it now?' % BLUE('changelog.txt')
@@ -8,8 +8,26 @@
     :license: BSD, see LICENSE for more details.
 
 '''
+import os
+import re
+import hashlib
+import logging
+import threading
+try:
+    import fcntl
+except ImportError:
+    # Downloads aren't locked on Windows
+    fcntl = None
 from xml.etree import ElementTree as ET
-import requests
+from .session import (get_session, OK, PARTIAL_CONTENT,
+                      REQUESTED_RANGE_NOT_SATISFIABLE)
+
+
+log = logging.getLogger(__name__)
+
+# Number of bytes held in memory at a time while downloading
+CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r'^\s*bytes\s+(\d+)-\d+/(?:\d+|\*)\s*$', re.I)
 
 
 class UnicodeBuilder(ET.XMLTreeBuilder):
@@ -19,11 +37,189 @@ class UnicodeBuilder(ET.XMLTreeBuilder):
         return text
 
 
-def urlretrieve(url, filename):
+def write_atomic(filename, data):
+    '''Writes data to a temporary file next to filename and renames it to
+    filename, so readers never see a partially written file. The
+    temporary file is named after the process and thread, so concurrent
+    writers of the same file don't share it.'''
+    tmp_filename = '%s.%d-%d.tmp' % (filename, os.getpid(),
+                                     threading.current_thread().ident)
+    try:
+        with open(tmp_filename, 'wb') as out:
+            out.write(data)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+    except (IOError, OSError):
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def file_md5(filename):
+    '''Returns the md5 hex digest of a file's contents.'''
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as inp:
+        for chunk in iter(lambda: inp.read(CHUNK_SIZE), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def lock_file(filename, blocking=False):
+    '''Opens filename, creating it if needed, and takes an exclusive lock
+    on it. Returns the open file, which holds the lock until it's closed,
+    or None if another process holds the lock. If blocking is True, waits
+    for the lock instead.'''
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    while True:
+        fileobj = open(filename, 'ab')
+        try:
+            fcntl.flock(fileobj.fileno(), flags)
+        except IOError:
+            fileobj.close()
+            if blocking:
+                raise
+            return None
+        # The locked file must still be the one at filename, not one
+        # renamed away or removed by the process which held the lock
+        try:
+            if os.fstat(fileobj.fileno()).st_ino == os.stat(filename).st_ino:
+                return fileobj
+        except OSError:
+            pass
+        fileobj.close()
+        if not blocking:
+            return None
+
+
+def urlretrieve(url, filename, session=None, chunk_size=CHUNK_SIZE,
+                headers=None):
     '''Downloads the resource found at the remote url to the provided
-    filename if the url returns an OK status.'''
-    print '* Downloading %s to %s' % (url, filename)
-    req = requests.get(url)
-    if req.status_code == requests.codes.ok:
-        with open(filename, 'wb') as output:
-            output.write(req.content)
+    filename if the url returns an OK status. The shared session is used
+    unless another session is provided. The response is streamed
+    chunk_size bytes at a time to filename.part, which is renamed to
+    filename once complete. The response's ETag or Last-Modified is saved
+    to filename.part.validator, so if a .part file is left behind by an
+    interrupted download, the download is resumed with a Range request
+    which only applies if the remote file is still the same.
+    Any extra request headers can be provided in headers, e.g. to make
+    a conditional request. Returns the response.
+
+    filename.part is locked while downloading. If another process is
+    downloading to the same filename, the response is streamed to a
+    .part file of this process instead, so neither writes to the
+    other's file.
+    '''
+    log.debug('* Downloading %s to %s', url, filename)
+    part_filename = filename + '.part'
+    lock = None
+    if fcntl is not None:
+        lock = lock_file(part_filename)
+        if lock is None:
+            part_filename = '%s.%d.part' % (filename, os.getpid())
+    try:
+        return _retrieve(url, filename, part_filename, session, chunk_size,
+                         headers)
+    finally:
+        try:
+            if os.path.getsize(part_filename) == 0:
+                os.remove(part_filename)
+                remove_validator(part_filename)
+        except OSError:
+            pass
+        if lock is not None:
+            lock.close()
+
+
+def resume_validator(resp):
+    '''Returns the validator to resume a partial download of resp with,
+    its strong ETag or else its Last-Modified date, or None. A date in
+    If-Range only matches if it equals the resource's Last-Modified.'''
+    etag = resp.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('Last-Modified')
+
+
+def read_validator(part_filename):
+    '''Returns the validator saved alongside a partial download.'''
+    try:
+        with open(part_filename + '.validator') as inp:
+            return inp.read().strip() or None
+    except IOError:
+        return None
+
+
+def remove_validator(part_filename):
+    try:
+        os.remove(part_filename + '.validator')
+    except OSError:
+        pass
+
+
+def content_range_start(resp):
+    '''Returns the first byte position of a partial response's
+    Content-Range, or None if it has none or it can't be parsed.'''
+    match = CONTENT_RANGE_RE.match(resp.headers.get('Content-Range', ''))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def _retrieve(url, filename, part_filename, session, chunk_size, headers):
+    extra_headers, headers = headers, dict(headers or {})
+    try:
+        offset = os.path.getsize(part_filename)
+    except OSError:
+        offset = 0
+    # A partial file can only be resumed if it's known which version of
+    # the resource it's part of
+    validator = read_validator(part_filename) if offset else None
+    if validator:
+        # If-Range makes the server send the whole file if it has changed
+        # since the partial download
+        headers['Range'] = 'bytes=%d-' % offset
+        headers['If-Range'] = validator
+
+    req = (session or get_session()).get(url, stream=True, headers=headers)
+    restart = req.status_code == REQUESTED_RANGE_NOT_SATISFIABLE
+    if (req.status_code == PARTIAL_CONTENT and
+            content_range_start(req) != offset):
+        # The server sent another range than the one the partial file
+        # ends at, appending it would corrupt the file
+        if not offset:
+            req.close()
+            raise IOError('%s sent an unrequested range: %s'
+                          % (url, req.headers.get('Content-Range')))
+        log.debug('* %s sent bytes %s instead of %d-, starting over', url,
+                  req.headers.get('Content-Range'), offset)
+        restart = True
+    if restart:
+        # The partial file doesn't match the remote file, start over. It's
+        # truncated rather than removed, so it stays locked.
+        req.close()
+        open(part_filename, 'wb').close()
+        remove_validator(part_filename)
+        return _retrieve(url, filename, part_filename, session, chunk_size,
+                         extra_headers)
+    if req.status_code == PARTIAL_CONTENT:
+        mode = 'ab'
+    elif req.status_code == OK:
+        mode = 'wb'
+        validator = resume_validator(req)
+        if validator:
+            write_atomic(part_filename + '.validator', validator)
+        else:
+            remove_validator(part_filename)
+    else:
+        req.close()
+        return req
+
+    with open(part_filename, mode) as output:
+        for chunk in req.iter_content(chunk_size):
+            output.write(chunk)
+    if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(part_filename, filename)
+    remove_validator(part_filename)
+    return req
@@ -0,0 +1,189 @@
+'''
+    xam.delta
+    ---------
+
+    Contains the delta update of a repository's addon index. When a new
+    addons.xml is downloaded, each <addon> element is located with a
+    lightweight scanner and hashed. Addons whose bytes are unchanged
+    since the previous index are copied from it without any xml parsing,
+    only added and changed addons are parsed again. The differences are
+    collected in a ChangeSet.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import re
+import json
+import hashlib
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import unescape
+from .common import UnicodeBuilder, write_atomic
+from .addon import AddonRecord
+from .parser import tag_end
+
+
+# Markup the scanner has to step over, or an addon start or end tag.
+# Tags which only start with addon, e.g. <addon-info>, aren't addons.
+MARKUP_RE = re.compile(r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|'
+                       r'(<addon(?=[\s/>]))|(</addon\s*>)', re.DOTALL)
+ID_RE = re.compile(r'''\sid\s*=\s*(["'])(.*?)\1''', re.DOTALL)
+
+
+def digest(xml):
+    '''Returns the content hash of an addon's xml bytes.'''
+    return hashlib.md5(xml).digest()
+
+
+def scan_addons(data, pos=0):
+    '''Yields a (start, end) tuple for every top level <addon> element in
+    data, an addons.xml string or memory map. Comments, CDATA sections
+    and processing instructions are skipped.'''
+    start = None
+    while True:
+        match = MARKUP_RE.search(data, pos)
+        if match is None:
+            if start is not None:
+                raise ValueError('Unterminated addon at %d' % start)
+            return
+        pos = match.end()
+        if match.group(1) and start is None:
+            start = match.start()
+            pos = tag_end(data, start)
+            if data[pos - 2:pos] == '/>':
+                yield start, pos
+                start = None
+        elif match.group(2) and start is not None:
+            yield start, pos
+            start = None
+
+
+def addon_id(xml):
+    '''Returns the id attribute of an addon's start tag.'''
+    match = ID_RE.search(xml, 0, tag_end(xml, 0))
+    if match is None:
+        return None
+    return unescape(match.group(2), {'&quot;': '"', '&apos;': "'"}
+                    ).decode('utf-8')
+
+
+def iter_delta(previous, source, data, changes):
+    '''Yields an (AddonRecord, start, end, digest) tuple for each addon in
+    data, the new addons.xml. Records are copied from previous, the
+    AddonIndex of the last addons.xml, when their bytes are unchanged.
+    The differences are added to changes as the addons are found and the
+    removed addons are added once the iteration completes.
+
+    :param source: The xml source for the new records.
+    '''
+    known = previous.digests()
+    seen = set()
+    for start, end in scan_addons(data):
+        xml = data[start:end]
+        xml_digest = digest(xml)
+        old = known.get(addon_id(xml))
+        if old is not None and old[0] == xml_digest:
+            addon = previous.record(old[1], source, start, end)
+        else:
+            elem = ET.fromstring(xml, parser=UnicodeBuilder())
+            addon = AddonRecord.from_element(elem, source, start, end)
+            old = known.get(addon.id)
+            if old is None:
+                changes.added.append((addon.id, addon.version))
+            elif addon.id not in seen:
+                old_version = previous.record(old[1]).version
+                if old_version != addon.version:
+                    changes.upgraded.append((addon.id, old_version,
+                                             addon.version))
+                else:
+                    changes.modified.append((addon.id, addon.version))
+        seen.add(addon.id)
+        yield addon, start, end, xml_digest
+
+    for old_id, (_, number) in sorted(known.items()):
+        if old_id not in seen:
+            changes.removed.append((old_id, previous.record(number).version))
+
+
+class ChangeSet(object):
+    '''The differences between two versions of a repository's
+    addons.xml.
+
+    :param added: A list of (id, version) tuples.
+    :param removed: A list of (id, version) tuples.
+    :param upgraded: A list of (id, old version, new version) tuples, for
+                     every addon whose version changed.
+    :param modified: A list of (id, version) tuples, for addons which
+                     changed without a new version.
+    '''
+
+    def __init__(self, old_checksum=None, new_checksum=None, added=None,
+                 removed=None, upgraded=None, modified=None):
+        self.old_checksum = old_checksum
+        self.new_checksum = new_checksum
+        self.added = added or []
+        self.removed = removed or []
+        self.upgraded = upgraded or []
+        self.modified = modified or []
+
+    def __len__(self):
+        return (len(self.added) + len(self.removed) + len(self.upgraded) +
+                len(self.modified))
+
+    def to_dict(self):
+        return {
+            'old_checksum': self.old_checksum,
+            'new_checksum': self.new_checksum,
+            'added': [{'id': addon_id, 'version': version}
+                      for addon_id, version in self.added],
+            'removed': [{'id': addon_id, 'version': version}
+                        for addon_id, version in self.removed],
+            'upgraded': [{'id': addon_id, 'old_version': old, 'version': new}
+                         for addon_id, old, new in self.upgraded],
+            'modified': [{'id': addon_id, 'version': version}
+                         for addon_id, version in self.modified],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['old_checksum'], data['new_checksum'],
+                   [(item['id'], item['version']) for item in data['added']],
+                   [(item['id'], item['version'])
+                    for item in data['removed']],
+                   [(item['id'], item['old_version'], item['version'])
+                    for item in data['upgraded']],
+                   [(item['id'], item['version'])
+                    for item in data['modified']])
+
+    def save(self, filename):
+        '''Writes the change set to filename as JSON.'''
+        write_atomic(filename, json.dumps(self.to_dict(), indent=2,
+                                          sort_keys=True))
+
+    @classmethod
+    def load(cls, filename):
+        '''Returns the ChangeSet saved to filename or None.'''
+        try:
+            with open(filename) as inp:
+                return cls.from_dict(json.load(inp))
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def lines(self):
+        '''Returns a list of human readable lines, one per change.'''
+        return (['+ %s %s' % item for item in self.added] +
+                ['- %s %s' % item for item in self.removed] +
+                ['^ %s %s -> %s' % item for item in self.upgraded] +
+                ['~ %s %s' % item for item in self.modified])
+
+    def rows(self):
+        '''Returns a list of (change, id, old version, version) tuples, one
+        per change. The old version is None unless the addon was
+        upgraded.'''
+        return ([('added', addon_id, None, version)
+                 for addon_id, version in self.added] +
+                [('removed', addon_id, None, version)
+                 for addon_id, version in self.removed] +
+                [('upgraded', addon_id, old, new)
+                 for addon_id, old, new in self.upgraded] +
+                [('modified', addon_id, None, version)
+                 for addon_id, version in self.modified])
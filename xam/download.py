@@ -0,0 +1,102 @@
+'''
+    xam.download
+    ------------
+
+    Contains a concurrent downloader used to fetch addon assets.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import time
+import logging
+from multiprocessing.pool import ThreadPool
+import requests
+from . import session
+from .common import urlretrieve
+
+
+DEFAULT_JOBS = 4
+
+
+def format_rate(size, elapsed):
+    '''Returns a human readable transfer rate for size bytes transferred
+    in elapsed seconds.'''
+    rate = size / elapsed if elapsed > 0 else float(size)
+    for unit in ['B', 'KB', 'MB']:
+        if rate < 1024:
+            return '%.1f %s/s' % (rate, unit)
+        rate /= 1024.0
+    return '%.1f GB/s' % rate
+
+
+class DownloadResult(object):
+    '''The outcome of downloading a single url.'''
+
+    def __init__(self, url, filename, size=0, elapsed=0.0, error=None):
+        self.url = url
+        self.filename = filename
+        self.size = size
+        self.elapsed = elapsed
+        self.error = error
+
+    def __repr__(self):
+        return '<DownloadResult %s %d bytes>' % (self.url, self.size)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def rate(self):
+        return format_rate(self.size, self.elapsed)
+
+
+class Downloader(object):
+    '''Downloads urls with a bounded pool of worker threads. All workers
+    share one requests session, by default the session shared by all of
+    xam, so connections to the same host are kept alive and reused
+    between files.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, jobs=DEFAULT_JOBS, http_session=None):
+        self.jobs = max(1, jobs)
+        if http_session is None:
+            session.reserve(self.jobs)
+            http_session = session.get_session()
+        self.session = http_session
+
+    def fetch(self, url, filename):
+        '''Downloads url to filename and returns a DownloadResult. Nothing
+        is written unless the url returns an OK status.'''
+        start = time.time()
+        try:
+            resp = urlretrieve(url, filename, self.session)
+        except (requests.RequestException, IOError, OSError), exc:
+            return DownloadResult(url, filename, 0, time.time() - start,
+                                  str(exc))
+        if resp.status_code not in (session.OK, session.PARTIAL_CONTENT):
+            return DownloadResult(url, filename, 0, time.time() - start,
+                                  'HTTP %d' % resp.status_code)
+        return DownloadResult(url, filename, os.path.getsize(filename),
+                              time.time() - start)
+
+    def download(self, items, callback=None):
+        '''Downloads each (url, filename) tuple in items and returns a list
+        of DownloadResults in the same order. If provided, callback is
+        called with each DownloadResult as soon as it completes.
+        '''
+        def fetch(item):
+            result = self.fetch(*item)
+            if callback is not None:
+                callback(result)
+            return result
+
+        pool = ThreadPool(min(self.jobs, len(items)) or 1)
+        try:
+            return pool.map(fetch, items)
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,151 @@
+'''
+    xam.formats
+    -----------
+
+    Contains the output formats of the xam commands. A command writes
+    rows of values for its columns with a RowWriter, which formats them
+    as text, newline delimited JSON, CSV or msgpack. Output is buffered
+    and written to the stream BUFFER_SIZE bytes at a time, so listing
+    thousands of addons doesn't cost a write per line.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import csv
+import json
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+
+
+BUFFER_SIZE = 64 * 1024
+DEFAULT_FORMAT = 'text'
+
+
+class BufferedStream(object):
+    '''Collects the written strings and writes them to stream once they
+    add up to size bytes, or when flushed.'''
+
+    def __init__(self, stream, size=BUFFER_SIZE):
+        self.stream = stream
+        self.size = size
+        self._chunks = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks, self._buffered = [], 0
+
+
+def encode(value):
+    '''Returns value as a utf-8 encoded string.'''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+class RowWriter(object):
+    '''Writes rows, sequences of values for columns, to stream. Call
+    close once all rows are written.'''
+
+    def __init__(self, stream, columns, text_format=None):
+        self.out = BufferedStream(stream)
+        self.columns = list(columns)
+
+    def writerow(self, row):
+        raise NotImplementedError
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        self.out.flush()
+
+
+class TextWriter(RowWriter):
+    '''Writes a row per line, formatted with text_format, a format string
+    for a dict of the row's values, or separated by spaces.'''
+
+    def __init__(self, stream, columns, text_format=None):
+        super(TextWriter, self).__init__(stream, columns)
+        self.text_format = text_format
+
+    def writerow(self, row):
+        if self.text_format is None:
+            line = ' '.join(encode(value) for value in row) + '\n'
+        else:
+            line = encode(self.text_format % dict(zip(self.columns, row)))
+        self.out.write(line)
+
+
+class NdjsonWriter(RowWriter):
+    '''Writes a JSON object per line.'''
+
+    def writerow(self, row):
+        self.out.write(json.dumps(OrderedDict(zip(self.columns, row)),
+                                  separators=(',', ':')) + '\n')
+
+
+class CsvWriter(RowWriter):
+    '''Writes a header line followed by a line per row. Values which are
+    lists or dicts are written as JSON.'''
+
+    def __init__(self, stream, columns, text_format=None):
+        super(CsvWriter, self).__init__(stream, columns)
+        self.writer = csv.writer(self.out, lineterminator='\n')
+        self.writer.writerow(self.columns)
+
+    def cell(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value)
+        return encode(value)
+
+    def writerow(self, row):
+        self.writer.writerow([self.cell(value) for value in row])
+
+
+class MsgpackWriter(RowWriter):
+    '''Writes a msgpack map per row. Needs the msgpack-python package.'''
+
+    def __init__(self, stream, columns, text_format=None):
+        super(MsgpackWriter, self).__init__(stream, columns)
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError('The msgpack format needs msgpack-python, '
+                               'install it with `pip install xam[msgpack]`.')
+        self.packer = msgpack.Packer()
+
+    def writerow(self, row):
+        self.out.write(self.packer.pack(dict(zip(self.columns, row))))
+
+
+FORMATS = OrderedDict([
+    ('text', TextWriter),
+    ('ndjson', NdjsonWriter),
+    ('csv', CsvWriter),
+    ('msgpack', MsgpackWriter),
+])
+
+
+def get_writer(name, stream, columns, text_format=None):
+    '''Returns a RowWriter for the format name.'''
+    return FORMATS[name](stream, columns, text_format)
+
+
+def write_rows(name, stream, columns, rows, text_format=None):
+    '''Writes rows to stream in the format name.'''
+    writer = get_writer(name, stream, columns, text_format)
+    writer.writerows(rows)
+    writer.close()
@@ -0,0 +1,419 @@
+'''
+    xam.index
+    ---------
+
+    Contains a compact binary index of a repository's addons.xml. The
+    index is written next to the cached addons.xml and is keyed by the
+    addons.xml md5 checksum, so a warm run can skip xml parsing
+    completely.
+
+    File layout (all integers are little endian)::
+
+        header    magic, format version, checksum, section count
+        sections  (name, offset, length) for each section
+        addons    record count, record offsets, records in addons.xml
+                  order, record numbers sorted by addon id
+        rdeps     for each dependency id, the records which require it
+        terms     for each "field:term" key, the records containing the
+                  term, repeated once per occurrence (see xam.search)
+
+    Each addon record holds the byte range of the addon's xml within the
+    cached addons.xml and the md5 digest of those bytes, followed by
+    every field of an AddonRecord. The digests let a new addons.xml be
+    compared against the index addon by addon (see xam.delta). The file
+    is memory mapped and records are only decoded when they are
+    accessed.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import mmap
+import struct
+from .common import write_atomic
+from .addon import AddonRecord, XmlFile
+from . import search
+
+
+MAGIC = 'XAMIDX'
+FORMAT_VERSION = 5
+
+HEADER = struct.Struct('<6sH32sH')
+SECTION = struct.Struct('<8sII')
+UINT = struct.Struct('<I')
+USHORT = struct.Struct('<H')
+RANGE = struct.Struct('<II')
+DIGEST = struct.Struct('<16s')
+
+# String length used to encode None
+NONE_LEN = 0xFFFFFFFF
+
+
+def pack_str(value):
+    '''Returns the length prefixed utf-8 encoding of value.'''
+    if value is None:
+        return UINT.pack(NONE_LEN)
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return UINT.pack(len(value)) + value
+
+
+def unpack_str(buf, pos):
+    '''Returns a (value, new_pos) tuple for the string encoded at pos.'''
+    length, = UINT.unpack_from(buf, pos)
+    pos += UINT.size
+    if length == NONE_LEN:
+        return None, pos
+    return buf[pos:pos + length].decode('utf-8'), pos + length
+
+
+def pack_pairs(pairs):
+    '''Returns the encoding of a list of (key, value) string pairs.'''
+    parts = [USHORT.pack(len(pairs))]
+    for key, val in pairs:
+        parts.append(pack_str(key))
+        parts.append(pack_str(val))
+    return ''.join(parts)
+
+
+def unpack_pair_list(buf, pos):
+    '''Returns a (tuple of pairs, new_pos) tuple for the pairs encoded
+    at pos.'''
+    count, = USHORT.unpack_from(buf, pos)
+    pos += USHORT.size
+    pairs = []
+    for _ in xrange(count):
+        key, pos = unpack_str(buf, pos)
+        val, pos = unpack_str(buf, pos)
+        pairs.append((key, val))
+    return tuple(pairs), pos
+
+
+def pack_strs(values):
+    '''Returns the encoding of a list of strings.'''
+    return USHORT.pack(len(values)) + ''.join(pack_str(val) for val in values)
+
+
+def unpack_strs(buf, pos):
+    '''Returns a (tuple, new_pos) tuple for the strings encoded at
+    pos.'''
+    count, = USHORT.unpack_from(buf, pos)
+    pos += USHORT.size
+    values = []
+    for _ in xrange(count):
+        val, pos = unpack_str(buf, pos)
+        values.append(val)
+    return tuple(values), pos
+
+
+def pack_record(addon, start, end, digest):
+    '''Returns the binary record for the provided Addon or AddonRecord
+    whose xml is found at [start:end] in addons.xml and has the provided
+    md5 digest.'''
+    extension_items = addon.extension_items
+    return ''.join([
+        RANGE.pack(start, end),
+        DIGEST.pack(digest),
+        pack_str(addon.id),
+        pack_str(addon.name),
+        pack_str(addon.version),
+        pack_str(addon.provider),
+        pack_pairs(addon.dependencies.items()),
+        pack_pairs((addon.summaries or {}).items()),
+        pack_pairs((addon.descriptions or {}).items()),
+        pack_strs(addon.languages or ()),
+        pack_str(addon.platform),
+        USHORT.pack(len(extension_items)),
+    ] + [pack_pairs(attrs) + pack_pairs(children)
+         for attrs, children in extension_items])
+
+
+def unpack_record(buf, pos):
+    '''Returns a tuple of the (start, end) range and the AddonRecord
+    fields for the record encoded at pos.'''
+    start, end = RANGE.unpack_from(buf, pos)
+    pos += RANGE.size + DIGEST.size
+    fields = []
+    for _ in xrange(4):
+        value, pos = unpack_str(buf, pos)
+        fields.append(value)
+    for _ in xrange(3):
+        value, pos = unpack_pair_list(buf, pos)
+        fields.append(value)
+    languages, pos = unpack_strs(buf, pos)
+    platform, pos = unpack_str(buf, pos)
+    count, = USHORT.unpack_from(buf, pos)
+    pos += USHORT.size
+    extension_items = []
+    for _ in xrange(count):
+        attrs, pos = unpack_pair_list(buf, pos)
+        children, pos = unpack_pair_list(buf, pos)
+        extension_items.append((attrs, children))
+    fields.extend([languages, platform, tuple(extension_items)])
+    return (start, end), fields
+
+
+def checksum_key(checksum):
+    '''Returns the md5 hex digest from the contents of a checksum file,
+    which may include a trailing filename or newline.'''
+    return checksum.split()[0][:32] if checksum.strip() else ''
+
+
+def index_fn(xml_filename):
+    '''Returns the index filename for a cached addons.xml filename.'''
+    return xml_filename + '.idx'
+
+
+def pack_table(entries):
+    '''Returns the encoding of a list of binary entries, prefixed with
+    the entry count and the offset of each entry.'''
+    offsets, pos = [], UINT.size * (len(entries) + 1)
+    for entry in entries:
+        offsets.append(pos)
+        pos += len(entry)
+    return ''.join([UINT.pack(len(entries))]
+                   + [UINT.pack(offset) for offset in offsets]
+                   + entries)
+
+
+def pack_postings(postings):
+    '''Returns the encoding of a dict mapping string keys to lists of
+    record numbers. Entries are sorted by key so they can be binary
+    searched.'''
+    return pack_table([
+        pack_str(key) + UINT.pack(len(numbers)) +
+        struct.pack('<%dI' % len(numbers), *numbers)
+        for key, numbers in sorted(postings.items())
+    ])
+
+
+class IndexWriter(object):
+    '''Collects the records for an index file while addons.xml is being
+    parsed.'''
+
+    def __init__(self):
+        self.ids = []
+        self.records = []
+        self.dependents = {}
+        self.terms = {}
+
+    def add(self, addon, start, end, digest, record=None):
+        '''Adds an index record for the provided Addon whose xml is found
+        at [start:end] in addons.xml and has the provided md5 digest. The
+        binary record is packed unless it's provided.'''
+        number = len(self.records)
+        self.ids.append(addon.id)
+        if record is None:
+            record = pack_record(addon, start, end, digest)
+        self.records.append(record)
+        for dependency_id in addon.dependencies:
+            self.dependents.setdefault(dependency_id, []).append(number)
+        search.add_terms(self.terms, number, addon)
+
+    def sections(self):
+        '''Returns a list of (name, data) tuples for each index
+        section.'''
+        ids = self.ids
+        order = sorted(xrange(len(ids)), key=lambda i: ids[i])
+        addons = (pack_table(self.records) +
+                  struct.pack('<%dI' % len(order), *order))
+        return [
+            ('addons', addons),
+            ('rdeps', pack_postings(self.dependents)),
+            ('terms', pack_postings(self.terms)),
+        ]
+
+    def write(self, filename, checksum):
+        '''Writes the index file for the provided checksum. The file is
+        written to a temporary location first so readers never see a
+        partial index.
+        '''
+        sections = self.sections()
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, checksum_key(checksum),
+                             len(sections))]
+        offset = HEADER.size + SECTION.size * len(sections)
+        for name, data in sections:
+            parts.append(SECTION.pack(name, offset, len(data)))
+            offset += len(data)
+        parts.extend(data for _, data in sections)
+
+        write_atomic(filename, ''.join(parts))
+
+
+class AddonIndex(object):
+    '''A read only view of an index file.'''
+
+    def __init__(self, buf, xml_filename):
+        self._buf = buf
+        self.xml_filename = xml_filename
+        # Mapped now, so the records' offsets can't end up pointing into
+        # an addons.xml which replaced the indexed one
+        self._xml_file = XmlFile(xml_filename)
+
+        _, _, checksum, count = HEADER.unpack_from(buf, 0)
+        self.checksum = checksum.rstrip('\0')
+        self.sections = {}
+        for i in xrange(count):
+            name, offset, length = SECTION.unpack_from(
+                buf, HEADER.size + i * SECTION.size)
+            self.sections[name.rstrip('\0')] = (offset, length)
+        self._addons_pos = self.sections['addons'][0]
+        self._count, = UINT.unpack_from(buf, self._addons_pos)
+
+    @classmethod
+    def open(cls, filename, checksum, xml_filename):
+        '''Returns an AddonIndex for the provided filename or None if the
+        file doesn't exist, is in an unknown format or was built for a
+        different checksum.
+        '''
+        try:
+            with open(filename, 'rb') as inp:
+                buf = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, ValueError, mmap.error):
+            return None
+        if len(buf) < HEADER.size:
+            return None
+        magic, version, index_checksum, _ = HEADER.unpack_from(buf, 0)
+        if (magic != MAGIC or version != FORMAT_VERSION or
+                index_checksum.rstrip('\0') != checksum_key(checksum)):
+            return None
+        try:
+            return cls(buf, xml_filename)
+        except (IOError, OSError):
+            # The addons.xml is gone
+            return None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self.record(i)
+
+    def _record_pos(self, i):
+        '''Returns the absolute position of the i-th record.'''
+        offset, = UINT.unpack_from(self._buf, self._addons_pos +
+                                   UINT.size * (i + 1))
+        return self._addons_pos + offset
+
+    def _sorted_record(self, i):
+        '''Returns the record number of the i-th record in id order.'''
+        offset, length = self.sections['addons']
+        i, = UINT.unpack_from(self._buf, offset + length -
+                              UINT.size * (self._count - i))
+        return i
+
+    def _record_id(self, i):
+        '''Returns the addon id of the i-th record.'''
+        return unpack_str(self._buf, self._record_pos(i) + RANGE.size +
+                          DIGEST.size)[0]
+
+    def record(self, i, source=None, start=None, end=None):
+        '''Returns an IndexedAddon for the i-th record. If source is
+        provided, the addon's xml is read from [start:end] in source
+        rather than from the indexed addons.xml, e.g. when the same addon
+        is found in a newer addons.xml.'''
+        (index_start, index_end), fields = unpack_record(
+            self._buf, self._record_pos(i))
+        if source is None:
+            source, start, end = self._xml_file, index_start, index_end
+        return IndexedAddon(*fields, source=source, start=start, end=end)
+
+    def digests(self):
+        '''Returns a dict mapping each addon id to an (md5 digest, record
+        number) tuple. The first record wins if an id is repeated.'''
+        buf, found = self._buf, {}
+        for i in xrange(self._count - 1, -1, -1):
+            pos = self._record_pos(i) + RANGE.size
+            digest, = DIGEST.unpack_from(buf, pos)
+            found[unpack_str(buf, pos + DIGEST.size)[0]] = (digest, i)
+        return found
+
+    def get(self, addon_id):
+        '''Returns the IndexedAddon for the provided id or None. Records
+        are sorted by id, so this is a binary search over the index.
+        '''
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._record_id(self._sorted_record(mid)) < addon_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count:
+            i = self._sorted_record(low)
+            if self._record_id(i) == addon_id:
+                return self.record(i)
+        return None
+
+    def _entries(self, section, prefix):
+        '''Yields a (key, record numbers) tuple for every key starting
+        with prefix in the provided postings section.'''
+        buf = self._buf
+        pos = self.sections[section][0]
+        count, = UINT.unpack_from(buf, pos)
+
+        def entry_pos(i):
+            offset, = UINT.unpack_from(buf, pos + UINT.size * (i + 1))
+            return pos + offset
+
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if unpack_str(buf, entry_pos(mid))[0] < prefix:
+                low = mid + 1
+            else:
+                high = mid
+        for i in xrange(low, count):
+            key, entry = unpack_str(buf, entry_pos(i))
+            if not key.startswith(prefix):
+                return
+            length, = UINT.unpack_from(buf, entry)
+            yield key, list(struct.unpack_from('<%dI' % length, buf,
+                                               entry + UINT.size))
+
+    def _postings(self, section, key):
+        '''Returns the list of record numbers stored for key in the
+        provided postings section.'''
+        for entry_key, numbers in self._entries(section, key):
+            if entry_key == key:
+                return numbers
+            break
+        return []
+
+    def dependents(self, addon_id, recursive=False):
+        '''Returns a list of IndexedAddons which require the provided
+        addon id. If recursive is True, addons which depend on it
+        indirectly are included as well.
+        '''
+        numbers = self._postings('rdeps', addon_id)
+        if recursive:
+            seen = set(numbers)
+            for number in numbers:
+                for dependent in self._postings('rdeps',
+                                                self._record_id(number)):
+                    if (dependent not in seen and
+                            self._record_id(dependent) != addon_id):
+                        seen.add(dependent)
+                        # numbers grows while it's iterated, giving a BFS
+                        numbers.append(dependent)
+        return [self.record(number) for number in numbers]
+
+    def search(self, query, limit=None):
+        '''Returns a list of (score, IndexedAddon) tuples for the addons
+        matching query, best match first. See xam.search for the query
+        syntax.'''
+        lookup = lambda prefix: self._entries('terms', prefix)
+        return [(score, self.record(number)) for score, number
+                in search.rank(lookup, self._count, query, limit)]
+
+    def xml_bytes(self, start, end):
+        '''Returns the bytes found at [start:end] in the cached
+        addons.xml.'''
+        return self._xml_file.xml_bytes(start, end)
+
+
+class IndexedAddon(AddonRecord):
+    '''An AddonRecord loaded from an AddonIndex. Its xml is read from the
+    cached addons.xml when needed.'''
+
+    __slots__ = ()
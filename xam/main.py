@@ -3,6 +3,7 @@ import sys
 import logging
 from cliff.app import App
 from cliff.commandmanager import CommandManager
+from xam import session, parallel, cache
 
 
 class XAM(App):
@@ -18,12 +19,55 @@ class XAM(App):
             command_manager=CommandManager('xam'),
             )
 
+    def build_option_parser(self, *args, **kwargs):
+        parser = super(XAM, self).build_option_parser(*args, **kwargs)
+        parser.add_argument('--timeout', type=float,
+                            default=session.SETTINGS['timeout'],
+                            help='Seconds to wait for a connection or a read '
+                                 'from a remote server.')
+        parser.add_argument('--retries', type=int,
+                            default=session.SETTINGS['retries'],
+                            help='Number of times to retry a failed request.')
+        parser.add_argument('--backoff', type=float,
+                            default=session.SETTINGS['backoff_factor'],
+                            help='Backoff factor between retries.')
+        parser.add_argument('--pool-size', type=int,
+                            default=session.SETTINGS['pool_maxsize'],
+                            help='Number of connections kept alive per host.')
+        parser.add_argument('--no-keep-alive', action='store_true',
+                            help='Close connections after each request.')
+        parser.add_argument('--parse-jobs', type=int,
+                            default=parallel.SETTINGS['processes'],
+                            help='Number of processes parsing a large '
+                                 'addons.xml, 0 for one per CPU. Defaults '
+                                 'to parsing in this process.')
+        parser.add_argument('--cache-size', type=cache.parse_size,
+                            default=os.getenv(cache.CACHE_SIZE_ENV),
+                            help='Byte budget of ~/.xam_cache, e.g. 512M, '
+                                 '0 for no limit. The least recently used '
+                                 'files are evicted when it is exceeded. '
+                                 'Defaults to $%s or %s.'
+                                 % (cache.CACHE_SIZE_ENV, cache.format_size(
+                                     cache.SETTINGS['max_size'])))
+        parser.add_argument('--http-stats', action='store_true',
+                            help='Print the number of HTTP connections '
+                                 'opened and reused when done.')
+        return parser
+
     def initialize_app(self, argv):
         self.log.debug('initialize_app')
 
+        session.configure(timeout=self.options.timeout,
+                          retries=self.options.retries,
+                          backoff_factor=self.options.backoff,
+                          pool_maxsize=self.options.pool_size,
+                          keep_alive=not self.options.no_keep_alive)
+        parallel.configure(processes=self.options.parse_jobs)
+        cache.configure(max_size=self.options.cache_size)
+
         # Set up .xam_cache folder
         try:
-            os.mkdir(os.path.join(os.getenv('HOME'), '.xam_cache'))
+            os.mkdir(cache.cache_dir())
         except OSError:
             pass
 
@@ -35,6 +79,17 @@ class XAM(App):
         if err:
             self.log.debug('got an error: %s', err)
 
+        try:
+            cache.Cache().sync()
+        except (IOError, OSError), exc:
+            self.log.debug("Couldn't update the cache manifest: %s", exc)
+
+        stats = ('HTTP connections: %(opened)d opened, %(reused)d reused, '
+                 '%(requests)d requests' % session.COUNTERS.to_dict())
+        self.log.debug(stats)
+        if self.options.http_stats:
+            self.stderr.write(stats + '\n')
+
 
 def main(argv=sys.argv[1:]):
     myapp = XAM()
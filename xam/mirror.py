@@ -0,0 +1,203 @@
+'''
+    xam.mirror
+    ----------
+
+    Contains the Mirror class which keeps a local copy of a repository's
+    datadir in sync. The mirror's own addons.xml records which version of
+    each addon is on disk, so a sync only downloads the assets of new and
+    upgraded addons. Together with its addons.xml.md5, the mirror
+    directory can be served as a repository.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import re
+import shutil
+import hashlib
+import logging
+from .common import write_atomic
+from .parser import iterparse_elements
+
+
+ADDONS_XML_HEADER = ('<?xml version="1.0" encoding="UTF-8" '
+                     'standalone="yes"?>\n<addons>\n')
+ADDONS_XML_FOOTER = '\n</addons>\n'
+# Assets named after the addon's version. The others, icon.png and
+# fanart.jpg, are overwritten when an addon is upgraded.
+VERSIONED_ASSETS = ['zip', 'changelog']
+
+
+def write_addons_xml(filename, entries):
+    '''Writes an addons.xml listing entries, a list of addon xml strings,
+    to filename and its md5 to filename.md5.'''
+    data = ADDONS_XML_HEADER + '\n'.join(entries) + ADDONS_XML_FOOTER
+    write_atomic(filename, data)
+    write_atomic(filename + '.md5', hashlib.md5(data).hexdigest())
+
+
+class MirrorResult(object):
+    '''The outcome of a sync. updated, failed and removed are lists of
+    addon ids and downloads is the list of DownloadResults.'''
+
+    def __init__(self, current=0, updated=None, failed=None, removed=None,
+                 downloads=None):
+        self.current = current
+        self.updated = updated or []
+        self.failed = failed or []
+        self.removed = removed or []
+        self.downloads = downloads or []
+
+    @property
+    def size(self):
+        '''Returns the number of bytes downloaded.'''
+        return sum(result.size for result in self.downloads)
+
+
+class Mirror(object):
+    '''A local copy of a repository's datadir in directory. Each addon's
+    assets are stored in a directory named after the addon, as on the
+    remote datadir.
+
+    :param repo: A Repository or RepositorySet.
+    :param directory: The mirror's root directory.
+    :param jobs: The number of files to download at once.
+    :param verify: If True, downloaded zips are verified and a corrupt
+                   zip is deleted, see xam.verify.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, repo, directory, jobs=None, verify=False):
+        self.repo = repo
+        self.directory = directory
+        self.jobs = jobs
+        self.verify = verify
+
+    @property
+    def addons_xml_fn(self):
+        return os.path.join(self.directory, 'addons.xml')
+
+    def asset_filename(self, addon_id, url):
+        '''Returns the local filename for an asset url of addon_id.'''
+        return os.path.join(self.directory, addon_id, url.rsplit('/', 1)[1])
+
+    def mirrored(self):
+        '''Returns a dict of addon id -> (version, xml) for the addons
+        listed in the mirror's addons.xml.'''
+        if not os.path.exists(self.addons_xml_fn):
+            return {}
+        with open(self.addons_xml_fn, 'rb') as inp:
+            data = inp.read()
+            inp.seek(0)
+            return dict((elem.get('id'), (elem.get('version'),
+                                          data[start:end]))
+                        for elem, start, end in iterparse_elements(inp))
+
+    def plan(self, mirrored):
+        '''Returns a list of (addon, zip filename, downloads) tuples for
+        the addons which aren't up to date in the mirror, where downloads
+        is a list of (url, filename) tuples, and the number of up to date
+        addons.'''
+        pending, current = [], 0
+        for addon in self.repo.iter_addons():
+            urls = self.repo.addon_data_urls(addon)
+            previous = mirrored.get(addon.id, (None, None))[0]
+            zip_filename = self.asset_filename(addon.id, urls['zip'])
+            if previous == addon.version and os.path.exists(zip_filename):
+                current += 1
+                continue
+            downloads = []
+            for key, url in sorted(urls.items()):
+                filename = self.asset_filename(addon.id, url)
+                # A versioned asset on disk is already the right one
+                if key in VERSIONED_ASSETS and os.path.exists(filename):
+                    continue
+                downloads.append((url, filename))
+            pending.append((addon, zip_filename, downloads))
+        return pending, current
+
+    def verify_zips(self, pending, downloaded):
+        '''Deletes the downloaded zips which fail verification.'''
+        from .verify import verify_zips
+        items = [(zip_filename, addon.id, addon.version, None)
+                 for addon, zip_filename, _ in pending
+                 if zip_filename in downloaded]
+        for result in verify_zips(items):
+            if not result.ok:
+                self.log.warning('* %s is corrupt: %s'
+                                 % (result.filename, '; '.join(result.errors)))
+                os.remove(result.filename)
+
+    def prune(self, keep):
+        '''Deletes the directories of addons not in keep, a dict of addon
+        id -> version, and the versioned assets of older versions. Returns
+        the ids of the deleted addons.'''
+        removed = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not os.path.isdir(path):
+                continue
+            if name not in keep:
+                shutil.rmtree(path)
+                removed.append(name)
+                continue
+            current = set(['%s-%s.zip' % (name, keep[name]),
+                           'changelog-%s.txt' % keep[name]])
+            stale = re.compile(r'^(%s-.+\.zip|changelog-.+\.txt)$'
+                               % re.escape(name))
+            for filename in os.listdir(path):
+                if stale.match(filename) and filename not in current:
+                    os.remove(os.path.join(path, filename))
+        return removed
+
+    def sync(self, prune=False, callback=None):
+        '''Brings the mirror up to date and returns a MirrorResult. If
+        provided, callback is called with each DownloadResult as soon as
+        it completes. An addon whose zip can't be downloaded keeps its
+        previously mirrored version, if any. If prune is True, addons
+        which are no longer in the repository and the assets of old
+        versions are deleted.
+        '''
+        from .download import Downloader, DEFAULT_JOBS
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        mirrored = self.mirrored()
+        pending, current = self.plan(mirrored)
+
+        downloads = []
+        for addon, _, addon_downloads in pending:
+            addon_dir = os.path.join(self.directory, addon.id)
+            if not os.path.isdir(addon_dir):
+                os.mkdir(addon_dir)
+            downloads.extend(addon_downloads)
+        results = Downloader(self.jobs or DEFAULT_JOBS).download(downloads,
+                                                                 callback)
+        downloaded = set(result.filename for result in results if result.ok)
+        if self.verify:
+            self.verify_zips(pending, downloaded)
+
+        result = MirrorResult(current, downloads=results)
+        pending_ids = set(addon.id for addon, _, _ in pending)
+        entries, versions = [], {}
+        for addon in self.repo.iter_addons():
+            urls = self.repo.addon_data_urls(addon)
+            if os.path.exists(self.asset_filename(addon.id, urls['zip'])):
+                entries.append(addon.to_xml_string())
+                versions[addon.id] = addon.version
+                if addon.id in pending_ids:
+                    result.updated.append(addon.id)
+                continue
+            result.failed.append(addon.id)
+            previous = mirrored.get(addon.id)
+            addon_dir = os.path.join(self.directory, addon.id)
+            if previous is not None and os.path.exists(os.path.join(
+                    addon_dir, '%s-%s.zip' % (addon.id, previous[0]))):
+                entries.append(previous[1])
+                versions[addon.id] = previous[0]
+            elif os.path.isdir(addon_dir) and not os.listdir(addon_dir):
+                os.rmdir(addon_dir)
+        write_addons_xml(self.addons_xml_fn, entries)
+        if prune:
+            result.removed = self.prune(versions)
+        return result
@@ -0,0 +1,125 @@
+'''
+    xam.parallel
+    ------------
+
+    Contains the parallel parser for very large addons.xml files. The
+    file is split at <addon> boundaries, found with the scanner of
+    xam.delta, into shards of byte ranges which are parsed by a pool of
+    processes. Workers send back each addon as its binary index record
+    (see xam.index) rather than a pickled element, and the records are
+    yielded in addons.xml order, so the result is identical to parsing
+    the file serially.
+
+    Parallel parsing is opt-in, see configure.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import os
+import re
+from xml.etree import ElementTree as ET
+from .common import UnicodeBuilder
+from .addon import Addon, AddonRecord, XmlFile
+from .index import pack_record, unpack_record, RANGE, DIGEST
+from .delta import scan_addons, digest
+
+
+SETTINGS = {
+    # 1 parses serially, 0 uses a process per CPU
+    'processes': 1,
+}
+
+# Smaller files are parsed serially, starting a pool costs more than it
+# saves
+MIN_PARALLEL_SIZE = 4 * 1024 * 1024
+# Shards per process, more shards balance the work better
+SHARDS_PER_PROCESS = 4
+# Shards are parsed on their own, as utf-8
+ENCODING_RE = re.compile(r'''^\s*<\?xml[^>]*\bencoding\s*=\s*["']([\w.-]+)''')
+UTF8_ENCODINGS = ['utf-8', 'utf8', 'ascii', 'us-ascii']
+
+
+def is_utf8(data):
+    '''Returns True if the xml declaration of data, if any, declares
+    utf-8 or ascii. data is the start of the document.'''
+    match = ENCODING_RE.match(data)
+    return match is None or match.group(1).lower() in UTF8_ENCODINGS
+
+
+def configure(processes=None):
+    '''Sets the number of processes parsing a large addons.xml.'''
+    if processes is not None:
+        SETTINGS['processes'] = processes
+
+
+def parse_processes(filename, processes=None):
+    '''Returns the number of processes to parse the addons.xml at
+    filename with. 1 means it should be parsed serially. processes
+    defaults to the configured number.'''
+    if processes is None:
+        processes = SETTINGS['processes']
+    if processes == 1 or os.path.getsize(filename) < MIN_PARALLEL_SIZE:
+        return 1
+    with open(filename, 'rb') as inp:
+        if not is_utf8(inp.read(1024)):
+            return 1
+    if processes < 1:
+        from multiprocessing import cpu_count
+        processes = cpu_count()
+    return processes
+
+
+def shards(ranges, count):
+    '''Splits a list of (start, end) ranges into count lists of about
+    the same number of bytes.'''
+    if not ranges:
+        return []
+    size = (ranges[-1][1] - ranges[0][0]) / float(count)
+    found, shard, limit = [], [], ranges[0][0] + size
+    for start, end in ranges:
+        shard.append((start, end))
+        if end >= limit:
+            found.append(shard)
+            shard, limit = [], end + size
+    if shard:
+        found.append(shard)
+    return found
+
+
+def parse_shard(item):
+    '''Pool worker which parses the addons of a shard. item is a
+    (filename, identity, ranges) tuple, where identity is the
+    XmlFile.identity of the file the ranges were found in. Returns the
+    list of binary records of the addons.'''
+    filename, identity, ranges = item
+    source = XmlFile(filename)
+    if source.identity != identity:
+        raise IOError('%s was replaced while being parsed' % filename)
+    records = []
+    for start, end in ranges:
+        xml = source.xml_bytes(start, end)
+        addon = Addon(ET.fromstring(xml, parser=UnicodeBuilder()))
+        records.append(pack_record(addon, start, end, digest(xml)))
+    return records
+
+
+def iter_records(source, processes):
+    '''Yields an (AddonRecord, start, end, digest, binary record) tuple
+    for each addon in the addons.xml of source, an XmlFile, in order.
+    The addons are parsed by processes processes.'''
+    from multiprocessing import Pool
+    items = [(source.filename, source.identity, shard) for shard
+             in shards(list(scan_addons(source.data)),
+                       processes * SHARDS_PER_PROCESS)]
+    pool = Pool(processes)
+    try:
+        for records in pool.imap(parse_shard, items):
+            for record in records:
+                (start, end), fields = unpack_record(record, 0)
+                xml_digest, = DIGEST.unpack_from(record, RANGE.size)
+                yield (AddonRecord(*fields, source=source, start=start,
+                                   end=end),
+                       start, end, xml_digest, record)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,124 @@
+'''
+    xam.parser
+    ----------
+
+    Contains an incremental parser for a repository's addons.xml file.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+from xml.etree import ElementTree as ET
+from .common import UnicodeBuilder
+from .addon import Addon
+
+
+# Number of bytes read from the addons.xml source for each parser feed
+CHUNK_SIZE = 64 * 1024
+
+
+def tag_end(data, pos):
+    '''Returns the index just past the '>' closing the tag which starts
+    at data[pos]. Quoted attribute values are skipped.
+    '''
+    quote = None
+    for idx in xrange(pos, len(data)):
+        char = data[idx]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '>':
+            return idx + 1
+    raise ValueError('Unterminated tag at %d' % pos)
+
+
+class AddonTreeBuilder(ET.TreeBuilder):
+    '''A TreeBuilder which detaches every top level <addon> element from
+    the root <addons> element as soon as it is complete. Completed
+    elements are collected in self.completed until they are consumed.
+
+    If self.expat is set to the underlying expat parser, each completed
+    item is an (element, start, end_tag) tuple, where start is the byte
+    offset of the addon's start tag and end_tag the byte offset of its
+    end tag.
+    '''
+
+    def __init__(self):
+        super(AddonTreeBuilder, self).__init__()
+        self.completed = []
+        self.expat = None
+        self.open_start = None
+        self._depth = 0
+
+    def start(self, tag, attrs):
+        self._depth += 1
+        if self._depth == 2 and tag == 'addon' and self.expat is not None:
+            self.open_start = self.expat.CurrentByteIndex
+        return super(AddonTreeBuilder, self).start(tag, attrs)
+
+    def end(self, tag):
+        elem = super(AddonTreeBuilder, self).end(tag)
+        self._depth -= 1
+        if self._depth == 1 and tag == 'addon':
+            # Don't keep a reference from the root, so the element can be
+            # freed as soon as the caller is done with it.
+            self._elem[-1].remove(elem)
+            if self.expat is None:
+                self.completed.append(elem)
+            else:
+                self.completed.append((elem, self.open_start,
+                                       self.expat.CurrentByteIndex))
+                self.open_start = None
+        return elem
+
+    def pop_completed(self):
+        '''Returns and forgets the list of completed addon elements.'''
+        completed, self.completed = self.completed, []
+        return completed
+
+
+def iterparse_elements(fileobj, chunk_size=CHUNK_SIZE, with_bytes=False):
+    '''Yields an (element, start, end) tuple for each <addon> element in
+    the provided file-like object, where start and end are the byte
+    offsets of the addon's xml within the file. Only the bytes of the
+    addon currently being parsed are buffered. If with_bytes is True,
+    the tuples have the addon's xml bytes as a fourth item.
+    '''
+    builder = AddonTreeBuilder()
+    parser = UnicodeBuilder(target=builder)
+    builder.expat = parser.parser
+
+    # buf holds the fed bytes starting at the absolute offset base. Bytes
+    # after the last completed addon are kept since expat may not have
+    # reported a tag which was split across chunks yet.
+    buf, base, last_end = '', 0, 0
+    for chunk in iter(lambda: fileobj.read(chunk_size), ''):
+        buf += chunk
+        parser.feed(chunk)
+        for elem, start, end_tag in builder.pop_completed():
+            if not buf.startswith('</', end_tag - base):
+                # A self closing <addon/>, the start tag is the whole element
+                end_tag = start
+            last_end = base + tag_end(buf, end_tag - base)
+            if with_bytes:
+                yield elem, start, last_end, buf[start - base:last_end - base]
+            else:
+                yield elem, start, last_end
+
+        keep = builder.open_start
+        if keep is None:
+            keep = last_end
+        buf, base = buf[keep - base:], keep
+    parser.close()
+
+
+def iterparse_addons(fileobj, chunk_size=CHUNK_SIZE):
+    '''Yields an Addon for each <addon> element found in the provided
+    file-like object. The file is read and parsed chunk_size bytes at a
+    time, so only the addons which haven't been consumed yet are held in
+    memory. Each Addon keeps the original bytes of its xml, which
+    to_xml_string returns until the addon is modified.
+    '''
+    for elem, _, _, xml in iterparse_elements(fileobj, chunk_size, True):
+        yield Addon(elem, xml)
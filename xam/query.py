@@ -0,0 +1,79 @@
+'''
+    xam.query
+    ---------
+
+    Contains the queries answered by the xam commands. Queries are run
+    against a repository directly, or sent to a running xam server with
+    xam.server.Client, which has the same methods.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+from .repository import get_repo
+
+
+# Environment variable holding the url of a server for the xam commands
+SERVER_ENV = 'XAM_SERVER'
+
+
+def get_queries(reponames, server=None):
+    '''Returns a Client for the xam server at the url server if one is
+    provided, otherwise Queries for the named repositories.'''
+    if server:
+        # Only clients need the server module and its http modules
+        from .server import Client
+        return Client(server, reponames)
+    return Queries.from_names(reponames)
+
+
+class Queries(object):
+    '''Answers queries from a Repository or RepositorySet.'''
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    @classmethod
+    def from_names(cls, reponames):
+        '''Returns Queries for the provided repository names. addons.xml
+        isn't parsed until a query needs it.'''
+        return cls(get_repo(reponames, parse=False))
+
+    def all(self, provider=None, point=None, requires=None, sort='id',
+            reverse=False):
+        '''Returns a list of (id, version) tuples for the addons matching
+        the provided filters. requires is an (addon id, minimum version)
+        tuple, the version may be None.'''
+        table = self.repo.table()
+        rows = table.select()
+        if provider:
+            rows = rows.provider(provider)
+        if point:
+            rows = rows.extension_point(point)
+        if requires:
+            rows = rows.depends_on(*requires)
+        if sort == 'id':
+            # Repeated ids are listed by version
+            rows = rows.sort('version', reverse)
+        rows = rows.sort(sort, reverse)
+        return [(table.id(row), table.version(row)) for row in rows]
+
+    def info(self, addon_id):
+        '''Returns the addon with the provided id or None.'''
+        return self.repo.get(addon_id)
+
+    def depends(self, addon_id, recursive=False, min_version=None):
+        '''Returns a list of (id, version) tuples for the addons which
+        require the provided addon id, optionally at least min_version.
+        If recursive is True, indirect dependents are included.'''
+        if min_version:
+            table = self.repo.table()
+            return [(table.id(row), table.version(row))
+                    for row in table.dependents(addon_id, min_version)]
+        return [(addon.id, addon.version) for addon
+                in self.repo.dependents(addon_id, recursive)]
+
+    def search(self, query, limit=None):
+        '''Returns a list of (score, id, version) tuples for the addons
+        matching query, best match first.'''
+        return [(score, addon.id, addon.version) for score, addon
+                in self.repo.search(query, limit)]
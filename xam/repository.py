@@ -5,54 +5,105 @@
     Contains the Repository class and some helper functions.
 '''
 import os
-import sys
-import base64
+import json
 import logging
-from zipfile import ZipFile
+from StringIO import StringIO
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
 from urlparse import urljoin
+from operator import itemgetter
 from xml.etree import ElementTree as ET
-import requests
 
 import repos
-from .common import urlretrieve, UnicodeBuilder
-from .addon import Addon
+from . import session, version, parallel
+from .common import urlretrieve, write_atomic, file_md5, UnicodeBuilder
+from .cache import safe_cache_fn, cache_fn
+from .addon import AddonRecord, XmlFile, XmlString
+from .parser import iterparse_elements
+from .index import AddonIndex, IndexWriter, index_fn, checksum_key
+from .delta import ChangeSet, iter_delta, digest
+from .search import TermIndex
+from .table import AddonTable
+from .verify import verify_zip, find_addon_xml
+
+
+class RepositoryError(Exception):
+    '''Raised when a repository can't be loaded.'''
 
 
 def get(url):
     '''Returns a response for the given url.'''
-    return requests.get(url).content
+    return session.get(url).content
 
 
-def safe_cache_fn(key):
-    '''Returns an absolute path name for a cached file based on the
-    provided key. The same file will always be returned for a given
-    key.
-    '''
-    return cache_fn(base64.urlsafe_b64encode(key))
+def write_file(filename, content):
+    '''Writes content to filename, atomically, see write_atomic.'''
+    write_atomic(filename, content)
 
 
-def cache_fn(filename):
-    '''Returns an absolute filename in the xam cache folder for the
-    given base filename.
-    '''
-    return os.path.join(os.getenv('HOME'), '.xam_cache', filename)
+def read_meta(filename):
+    '''Returns the dict of metadata stored alongside a cached file, or
+    an empty dict if there is none.'''
+    try:
+        with open(filename + '.meta') as meta_file:
+            return json.load(meta_file)
+    except (IOError, ValueError):
+        return {}
 
 
-def write_file(filename, content):
-    '''Writes content to filename'''
-    with open(filename, 'w') as fileobj:
-        fileobj.write(content)
+def write_meta(filename, meta):
+    '''Stores a dict of metadata alongside a cached file.'''
+    write_file(filename + '.meta', json.dumps(meta))
+
+
+def response_meta(resp):
+    '''Returns a dict of the cache validators sent with a response.'''
+    meta = {}
+    if resp.headers.get('ETag'):
+        meta['etag'] = resp.headers['ETag']
+    if resp.headers.get('Last-Modified'):
+        meta['last_modified'] = resp.headers['Last-Modified']
+    return meta
+
+
+def conditional_headers(meta):
+    '''Returns the request headers to revalidate a cached file with the
+    validators stored in meta.'''
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
 
+def thread_pool(size):
+    '''Returns a ThreadPool with size threads. multiprocessing is only
+    imported when a pool is needed, most commands use a single
+    repository.'''
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(size or 1)
 
-def get_repo(name_or_url):
+
+def get_repo(name_or_url, parse=True):
     '''Returns a repository for a given name or url. name_or_url can be
     an official repository name found in repos.py or it can be a url to
-    a zipped repository file.
+    a zipped repository file. If parse is False, addons.xml isn't parsed
+    up front and addons should be consumed with Repository.iter_addons.
+
+    name_or_url can also be a list of names and urls, in which case a
+    RepositorySet is returned if more than one is given.
     '''
+    if isinstance(name_or_url, (list, tuple)):
+        if len(name_or_url) == 1:
+            return get_repo(name_or_url[0], parse)
+        return RepositorySet.from_names(name_or_url, parse)
     if hasattr(repos, name_or_url.upper()):
-        return Repository(*getattr(repos, name_or_url.upper()))
+        return Repository(*getattr(repos, name_or_url.upper()), parse=parse)
     else:
-        return Repository.from_zip(name_or_url)
+        return Repository.from_zip(name_or_url, parse=parse)
 
 
 class Repository(object):
@@ -60,10 +111,15 @@ class Repository(object):
 
     log = logging.getLogger(__name__)
 
-    def __init__(self, info_url, datadir_url, checksum_url=None):
+    # Processes parsing a large addons.xml, None uses the number set with
+    # xam.parallel.configure
+    parse_processes = None
+
+    def __init__(self, info_url, datadir_url, checksum_url=None, parse=True):
         '''If checksum_url is None, the remote addons.xml will be
         checked for every request. If provided, checksums will be
-        verified to see if an update has occured.
+        verified to see if an update has occured. If parse is False,
+        addons.xml won't be parsed until the addons are requested.
         '''
         self.info_url = info_url
         self.checksum_url = checksum_url
@@ -71,44 +127,61 @@ class Repository(object):
         if not self.datadir_url.endswith('/'):
             self.datadir_url = self.datadir_url + '/'
         self._remote_md5 = None
+        self._remote_md5_meta = {}
         self._local_md5 = None
+        self._checksum = None
         self._addons_xml = None
-        self._addons = []
-        self.xml = None
-        self.parse_addons()
+        self._addons = None
+        self._addons_by_id = None
+        self._dependents = None
+        self._term_index = None
+        self._table = None
+        self._index = None
+        self._previous_index = None
+        if parse:
+            self.parse_addons()
 
     @classmethod
-    def from_zip(cls, zip_url):
+    def from_zip(cls, zip_url, parse=True):
         '''Returns a Repository instance for the provided zip_url.
-        zip_url should be a url to a zipped repository file.
+        zip_url should be a url to a zipped repository file. Raises a
+        RepositoryError if it can't be downloaded or isn't a valid
+        repository addon.
         '''
+        from zipfile import ZipFile
         # TODO: Download zip file to a temp location so it will be cleared
         filename = safe_cache_fn(zip_url)
-        urlretrieve(zip_url, filename)
+        cls.log.info('* Downloading %s to %s' % (zip_url, filename))
+        resp = urlretrieve(zip_url, filename)
+        if resp.status_code != session.OK:
+            raise RepositoryError("Couldn't download the repository zip %s: "
+                                  'HTTP %d' % (zip_url, resp.status_code))
 
         # Attempt to extract the content addon.xml within the zip file
+        verification = verify_zip(filename)
+        if not verification.ok:
+            raise RepositoryError('The repository zip %s is invalid: %s'
+                                  % (zip_url, '; '.join(verification.errors)))
         zipfile = ZipFile(filename)
-        try:
-            addon_xml_filename = (filename for filename in zipfile.namelist()
-                                  if filename.endswith('addon.xml')).next()
-        except StopIteration:
-            sys.exit('This repository doesn\'t appear to contain an addon.xml'
-                     ' file.')
+        addon_xml_filename = find_addon_xml(zipfile.namelist())
 
         # Parse the addon.xml and extract the three URLs
         with zipfile.open(addon_xml_filename) as addon_xml:
             xml = ET.parse(addon_xml, parser=UnicodeBuilder())
         extension = xml.find('extension[@point="xbmc.addon.repository"]')
+        if extension is None:
+            raise RepositoryError('The addon in %s is not a repository'
+                                  % zip_url)
         info_url = extension.find('info').text
         checksum_url = extension.find('checksum').text
         datadir_url = extension.find('datadir').text
 
         # TODO: Add support for non-zipped addons
-        if extension.find('datadir').get('zip') != True:
-            self.log.warning('Repositories which do not zip addons are '
+        if extension.find('datadir').get('zip') != 'true':
+            cls.log.warning('Repositories which do not zip addons are '
                    'unsupported at this time. The download functionality might'
                    ' not work properly.')
-        return cls(info_url, datadir_url, checksum_url)
+        return cls(info_url, datadir_url, checksum_url, parse=parse)
 
     @property
     def addons_xml(self):
@@ -117,30 +190,94 @@ class Repository(object):
         attempt to use a cached version of addons.xml if the checksum
         is still valid.
         '''
-        if self.remote_md5 is None or self.local_md5 != self.remote_md5:
-            # Download everything
-            self.log.debug('* Updating addons.xml from remote...')
-            self._addons_xml = get(self.info_url)
-            if self.checksum_url is not None:
-                # Some repos don't have a checksum URL, so we will have to
-                # download them everytime
-                write_file(safe_cache_fn(self.info_url), self._addons_xml)
-                write_file(safe_cache_fn(self.checksum_url), self.remote_md5)
-        elif self._addons_xml is None:
-            self.log.debug( '* Local addons.xml is up to date...')
-            with open(safe_cache_fn(self.info_url)) as addons_file:
+        if self._addons_xml is None:
+            addons_file = self.open_addons_xml()
+            try:
                 self._addons_xml = addons_file.read()
+            finally:
+                addons_file.close()
         return self._addons_xml
 
+    def open_addons_xml(self):
+        '''Returns a file-like object for the current version of the
+        repository's addons.xml, refreshing the cached copy first if
+        needed.
+        '''
+        if self._addons_xml is not None:
+            return StringIO(self._addons_xml)
+        self.refresh()
+        return open(safe_cache_fn(self.info_url), 'rb')
+
+    def refresh(self):
+        '''Makes sure the cached addons.xml is up to date and returns its
+        checksum.
+
+        If this repository has a checksum_url, the cached copy is used if
+        the checksum is still valid. Some repos don't have a checksum URL,
+        so addons.xml is revalidated with a conditional request instead.
+        Either way, an unchanged remote file costs no body bytes.
+        '''
+        if self._checksum is not None:
+            return self._checksum
+
+        filename = safe_cache_fn(self.info_url)
+        if self.checksum_url is not None:
+            # Fetch the checksum before addons.xml, so it can't describe a
+            # newer addons.xml than the one downloaded
+            remote_md5 = self.remote_md5
+            if self.local_md5 == remote_md5 and os.path.exists(filename):
+                self.log.debug('* Local addons.xml is up to date...')
+            else:
+                self.log.debug('* Updating addons.xml from remote...')
+                self._previous_index = self.open_previous_index(
+                    self.local_md5)
+                urlretrieve(self.info_url, filename).raise_for_status()
+                md5_filename = safe_cache_fn(self.checksum_url)
+                write_file(md5_filename, self.remote_md5)
+                write_meta(md5_filename, self._remote_md5_meta)
+                self._local_md5 = self.remote_md5
+            self._checksum = self.remote_md5
+        else:
+            meta = read_meta(filename) if os.path.exists(filename) else {}
+            if 'md5' not in meta:
+                meta = {}
+            previous_index = self.open_previous_index(meta.get('md5'))
+            resp = urlretrieve(self.info_url, filename,
+                               headers=conditional_headers(meta))
+            if resp.status_code == session.NOT_MODIFIED:
+                self.log.debug('* Local addons.xml is up to date...')
+            else:
+                resp.raise_for_status()
+                self._previous_index = previous_index
+                self.log.debug('* Updated addons.xml from remote...')
+                meta = response_meta(resp)
+                meta['md5'] = file_md5(filename)
+                write_meta(filename, meta)
+            self._checksum = meta['md5']
+        return self._checksum
+
     @property
     def remote_md5(self):
         '''Returns the remote md5 checksum for a repository or None if
-        the repository doesn't have a checksum url.
+        the repository doesn't have a checksum url. The checksum is
+        revalidated with a conditional request, so an unchanged checksum
+        file isn't downloaded again.
         '''
         if self.checksum_url is None:
             return None
         if self._remote_md5 is None:
-            self._remote_md5 = get(self.checksum_url)
+            headers = {}
+            if self.local_md5 is not None:
+                headers = conditional_headers(
+                    read_meta(safe_cache_fn(self.checksum_url)))
+            resp = session.get(self.checksum_url, headers=headers)
+            if resp.status_code == session.NOT_MODIFIED:
+                self._remote_md5 = self.local_md5
+                self._remote_md5_meta = read_meta(
+                    safe_cache_fn(self.checksum_url))
+            else:
+                self._remote_md5 = resp.content
+                self._remote_md5_meta = response_meta(resp)
         return self._remote_md5
 
     @property
@@ -158,14 +295,229 @@ class Repository(object):
 
     @property
     def addons(self):
-        '''Returns a list of Addons for this repository'''
+        '''Returns a list of AddonRecords for this repository'''
+        if self._addons is None:
+            self.parse_addons()
         return self._addons
 
+    def iter_addons(self):
+        '''Yields an AddonRecord for each addon in this repository. If the
+        repository hasn't been parsed yet, the addon index is used when
+        it is up to date. Otherwise the cached addons.xml is parsed
+        incrementally so the whole document is never held in memory.
+
+        If addons.xml was just updated and the index of the previous
+        version is available, only the addons whose xml changed are
+        parsed and the differences are saved as a ChangeSet, see
+        Repository.changes. Otherwise a large addons.xml can be parsed by
+        a pool of processes, see xam.parallel.
+        '''
+        if self._addons is not None:
+            for addon in self._addons:
+                yield addon
+            return
+
+        index = self.load_index()
+        if index is not None:
+            for addon in index:
+                yield addon
+            return
+
+        addons_file = self.open_addons_xml()
+        if not isinstance(addons_file, file):
+            source = XmlString(addons_file.getvalue())
+            for elem, start, end in iterparse_elements(addons_file):
+                yield AddonRecord.from_element(elem, source, start, end)
+            return
+
+        # Only build an index for the cached addons.xml
+        writer = IndexWriter()
+        source = XmlFile(addons_file.name, addons_file)
+        previous, changes = self._previous_index, None
+        try:
+            processes = 1
+            if previous is None:
+                processes = parallel.parse_processes(addons_file.name,
+                                                     self.parse_processes)
+            if processes > 1:
+                self.log.debug('* Parsing addons.xml with %d processes...',
+                               processes)
+                items = parallel.iter_records(source, processes)
+            elif previous is None:
+                items = self._parse_elements(addons_file, source)
+            else:
+                self.log.debug('* Updating addon index from %s...',
+                               previous.checksum)
+                changes = ChangeSet(previous.checksum,
+                                    checksum_key(self.refresh()))
+                items = iter_delta(previous, source, source.data, changes)
+            for item in items:
+                writer.add(*item)
+                yield item[0]
+        finally:
+            addons_file.close()
+
+        self.log.debug('* Writing addon index...')
+        writer.write(self.index_filename, self.refresh())
+        if changes is not None:
+            changes.save(self.changes_filename)
+        self._previous_index = None
+
+    def to_dicts(self):
+        '''Returns a list of the dicts of every addon, see
+        AddonRecord.to_dict, in a single pass over the addons. No xml is
+        parsed or serialized if the addon index is up to date, each
+        addon's xml is its original bytes in the cached addons.xml.'''
+        return [addon.to_dict() for addon in self.iter_addons()]
+
+    def _parse_elements(self, addons_file, source):
+        '''Yields an (AddonRecord, start, end, digest) tuple for each addon
+        parsed from addons_file.'''
+        for elem, start, end in iterparse_elements(addons_file):
+            yield (AddonRecord.from_element(elem, source, start, end),
+                   start, end, digest(source.xml_bytes(start, end)))
+
+    @property
+    def index_filename(self):
+        '''The filename of this repository's cached addon index'''
+        return index_fn(safe_cache_fn(self.info_url))
+
+    @property
+    def changes_filename(self):
+        '''The filename of the ChangeSet saved by the last delta update'''
+        return safe_cache_fn(self.info_url) + '.changes.json'
+
+    def open_previous_index(self, checksum):
+        '''Returns the AddonIndex of the cached addons.xml with the
+        provided checksum, before it's replaced by a newer version, or
+        None if it has no index.'''
+        filename = safe_cache_fn(self.info_url)
+        if not checksum or not os.path.exists(filename):
+            return None
+        return AddonIndex.open(self.index_filename, checksum, filename)
+
+    def changes(self):
+        '''Brings the addon index up to date and returns the ChangeSet of
+        the last update of addons.xml, or None if no update has been
+        recorded yet.'''
+        if self._addons is None and self.load_index() is None:
+            for _ in self.iter_addons():
+                pass
+        return ChangeSet.load(self.changes_filename)
+
+    def load_index(self):
+        '''Returns the AddonIndex for the cached addons.xml or None if
+        the cache isn't up to date or no index has been written yet.
+        '''
+        if self._index is None:
+            self._index = AddonIndex.open(self.index_filename,
+                                          self.refresh(),
+                                          safe_cache_fn(self.info_url))
+        return self._index
+
     def parse_addons(self):
-        '''Parses this repository's addons.xml file and creates Addon
+        '''Parses this repository's addons.xml file and creates AddonRecord
         instances for each addon listed.'''
-        self.xml = ET.fromstring(self.addons_xml, parser=UnicodeBuilder())
-        self._addons = [Addon(addon) for addon in self.xml.findall('addon')]
+        self._addons = None
+        self._addons_by_id = None
+        self._dependents = None
+        self._term_index = None
+        self._table = None
+        self._addons = list(self.iter_addons())
+
+    def get(self, addon_id, default=None):
+        '''Returns the addon with the provided id or default if this
+        repository has no such addon. If the repository hasn't been
+        parsed and the addon index is up to date, the index is searched
+        directly instead of loading every addon.
+        '''
+        if self._addons is None:
+            index = self.load_index()
+            if index is not None:
+                addon = index.get(addon_id)
+                return default if addon is None else addon
+
+        if self._addons_by_id is None:
+            by_id = {}
+            for addon in self.addons:
+                # The first addon listed wins if an id is repeated
+                by_id.setdefault(addon.id, addon)
+            self._addons_by_id = by_id
+        return self._addons_by_id.get(addon_id, default)
+
+    def get_many(self, addon_ids):
+        '''Returns an OrderedDict of addons keyed by id for each of the
+        provided addon_ids found in this repository. Missing ids are
+        left out.
+        '''
+        found = OrderedDict()
+        for addon_id in addon_ids:
+            addon = self.get(addon_id)
+            if addon is not None:
+                found[addon_id] = addon
+        return found
+
+    def dependents(self, addon_id, recursive=False):
+        '''Returns a list of addons which list the provided addon id as
+        a dependency. If recursive is True, addons which depend on it
+        indirectly are included as well. The reverse dependency map is
+        read from the addon index when it is up to date, otherwise it is
+        built once from the parsed addons.
+        '''
+        if self._addons is None:
+            index = self.load_index()
+            if index is not None:
+                return index.dependents(addon_id, recursive)
+
+        if self._dependents is None:
+            dependents = {}
+            for addon in self.addons:
+                for dependency_id in addon.dependencies:
+                    dependents.setdefault(dependency_id, []).append(addon)
+            self._dependents = dependents
+
+        found = list(self._dependents.get(addon_id, []))
+        if recursive:
+            seen = set(addon.id for addon in found)
+            seen.add(addon_id)
+            for addon in found:
+                for dependent in self._dependents.get(addon.id, []):
+                    if dependent.id not in seen:
+                        seen.add(dependent.id)
+                        found.append(dependent)
+        return found
+
+    def table(self):
+        '''Returns an AddonTable of this repository's addons for
+        repository wide queries. The table is built once.'''
+        if self._table is None:
+            self._table = AddonTable.from_addons(self.iter_addons())
+        return self._table
+
+    def search(self, query, limit=None):
+        '''Returns a list of (score, addon) tuples for the addons matching
+        query, best match first. The term index stored in the addon
+        index is used when it is up to date, otherwise one is built in
+        memory from the parsed addons. See xam.search for the query
+        syntax.
+        '''
+        if self._addons is None:
+            index = self.load_index()
+            if index is not None:
+                return index.search(query, limit)
+
+        if self._term_index is None:
+            self._term_index = TermIndex(self.addons)
+        return self._term_index.search(query, limit)
+
+    def __getitem__(self, addon_id):
+        addon = self.get(addon_id)
+        if addon is None:
+            raise KeyError(addon_id)
+        return addon
+
+    def __contains__(self, addon_id):
+        return self.get(addon_id) is not None
 
     def addon_data_urls(self, addon):
         '''Returns a dict of urls for the provided addons assets.
@@ -180,3 +532,158 @@ class Repository(object):
             'changelog': urljoin(addon_dir,
                                  'changelog-%s.txt' % addon.version),
         }
+
+
+class RepositorySet(object):
+    '''A merged view of several repositories. When an addon is available
+    in more than one repository, the newest version wins. If versions are
+    equal, the repository listed first wins.
+    '''
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, repositories):
+        self.repositories = list(repositories)
+        self._addons = None
+        self._table = None
+        self._origins = {}
+
+    @classmethod
+    def from_names(cls, names_or_urls, parse=True):
+        '''Returns a RepositorySet for the provided repository names or
+        zipped repository urls. Repositories are created and refreshed
+        concurrently.
+        '''
+        pool = thread_pool(len(names_or_urls))
+        try:
+            repositories = pool.map(
+                lambda name: get_repo(name, parse=False), names_or_urls)
+        finally:
+            pool.close()
+            pool.join()
+        repos_set = cls(repositories)
+        repos_set.refresh()
+        if parse:
+            repos_set.parse_addons()
+        return repos_set
+
+    def refresh(self):
+        '''Brings every repository's cached addons.xml up to date. All
+        checksums are fetched in parallel first, then whichever addons.xml
+        files changed are downloaded in parallel.'''
+        pool = thread_pool(len(self.repositories))
+        try:
+            pool.map(lambda repo: repo.remote_md5, self.repositories)
+            pool.map(lambda repo: repo.refresh(), self.repositories)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _newest(self, candidates):
+        '''Returns the newest addon from a list of (repository, addon)
+        tuples and remembers which repository it came from.'''
+        found = version.newest(candidates, key=itemgetter(1))
+        if found is None:
+            return None
+        repo, addon = found
+        self._origins[addon.id] = repo
+        return addon
+
+    @property
+    def addons(self):
+        '''Returns the merged list of Addons'''
+        if self._addons is None:
+            self.parse_addons()
+        return self._addons
+
+    def iter_addons(self):
+        '''Yields the merged Addons'''
+        return iter(self.addons)
+
+    def parse_addons(self):
+        '''Merges the addons of every repository.'''
+        candidates = OrderedDict()
+        for repo in self.repositories:
+            for addon in repo.iter_addons():
+                candidates.setdefault(addon.id, []).append((repo, addon))
+        self._addons = [self._newest(found) for found in candidates.values()]
+        self._table = None
+
+    def to_dicts(self):
+        '''Returns a list of the dicts of every merged addon.'''
+        return [addon.to_dict() for addon in self.addons]
+
+    def table(self):
+        '''Returns an AddonTable of the merged addons.'''
+        if self._table is None:
+            self._table = AddonTable.from_addons(self.addons)
+        return self._table
+
+    def get(self, addon_id, default=None):
+        '''Returns the newest addon with the provided id in any of the
+        repositories or default.'''
+        addon = self._newest([(repo, repo.get(addon_id))
+                              for repo in self.repositories
+                              if addon_id in repo])
+        return default if addon is None else addon
+
+    def get_many(self, addon_ids):
+        '''Returns an OrderedDict of the addons found for addon_ids.'''
+        found = OrderedDict()
+        for addon_id in addon_ids:
+            addon = self.get(addon_id)
+            if addon is not None:
+                found[addon_id] = addon
+        return found
+
+    def __getitem__(self, addon_id):
+        addon = self.get(addon_id)
+        if addon is None:
+            raise KeyError(addon_id)
+        return addon
+
+    def __contains__(self, addon_id):
+        return any(addon_id in repo for repo in self.repositories)
+
+    def dependents(self, addon_id, recursive=False):
+        '''Returns a list of the merged addons which list the provided
+        addon id as a dependency, optionally including indirect
+        dependents.'''
+        found, seen = [], set([addon_id])
+        queue = [addon_id]
+        for dependency_id in queue:
+            candidate_ids = OrderedDict()
+            for repo in self.repositories:
+                for addon in repo.dependents(dependency_id):
+                    candidate_ids[addon.id] = None
+            for candidate_id in candidate_ids:
+                addon = self.get(candidate_id)
+                # Only the winning version decides if it's a dependent
+                if (candidate_id not in seen and
+                        dependency_id in addon.dependencies):
+                    seen.add(candidate_id)
+                    found.append(addon)
+                    if recursive:
+                        queue.append(candidate_id)
+        return found
+
+    def search(self, query, limit=None):
+        '''Returns a list of (score, addon) tuples for the merged addons
+        matching query, best match first. Each repository is searched
+        with its own index and only the winning version of an addon is
+        kept.'''
+        results = []
+        for repo in self.repositories:
+            for score, addon in repo.search(query):
+                self.get(addon.id)
+                if self._origins[addon.id] is repo:
+                    results.append((score, addon))
+        results.sort(key=lambda item: -item[0])
+        return results[:limit]
+
+    def addon_data_urls(self, addon):
+        '''Returns the asset urls for the provided addon from the
+        repository it was taken from.'''
+        if addon.id not in self._origins:
+            self.get(addon.id)
+        return self._origins[addon.id].addon_data_urls(addon)
@@ -0,0 +1,274 @@
+'''
+    xam.resolver
+    ------------
+
+    Contains a dependency resolver for the addons of a repository. For an
+    addon, the resolver computes the transitive closure of its
+    dependencies and every problem found in it:
+
+    * a dependency which isn't in the repository
+    * a dependency whose newest available version is older than the
+      version required
+    * a dependency cycle
+
+    The dependency graph is walked with Tarjan's strongly connected
+    components algorithm. The problems of each component are computed
+    once from the components it depends on and shared by every addon
+    which reaches it, so checking a whole repository takes about linear
+    time in the size of the graph. Closures are only walked when an addon
+    is resolved.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+from .version import Version
+
+
+MISSING = 'missing'
+CONFLICT = 'conflict'
+CYCLE = 'cycle'
+
+
+def is_builtin(addon_id):
+    '''Returns True for the xbmc.* addons, e.g. xbmc.python, which are
+    provided by XBMC itself rather than a repository.'''
+    return addon_id.startswith('xbmc.')
+
+
+class Problem(object):
+    '''An unsatisfiable dependency constraint.'''
+
+    __slots__ = ('kind', 'addon_id', 'dependency_id', 'required',
+                 'available', 'cycle')
+
+    def __init__(self, kind, addon_id, dependency_id=None, required=None,
+                 available=None, cycle=None):
+        self.kind = kind
+        self.addon_id = addon_id
+        self.dependency_id = dependency_id
+        self.required = required
+        self.available = available
+        self.cycle = cycle
+
+    @property
+    def key(self):
+        return (self.addon_id, self.dependency_id or u'', self.kind,
+                self.required or u'', self.available or u'',
+                self.cycle or ())
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return self.key != other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return '<Problem %s %s>' % (self.kind, self.addon_id)
+
+    def __str__(self):
+        if self.kind == MISSING:
+            return ("%s requires %s %s, which isn't in the repository"
+                    % (self.addon_id, self.dependency_id, self.required))
+        if self.kind == CONFLICT:
+            return ('%s requires %s %s, but the newest version available '
+                    'is %s' % (self.addon_id, self.dependency_id,
+                               self.required, self.available))
+        return 'dependency cycle between %s' % ', '.join(self.cycle)
+
+
+class Resolution(object):
+    '''The result of resolving an addon's dependencies.
+
+    :param addon: The resolved addon.
+    :param closure: The list of addons the addon depends on, directly or
+                    indirectly, with dependencies listed before the addons
+                    requiring them.
+    :param problems: The sorted list of Problems found in the closure.
+    '''
+
+    def __init__(self, addon, closure, problems):
+        self.addon = addon
+        self.closure = closure
+        self.problems = problems
+
+    @property
+    def ok(self):
+        return not self.problems
+
+
+class Resolver(object):
+    '''Resolves dependencies against a Repository or RepositorySet, or any
+    object with get(addon_id) and iter_addons() methods.
+
+    :param ignore: A function returning True for dependency ids which
+                   shouldn't be resolved, by default the xbmc.* addons.
+    '''
+
+    def __init__(self, repo, ignore=is_builtin):
+        self.repo = repo
+        self.ignore = ignore
+        # addon id -> (addon, successor ids, direct problems)
+        self._nodes = {}
+        # addon id -> component number, components are numbered in the
+        # order they are completed, so dependencies come first
+        self._component_of = {}
+        # component number -> frozenset of the component's problems
+        self._components = []
+
+    def _node(self, addon_id):
+        '''Returns the memoized (addon, successors, problems) tuple for an
+        addon id in the repository.'''
+        try:
+            return self._nodes[addon_id]
+        except KeyError:
+            addon = self.repo.get(addon_id)
+            node = self._nodes[addon_id] = self._examine(addon)
+            return node
+
+    def _examine(self, addon):
+        '''Returns an (addon, successors, problems) tuple for the addon's
+        direct dependencies.'''
+        successors, problems = [], []
+        for dependency_id, required in addon.dependencies.items():
+            if self.ignore(dependency_id):
+                continue
+            dependency = self.repo.get(dependency_id)
+            if dependency is None:
+                problems.append(Problem(MISSING, addon.id, dependency_id,
+                                        required))
+                continue
+            successors.append(dependency_id)
+            if required and Version(required) > dependency.parsed_version:
+                problems.append(Problem(CONFLICT, addon.id, dependency_id,
+                                        required, dependency.version))
+        return addon, successors, problems
+
+    def _solve(self, root):
+        '''Computes the components reachable from root which haven't been
+        solved yet. Tarjan's algorithm is run iteratively so deep graphs
+        don't hit the recursion limit.'''
+        index, lowlink = {root: 0}, {root: 0}
+        stack, on_stack = [root], set([root])
+        work = [(root, iter(self._node(root)[1]))]
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if succ in self._component_of:
+                    continue
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(self._node(succ)[1])))
+                    break
+                elif succ in on_stack:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    self._add_component(members)
+
+    def _add_component(self, members):
+        '''Memoizes the problems of a completed component. Every component
+        it depends on has already been completed.'''
+        number = len(self._components)
+        member_set = set(members)
+        cyclic = (len(members) > 1 or
+                  members[0] in self._node(members[0])[1])
+        direct, inherited = set(), {}
+        for member in members:
+            self._component_of[member] = number
+            _, successors, direct_problems = self._node(member)
+            direct.update(direct_problems)
+            for succ in successors:
+                if succ not in member_set:
+                    problems = self._components[self._component_of[succ]]
+                    if problems:
+                        inherited[id(problems)] = problems
+        if cyclic:
+            cycle = tuple(sorted(members))
+            direct.add(Problem(CYCLE, cycle[0], cycle=cycle))
+
+        if not direct and len(inherited) <= 1:
+            # Share the problems of the only component with problems, so a
+            # long chain doesn't copy them at every link
+            problems = inherited.values()[0] if inherited else frozenset()
+        else:
+            problems = frozenset(direct.union(*inherited.values()))
+        self._components.append(problems)
+
+    def _problems(self, addon_id):
+        '''Returns the frozenset of problems for an addon id in the
+        repository.'''
+        if addon_id not in self._component_of:
+            self._solve(addon_id)
+        return self._components[self._component_of[addon_id]]
+
+    def _closure(self, addon, successors):
+        '''Returns the list of addons reachable from successors, leaving
+        out addon itself, with dependencies before their dependents.'''
+        seen = set(successors)
+        queue = list(successors)
+        for addon_id in queue:
+            for succ in self._node(addon_id)[1]:
+                if succ not in seen:
+                    seen.add(succ)
+                    queue.append(succ)
+        seen.discard(addon.id)
+        # Dependencies are completed, and numbered, before their dependents
+        order = sorted(seen, key=lambda addon_id: (
+            self._component_of[addon_id], addon_id))
+        return [self._node(addon_id)[0] for addon_id in order]
+
+    def resolve(self, addon):
+        '''Returns a Resolution for the provided addon id or addon. An
+        addon which isn't in the repository, e.g. a local addon.xml, is
+        resolved against the repository as well. Raises a KeyError for an
+        unknown addon id.'''
+        if isinstance(addon, basestring):
+            if self.repo.get(addon) is None:
+                raise KeyError(addon)
+            problems = self._problems(addon)
+            addon, successors, _ = self._node(addon)
+        else:
+            _, successors, problems = self._examine(addon)
+            problems = set(problems)
+            for succ in successors:
+                problems.update(self._problems(succ))
+        return Resolution(addon, self._closure(addon, successors),
+                          sorted(problems, key=lambda problem: problem.key))
+
+    def check(self, addon_ids=None):
+        '''Returns an OrderedDict mapping addon ids to their sorted lists of
+        Problems, for every addon with a problem. By default every addon
+        in the repository is checked.'''
+        if addon_ids is None:
+            # Parsed up front, the lookups of the checks would otherwise
+            # parse addons.xml again while it's being iterated
+            addon_ids = [addon.id for addon in self.repo.addons]
+        found = OrderedDict()
+        for addon_id in addon_ids:
+            if addon_id in found:
+                continue
+            problems = self._problems(addon_id)
+            if problems:
+                found[addon_id] = sorted(problems,
+                                         key=lambda problem: problem.key)
+        return found
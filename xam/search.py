@@ -0,0 +1,178 @@
+'''
+    xam.search
+    ----------
+
+    Contains the tokenizer, query parser and ranking used by xam search.
+    Addons are indexed by the terms found in their id, name, provider,
+    summaries, descriptions, dependencies and extensions. Postings are keyed by
+    "field:term", so a query term can be restricted to a single field and
+    prefixes are a contiguous range of keys.
+
+    Query syntax::
+
+        khan academy          addons matching both terms in any field
+        name:khan             only match the term in the addon name
+        provider:jbel video   fields can be mixed with plain terms
+
+    Every query term has to match, either exactly or as the prefix of an
+    indexed term. Results are ranked by the field weights below, the
+    number of times a term appears and how rare the term is.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import re
+import math
+from bisect import bisect_left
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+
+
+# Weight of a term found in each field
+FIELDS = OrderedDict([
+    ('id', 8),
+    ('name', 6),
+    ('provider', 3),
+    ('summary', 2),
+    ('description', 1),
+    ('requires', 1),
+    ('extension', 1),
+])
+
+# Weight multiplier for a query term which only matches a term's prefix
+PREFIX_WEIGHT = 0.5
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    '''Returns a list of the lowercased word tokens found in text.'''
+    if not text:
+        return []
+    if isinstance(text, str):
+        text = text.decode('utf-8')
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+def tokenize_words(query):
+    '''Returns the whitespace separated words in query.'''
+    if isinstance(query, str):
+        query = query.decode('utf-8')
+    return query.split()
+
+
+def term_key(field, term):
+    '''Returns the postings key for a term found in field.'''
+    return u'%s:%s' % (field, term)
+
+
+def addon_fields(addon):
+    '''Yields a (field, text) tuple for each piece of searchable text in
+    the provided Addon.'''
+    yield 'id', addon.id
+    yield 'name', addon.name
+    yield 'provider', addon.provider
+    for summary in (addon.summaries or {}).values():
+        yield 'summary', summary
+    for description in (addon.descriptions or {}).values():
+        yield 'description', description
+    for dependency_id in addon.dependencies:
+        yield 'requires', dependency_id
+    for attrs, children in addon.extension_items:
+        for _, value in attrs:
+            yield 'extension', value
+        for _, text in children:
+            yield 'extension', text
+
+
+def add_terms(postings, number, addon):
+    '''Adds the terms of the provided Addon to postings, a dict mapping
+    term keys to lists of record numbers. A record number is repeated
+    for each occurrence of a term.'''
+    for field, text in addon_fields(addon):
+        for term in tokenize(text):
+            postings.setdefault(term_key(field, term), []).append(number)
+
+
+def parse_query(query):
+    '''Returns a list of (fields, term) tuples for the provided query
+    string, where fields is the list of fields the term may match.'''
+    terms = []
+    for word in tokenize_words(query):
+        field, sep, text = word.partition(':')
+        if sep and field.lower() in FIELDS:
+            fields = [field.lower()]
+        else:
+            fields, text = FIELDS.keys(), word
+        terms.extend((fields, term) for term in tokenize(text))
+    return terms
+
+
+def rank(lookup, count, query, limit=None):
+    '''Returns a list of (score, record number) tuples for the records
+    matching every term in query, best match first.
+
+    :param lookup: A function which yields a (key, record numbers) tuple
+                   for every postings key starting with a given prefix.
+    :param count: The total number of records.
+    '''
+    scores = None
+    for fields, term in parse_query(query):
+        term_scores = {}
+        for field in fields:
+            exact_key = term_key(field, term)
+            for key, numbers in lookup(exact_key):
+                weight = FIELDS[field]
+                if key != exact_key:
+                    weight *= PREFIX_WEIGHT
+                # Rare terms count for more than common ones
+                idf = 1 + math.log(float(count) / (1 + len(set(numbers))))
+                for number in numbers:
+                    term_scores[number] = (term_scores.get(number, 0) +
+                                           weight * idf)
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = dict((number, score + term_scores[number])
+                          for number, score in scores.iteritems()
+                          if number in term_scores)
+        if not scores:
+            return []
+
+    if scores is None:
+        # The query had no terms
+        return []
+    ranked = sorted(((score, number) for number, score
+                     in scores.iteritems()),
+                    key=lambda item: (-item[0], item[1]))
+    return ranked[:limit]
+
+
+class TermIndex(object):
+    '''An in memory term index for a list of addons, used when there is
+    no up to date index file.'''
+
+    def __init__(self, addons):
+        self.addons = list(addons)
+        postings = {}
+        for number, addon in enumerate(self.addons):
+            add_terms(postings, number, addon)
+        self.postings = postings
+        self.keys = sorted(postings)
+
+    def lookup(self, prefix):
+        '''Yields a (key, record numbers) tuple for every key starting
+        with prefix.'''
+        keys = self.keys
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield keys[i], self.postings[keys[i]]
+            i += 1
+
+    def search(self, query, limit=None):
+        '''Returns a list of (score, addon) tuples for the addons
+        matching query, best match first.'''
+        return [(score, self.addons[number]) for score, number
+                in rank(self.lookup, len(self.addons), query, limit)]
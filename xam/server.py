@@ -0,0 +1,379 @@
+'''
+    xam.server
+    ----------
+
+    Contains a local query server, which keeps parsed repositories in
+    memory so repeated xam commands don't pay for startup, checksum
+    requests and parsing every time. Repositories are loaded on first
+    use and refreshed in the background, a new addons.xml is only parsed
+    when a checksum changes.
+
+    The server answers GET requests with JSON::
+
+        /all?repo=FRODO&provider=...&point=...&requires=...&sort=id
+        /info?repo=FRODO&id=plugin.video.example
+        /depends?repo=FRODO&id=...&recursive=1&min_version=1.0
+        /search?repo=FRODO&q=...&limit=10
+        /status
+
+    The repo parameter can be repeated to query a RepositorySet, only the
+    repositories in xam.repos can be queried. Client sends the queries of
+    the xam commands to a running server.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import json
+import time
+import socket
+import urllib2
+import logging
+import threading
+from urllib import urlencode
+from urlparse import parse_qs
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from xml.etree import ElementTree as ET
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+from .common import UnicodeBuilder
+from .addon import AddonRecord, XmlString
+from .repository import get_repo
+from . import repos
+from .cache import Cache
+from .query import Queries
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Seconds between checksum checks of the loaded repositories
+DEFAULT_INTERVAL = 300
+# Number of repository sets kept in memory, the least recently queried
+# set is dropped when another one is loaded
+DEFAULT_MAX_HOT = 8
+
+
+class ServerError(Exception):
+    '''Raised by Client when the server can't answer a query.'''
+
+
+class UnknownRepository(ValueError):
+    '''Raised for a repository name which isn't one of xam.repos.'''
+
+
+def repo_key(reponames):
+    '''Returns the key of the HotRepository for a list of repository
+    names, the upper cased names sorted and without duplicates. Only the
+    repositories in xam.repos can be queried, so a client can't make the
+    server download an arbitrary url; an UnknownRepository is raised for
+    any other name.'''
+    key = tuple(sorted(set(name.upper() for name in reponames)))
+    for name in key:
+        if name.startswith('_') or not isinstance(getattr(repos, name, None),
+                                                  tuple):
+            raise UnknownRepository('Unknown repository %s' % name)
+    return key
+
+
+def checksums(repo):
+    '''Returns a tuple of the up to date checksums of a Repository or of
+    every repository in a RepositorySet.'''
+    return tuple(member.refresh()
+                 for member in getattr(repo, 'repositories', [repo]))
+
+
+class HotRepository(object):
+    '''A repository, or RepositorySet, which is kept parsed in memory.
+    Queries hold self.lock, a refresh swaps in a new repository once it's
+    completely parsed so queries are never blocked by parsing.'''
+
+    def __init__(self, reponames):
+        self.reponames = tuple(reponames)
+        self.lock = threading.Lock()
+        self.queries, self.checksums = self._load()
+        self.loaded = time.time()
+
+    def _load(self, repo=None):
+        '''Returns Queries for a freshly parsed repository and its
+        checksums.'''
+        if repo is None:
+            repo = get_repo(list(self.reponames), parse=False)
+        repo_checksums = checksums(repo)
+        repo.parse_addons()
+        # Build the table up front, most queries need it
+        repo.table()
+        return Queries(repo), repo_checksums
+
+    def refresh(self):
+        '''Reloads the repository if any checksum changed. Returns True if
+        it was reloaded.'''
+        repo = get_repo(list(self.reponames), parse=False)
+        if checksums(repo) == self.checksums:
+            return False
+        log.info('* Reloading %s...', ', '.join(self.reponames))
+        queries, repo_checksums = self._load(repo)
+        with self.lock:
+            self.queries, self.checksums = queries, repo_checksums
+            self.loaded = time.time()
+        return True
+
+    def run(self, name, *args, **kwargs):
+        '''Runs the named query.'''
+        with self.lock:
+            return getattr(self.queries, name)(*args, **kwargs)
+
+    def status(self):
+        return {'repos': list(self.reponames),
+                'checksums': list(self.checksums),
+                'loaded': self.loaded}
+
+
+def param(params, name, default=None):
+    '''Returns the first value of a query string parameter.'''
+    return params.get(name, [default])[0]
+
+
+def addon_pairs(pairs):
+    return {'addons': [{'id': addon_id, 'version': version}
+                       for addon_id, version in pairs]}
+
+
+def handle_all(hot, params):
+    requires = None
+    if param(params, 'requires'):
+        requires = (param(params, 'requires'),
+                    param(params, 'requires_version'))
+    return 200, addon_pairs(hot.run(
+        'all', param(params, 'provider'), param(params, 'point'), requires,
+        param(params, 'sort', 'id'), bool(param(params, 'reverse'))))
+
+
+def handle_info(hot, params):
+    addon = hot.run('info', param(params, 'id'))
+    if addon is None:
+        return 404, {'error': 'No addon found with id %s'
+                              % param(params, 'id')}
+    return 200, {'addon': {'id': addon.id, 'name': addon.name,
+                           'version': addon.version,
+                           'xml': addon.to_xml_string().decode('utf-8')}}
+
+
+def handle_depends(hot, params):
+    return 200, addon_pairs(hot.run(
+        'depends', param(params, 'id'), bool(param(params, 'recursive')),
+        param(params, 'min_version')))
+
+
+def handle_search(hot, params):
+    limit = param(params, 'limit')
+    results = hot.run('search', param(params, 'q', ''),
+                      int(limit) if limit else None)
+    return 200, {'results': [{'score': score, 'id': addon_id,
+                              'version': version}
+                             for score, addon_id, version in results]}
+
+
+ENDPOINTS = {
+    '/all': handle_all,
+    '/info': handle_info,
+    '/depends': handle_depends,
+    '/search': handle_search,
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path, _, query_string = self.path.partition('?')
+        params = dict((key, [val.decode('utf-8') for val in vals])
+                      for key, vals in parse_qs(query_string).items())
+        try:
+            if path == '/status':
+                status, data = 200, self.server.status()
+            elif path not in ENDPOINTS:
+                status, data = 404, {'error': 'Unknown endpoint %s' % path}
+            elif not params.get('repo'):
+                status, data = 400, {'error': 'Missing repo parameter'}
+            else:
+                hot = self.server.hot_repo(params['repo'])
+                status, data = ENDPOINTS[path](hot, params)
+        except UnknownRepository, exc:
+            status, data = 400, {'error': str(exc)}
+        except Exception, exc:
+            log.exception('Error answering %s', self.path)
+            status, data = 500, {'error': str(exc)}
+
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug(fmt, *args)
+
+
+class QueryServer(ThreadingMixIn, HTTPServer):
+    '''A localhost HTTP server answering queries from hot repositories.
+
+    :param preload: A list of lists of repository names to load before
+                    the first query.
+    :param interval: Seconds between background refreshes, or None to
+                     never refresh.
+    :param max_hot: Number of repository sets kept in memory.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), preload=(),
+                 interval=DEFAULT_INTERVAL, max_hot=DEFAULT_MAX_HOT):
+        HTTPServer.__init__(self, address, QueryHandler)
+        self.interval = interval
+        self.max_hot = max_hot
+        # repo_key -> HotRepository, least recently queried first
+        self.hot = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        for reponames in preload:
+            self.hot_repo(reponames)
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def hot_repo(self, reponames):
+        '''Returns the HotRepository for the provided names, loading it on
+        first use. A repository is loaded without holding the server's
+        lock, so queries of the other repositories aren't blocked.'''
+        key = repo_key(reponames)
+        with self._lock:
+            hot = self.hot.pop(key, None)
+            if hot is not None:
+                self.hot[key] = hot
+                return hot
+        log.info('* Loading %s...', ', '.join(key))
+        loaded = HotRepository(key)
+        with self._lock:
+            # Another request may have loaded it in the meantime
+            hot = self.hot.pop(key, loaded)
+            self.hot[key] = hot
+            while len(self.hot) > max(self.max_hot, 1):
+                dropped, _ = self.hot.popitem(last=False)
+                log.info('* Dropping %s from memory', ', '.join(dropped))
+            return hot
+
+    def hot_repos(self):
+        '''Returns the list of loaded HotRepositories.'''
+        with self._lock:
+            return self.hot.values()
+
+    def refresh(self):
+        '''Reloads every hot repository whose checksum changed, then
+        records their use in the cache manifest and keeps the cache
+        within its budget.'''
+        for hot in self.hot_repos():
+            try:
+                hot.refresh()
+            except Exception:
+                log.exception('Error refreshing %s', ', '.join(hot.reponames))
+        try:
+            Cache().sync()
+        except (IOError, OSError):
+            log.exception('Error updating the cache manifest')
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.interval):
+            self.refresh()
+
+    def start_refresher(self):
+        '''Starts refreshing the hot repositories in a background
+        thread.'''
+        if self.interval is None:
+            return
+        thread = threading.Thread(target=self._refresh_loop)
+        thread.daemon = True
+        thread.start()
+
+    def serve_forever(self, *args, **kwargs):
+        self.start_refresher()
+        try:
+            HTTPServer.serve_forever(self, *args, **kwargs)
+        finally:
+            self._stopped.set()
+
+    def status(self):
+        return {'repos': [hot.status() for hot in self.hot_repos()]}
+
+
+class Client(object):
+    '''Sends queries to a running xam server. Has the same methods as
+    xam.query.Queries.'''
+
+    def __init__(self, url, reponames, timeout=30):
+        self.url = url.rstrip('/')
+        self.reponames = list(reponames)
+        self.timeout = timeout
+
+    def _get(self, endpoint, **params):
+        '''Returns the decoded JSON response for an endpoint.'''
+        items = [('repo', name) for name in self.reponames]
+        items.extend((key, val.encode('utf-8') if isinstance(val, unicode)
+                      else val)
+                     for key, val in sorted(params.items())
+                     if val is not None)
+        url = '%s%s?%s' % (self.url, endpoint, urlencode(items))
+        try:
+            resp = urllib2.urlopen(url, timeout=self.timeout)
+        except urllib2.HTTPError, exc:
+            resp = exc
+        except (urllib2.URLError, socket.error), exc:
+            raise ServerError("Couldn't reach the xam server at %s: %s"
+                              % (self.url, exc))
+        try:
+            return resp.getcode(), json.load(resp)
+        finally:
+            resp.close()
+
+    def _query(self, endpoint, **params):
+        status, data = self._get(endpoint, **params)
+        if status != 200:
+            raise ServerError(data.get('error', 'Server error %d' % status))
+        return data
+
+    def all(self, provider=None, point=None, requires=None, sort='id',
+            reverse=False):
+        requires_id, requires_version = requires or (None, None)
+        data = self._query('/all', provider=provider, point=point,
+                           requires=requires_id,
+                           requires_version=requires_version, sort=sort,
+                           reverse=1 if reverse else None)
+        return [(item['id'], item['version']) for item in data['addons']]
+
+    def info(self, addon_id):
+        status, data = self._get('/info', id=addon_id)
+        if status == 404:
+            return None
+        if status != 200:
+            raise ServerError(data.get('error', 'Server error %d' % status))
+        xml = data['addon']['xml'].encode('utf-8')
+        return AddonRecord.from_element(ET.fromstring(xml, UnicodeBuilder()),
+                                        XmlString(xml), 0, len(xml))
+
+    def depends(self, addon_id, recursive=False, min_version=None):
+        data = self._query('/depends', id=addon_id,
+                           recursive=1 if recursive else None,
+                           min_version=min_version)
+        return [(item['id'], item['version']) for item in data['addons']]
+
+    def search(self, query, limit=None):
+        data = self._query('/search', q=query, limit=limit)
+        return [(item['score'], item['id'], item['version'])
+                for item in data['results']]
@@ -0,0 +1,126 @@
+'''
+    xam.session
+    -----------
+
+    Contains the HTTP session shared by every download in xam. Requests
+    to the same host reuse pooled keep-alive connections, and failed
+    requests are retried with an exponential backoff. requests is slow to
+    import, so it's only imported when the session is first created.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import threading
+
+
+SETTINGS = {
+    # Number of hosts to keep connection pools for
+    'pool_connections': 10,
+    # Number of connections kept alive per host
+    'pool_maxsize': 10,
+    # Seconds to wait for a connection or a read
+    'timeout': 30,
+    'retries': 3,
+    'backoff_factor': 0.5,
+    'keep_alive': True,
+}
+
+# The HTTP status codes checked by xam, so callers don't need to import
+# requests for requests.codes
+OK = 200
+PARTIAL_CONTENT = 206
+NOT_MODIFIED = 304
+REQUESTED_RANGE_NOT_SATISFIABLE = 416
+
+_lock = threading.Lock()
+_session = None
+
+
+class Counters(object):
+    '''Thread safe counters for the connections opened (including
+    reconnects of dropped connections) and the requests sent by the
+    shared session.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.opened = 0
+            self.requests = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def reused(self):
+        '''The number of requests sent over an already open connection'''
+        return max(0, self.requests - self.opened)
+
+    def to_dict(self):
+        return {
+            'opened': self.opened,
+            'reused': self.reused,
+            'requests': self.requests,
+        }
+
+
+COUNTERS = Counters()
+
+
+def create_session(settings=None):
+    '''Returns a new requests session for the provided settings, which
+    default to SETTINGS.'''
+    import requests
+    from .adapters import SessionAdapter, Retry
+    settings = dict(SETTINGS, **(settings or {}))
+    retries = Retry(total=settings['retries'],
+                    backoff_factor=settings['backoff_factor'],
+                    status_forcelist=[500, 502, 503, 504],
+                    raise_on_status=False)
+    adapter = SessionAdapter(timeout=settings['timeout'],
+                             pool_connections=settings['pool_connections'],
+                             pool_maxsize=settings['pool_maxsize'],
+                             max_retries=retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not settings['keep_alive']:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def configure(**settings):
+    '''Updates SETTINGS with the provided keyword arguments. The shared
+    session is recreated on its next use.'''
+    global _session
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise TypeError('Unknown session settings: %s'
+                        % ', '.join(sorted(unknown)))
+    with _lock:
+        SETTINGS.update(settings)
+        _session = None
+
+
+def reserve(pool_maxsize):
+    '''Makes sure the shared session keeps at least pool_maxsize
+    connections alive per host, e.g. for a pool of download workers.'''
+    if pool_maxsize > SETTINGS['pool_maxsize']:
+        configure(pool_maxsize=pool_maxsize)
+
+
+def get_session():
+    '''Returns the shared requests session.'''
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def get(url, **kwargs):
+    '''Sends a GET request for url with the shared session.'''
+    return get_session().get(url, **kwargs)
@@ -0,0 +1,334 @@
+'''
+    xam.table
+    ---------
+
+    Contains a columnar, array backed table of a repository's addons for
+    repository wide queries. Strings are interned in a pool and stored as
+    integer ids, versions are stored as packed integer tuples, backed by
+    their full xam.version key when the packed tuple can't tell them
+    apart, and the dependencies and extension points of each addon are stored in
+    compressed sparse row form: a row's entries are found at
+    [offsets[row]:offsets[row + 1]] in a flat array.
+
+    Queries run over the integer columns, so filtering, sorting and
+    counting thousands of addons doesn't create an object per addon::
+
+        >>> table = repo.table()
+        >>> rows = (table.select().provider('jbel')
+        ...         .extension_point('xbmc.python.pluginsource')
+        ...         .sort('version', reverse=True))
+        >>> [table.id(row) for row in rows]
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+from array import array
+from bisect import bisect_right
+from .version import parse
+
+
+# Number of release numbers kept for each version, shorter versions are
+# padded with zeros so 1.0 and 1.0.0 are equal. Each packed version is
+# followed by its stage, so pre-releases sort before their release.
+# Versions with more release numbers, larger ones or a suffix, e.g.
+# 1.2.3.4.5 or 1.0~beta, also keep their full key, see AddonTable.
+VERSION_PARTS = 4
+KEY_SIZE = VERSION_PARTS + 1
+MAX_PART = 0xFFFFFFFF
+
+# String id used for None
+NONE_ID = 0
+
+# String columns, versions are also kept as strings for display
+COLUMNS = ('id', 'name', 'provider', 'version')
+
+def pack_key(key):
+    '''Returns a tuple of KEY_SIZE integers for a version key (see
+    xam.version.parse), the first VERSION_PARTS release numbers followed
+    by the version's stage, e.g. '1.2~beta' becomes (1, 2, 0, 0, 0).
+    Suffixes beyond the stage are ignored.
+    '''
+    release, stage, _ = key
+    parts = [min(part, MAX_PART) for part in release[:VERSION_PARTS]]
+    return tuple(parts + [0] * (VERSION_PARTS - len(parts)) + [stage])
+
+
+def pack_version(version):
+    '''Returns the packed tuple of a version string, see pack_key.'''
+    return pack_key(parse(version))
+
+
+def is_exact(key):
+    '''Returns True if a version key can be rebuilt from its packed
+    tuple, see unpack_key.'''
+    release, _, suffix = key
+    return (not suffix and len(release) <= VERSION_PARTS and
+            all(part <= MAX_PART for part in release))
+
+
+def unpack_key(packed):
+    '''Returns the version key of an exactly packed version.'''
+    release = list(packed[:VERSION_PARTS])
+    while release and release[-1] == 0:
+        release.pop()
+    return tuple(release), packed[VERSION_PARTS], ()
+
+
+def compare_packed(packed, full_key, other_packed, other_full_key):
+    '''Compares two versions like cmp, by their packed tuples when their
+    release numbers differ there and none of them is capped at MAX_PART,
+    else by their full keys like xam.version.compare, which are only
+    built then. full_key and other_full_key are callables.'''
+    release = packed[:VERSION_PARTS]
+    other_release = other_packed[:VERSION_PARTS]
+    if (release != other_release and MAX_PART not in release and
+            MAX_PART not in other_release):
+        return cmp(packed, other_packed)
+    return cmp(full_key(), other_full_key())
+
+
+class StringPool(object):
+    '''Interns strings, giving each distinct string an integer id.'''
+
+    def __init__(self):
+        self.strings = [None]
+        self.ids = {None: NONE_ID}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def add(self, value):
+        '''Returns the id for value, adding it to the pool if needed.'''
+        try:
+            return self.ids[value]
+        except KeyError:
+            self.ids[value] = len(self.strings)
+            self.strings.append(value)
+            return self.ids[value]
+
+    def get(self, value):
+        '''Returns the id for value or None if it isn't in the pool.'''
+        return self.ids.get(value)
+
+
+class AddonTable(object):
+    '''A columnar table of addons. Each addon is a row number and every
+    field is stored in a typed array.'''
+
+    def __init__(self):
+        self.pool = StringPool()
+        self.columns = dict((name, array('I')) for name in COLUMNS)
+        self.versions = array('I')
+        self.dep_offsets = array('I', [0])
+        self.dep_ids = array('I')
+        self.dep_versions = array('I')
+        # Full version keys of the rows and dependencies whose versions
+        # aren't exactly packed, see is_exact
+        self.version_keys = {}
+        self.dep_version_keys = {}
+        self.point_offsets = array('I', [0])
+        self.points = array('I')
+
+    @classmethod
+    def from_addons(cls, addons):
+        '''Returns a table of the provided Addons or AddonRecords.'''
+        table = cls()
+        for addon in addons:
+            table.append(addon)
+        return table
+
+    def append(self, addon):
+        '''Adds a row for the provided addon.'''
+        add = self.pool.add
+        columns = self.columns
+        columns['id'].append(add(addon.id))
+        columns['name'].append(add(addon.name))
+        columns['provider'].append(add(addon.provider))
+        columns['version'].append(add(addon.version))
+        key = parse(addon.version)
+        if not is_exact(key):
+            self.version_keys[len(self) - 1] = key
+        self.versions.extend(pack_key(key))
+
+        for dependency_id, version in addon.dependencies.items():
+            key = parse(version)
+            if not is_exact(key):
+                self.dep_version_keys[len(self.dep_ids)] = key
+            self.dep_ids.append(add(dependency_id))
+            self.dep_versions.extend(pack_key(key))
+        self.dep_offsets.append(len(self.dep_ids))
+
+        for attrs, _ in addon.extension_items:
+            self.points.append(add(dict(attrs).get('point')))
+        self.point_offsets.append(len(self.points))
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def value(self, column, row):
+        '''Returns the string stored in column for row.'''
+        return self.pool.strings[self.columns[column][row]]
+
+    def id(self, row):
+        return self.value('id', row)
+
+    def version_key(self, row):
+        '''Returns the packed version tuple for row.'''
+        start = row * KEY_SIZE
+        return tuple(self.versions[start:start + KEY_SIZE])
+
+    def full_version_key(self, row):
+        '''Returns the xam.version key of row's version.'''
+        try:
+            return self.version_keys[row]
+        except KeyError:
+            return unpack_key(self.version_key(row))
+
+    def dep_version_key(self, i):
+        '''Returns the packed version tuple of the i-th dependency.'''
+        return tuple(self.dep_versions[i * KEY_SIZE:(i + 1) * KEY_SIZE])
+
+    def full_dep_version_key(self, i):
+        '''Returns the xam.version key of the i-th dependency's
+        version.'''
+        try:
+            return self.dep_version_keys[i]
+        except KeyError:
+            return unpack_key(self.dep_version_key(i))
+
+    def version(self, row):
+        return self.value('version', row)
+
+    def dependencies(self, row):
+        '''Returns a list of (addon id, packed version) tuples for the
+        dependencies of row.'''
+        strings = self.pool.strings
+        return [(strings[self.dep_ids[i]], self.dep_version_key(i))
+                for i in xrange(self.dep_offsets[row],
+                                self.dep_offsets[row + 1])]
+
+    def extension_points(self, row):
+        '''Returns the list of extension points of row.'''
+        strings = self.pool.strings
+        return [strings[self.points[i]] for i in
+                xrange(self.point_offsets[row], self.point_offsets[row + 1])]
+
+    def select(self):
+        '''Returns a Selection of every row.'''
+        return Selection(self, array('I', xrange(len(self))))
+
+    def find(self, addon_id):
+        '''Returns the first row with the provided id or None.'''
+        sid = self.pool.get(addon_id)
+        if sid is None:
+            return None
+        try:
+            return self.columns['id'].index(sid)
+        except ValueError:
+            return None
+
+    def dependents(self, addon_id, min_version=None):
+        '''Returns a Selection of the rows which require addon_id,
+        optionally only those requiring at least min_version.'''
+        return self.select().depends_on(addon_id, min_version)
+
+
+class Selection(object):
+    '''An ordered selection of rows in an AddonTable. Filters and sorts
+    return a new Selection.'''
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def _where(self, predicate):
+        return Selection(self.table,
+                         array('I', (row for row in self.rows
+                                     if predicate(row))))
+
+    def _none(self):
+        return Selection(self.table, array('I'))
+
+    def where(self, column, value):
+        '''Keeps the rows whose column equals value.'''
+        sid = self.table.pool.get(value)
+        if sid is None:
+            return self._none()
+        col = self.table.columns[column]
+        return self._where(lambda row: col[row] == sid)
+
+    def provider(self, provider):
+        '''Keeps the rows with the provided provider.'''
+        return self.where('provider', provider)
+
+    def extension_point(self, point):
+        '''Keeps the rows which have an extension for point.'''
+        sid = self.table.pool.get(point)
+        if sid is None:
+            return self._none()
+        points, offsets = self.table.points, self.table.point_offsets
+        matches = set(bisect_right(offsets, i) - 1
+                      for i in xrange(len(points)) if points[i] == sid)
+        return self._where(matches.__contains__)
+
+    def depends_on(self, addon_id, min_version=None):
+        '''Keeps the rows which require addon_id. If min_version is given,
+        only rows requiring at least that version are kept.'''
+        table = self.table
+        sid = table.pool.get(addon_id)
+        if sid is None:
+            return self._none()
+        dep_ids, matches = table.dep_ids, set()
+        if min_version:
+            minimum = parse(min_version)
+            packed_minimum = pack_key(minimum)
+        for i in xrange(len(dep_ids)):
+            if dep_ids[i] != sid:
+                continue
+            if min_version and compare_packed(
+                    table.dep_version_key(i),
+                    lambda: table.full_dep_version_key(i),
+                    packed_minimum, lambda: minimum) < 0:
+                continue
+            matches.add(bisect_right(table.dep_offsets, i) - 1)
+        return self._where(matches.__contains__)
+
+    def min_version(self, version):
+        '''Keeps the rows whose own version is at least version.'''
+        table, minimum = self.table, parse(version)
+        packed_minimum = pack_key(minimum)
+        return self._where(lambda row: compare_packed(
+            table.version_key(row), lambda: table.full_version_key(row),
+            packed_minimum, lambda: minimum) >= 0)
+
+    def sort(self, column='id', reverse=False):
+        '''Returns the rows sorted by column, which is one of 'id', 'name',
+        'provider' or 'version'. Versions are sorted in xam.version order.
+        Rows with equal values keep their order.'''
+        table = self.table
+        if column == 'version':
+            key = table.full_version_key
+        else:
+            strings, col = table.pool.strings, table.columns[column]
+            key = lambda row: strings[col[row]]
+        return Selection(table, array('I', sorted(self.rows, key=key,
+                                                  reverse=reverse)))
+
+    def ids(self):
+        '''Returns the list of addon ids of the selected rows.'''
+        return [self.table.id(row) for row in self.rows]
+
+    def count_by(self, column):
+        '''Returns a dict mapping each value of column to the number of
+        selected rows with that value.'''
+        col, counts = self.table.columns[column], {}
+        for row in self.rows:
+            counts[col[row]] = counts.get(col[row], 0) + 1
+        strings = self.table.pool.strings
+        return dict((strings[sid], count) for sid, count in counts.items())
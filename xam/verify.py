@@ -0,0 +1,150 @@
+'''
+    xam.verify
+    ----------
+
+    Contains the integrity checks of downloaded addon zips. A zip is
+    verified by reading every member through its CRC check, comparing
+    the id and version in its addon.xml with the repository's entry and,
+    optionally, comparing its md5 with the published checksum. Members
+    are streamed CHUNK_SIZE bytes at a time and never extracted, so
+    verifying many large zips is bound by CPU and disk rather than
+    memory. Many zips are verified concurrently in a process pool.
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import zipfile
+from xml.etree import ElementTree as ET
+from .common import UnicodeBuilder, file_md5, CHUNK_SIZE
+from .addon import Addon
+from .index import checksum_key
+
+
+class Verification(object):
+    '''The outcome of verifying a single zip.
+
+    :param addon: The Addon parsed from the zip's addon.xml or None.
+    :param errors: A list of error messages, empty if the zip is valid.
+    '''
+
+    def __init__(self, filename, addon=None, errors=None):
+        self.filename = filename
+        self.addon = addon
+        self.errors = errors or []
+
+    def __repr__(self):
+        return '<Verification %s %s>' % (self.filename,
+                                         'ok' if self.ok else 'failed')
+
+    def __getstate__(self):
+        # Elements don't pickle, results are sent back from pool workers
+        state = dict(self.__dict__)
+        if self.addon is not None:
+            state['addon'] = self.addon.to_xml_string()
+        return state
+
+    def __setstate__(self, state):
+        if state['addon'] is not None:
+            state['addon'] = Addon(ET.fromstring(state['addon'],
+                                                 parser=UnicodeBuilder()),
+                                   state['addon'])
+        self.__dict__.update(state)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def find_addon_xml(names):
+    '''Returns the name of the top most addon.xml in a zip's list of
+    member names or None.'''
+    found = [name for name in names
+             if name == 'addon.xml' or name.endswith('/addon.xml')]
+    if not found:
+        return None
+    return min(found, key=lambda name: name.count('/'))
+
+
+def verify_zip(filename, addon_id=None, version=None, md5=None):
+    '''Returns a Verification for the zip at filename. If provided, the id
+    and version of its addon.xml must equal addon_id and version, and the
+    md5 hex digest of the file must equal md5, which can be the contents
+    of a checksum file.'''
+    result = Verification(filename)
+    errors = result.errors
+    if md5 is not None:
+        actual = file_md5(filename)
+        if actual != checksum_key(md5):
+            errors.append('md5 %s does not match the published md5 %s'
+                          % (actual, checksum_key(md5) or '(empty)'))
+    try:
+        archive = zipfile.ZipFile(filename)
+    except (zipfile.BadZipfile, IOError), exc:
+        errors.append('Not a valid zip file: %s' % exc)
+        return result
+
+    with archive:
+        for info in archive.infolist():
+            try:
+                # Reading a member to its end checks its CRC
+                with archive.open(info) as member:
+                    while member.read(CHUNK_SIZE):
+                        pass
+            except (zipfile.BadZipfile, IOError, RuntimeError), exc:
+                errors.append('%s: %s' % (info.filename, exc))
+
+        addon_xml = find_addon_xml(archive.namelist())
+        if addon_xml is None:
+            errors.append('No addon.xml found')
+            return result
+        try:
+            with archive.open(addon_xml) as inp:
+                result.addon = Addon(ET.parse(inp, parser=UnicodeBuilder())
+                                     .getroot())
+        except Exception, exc:
+            errors.append('%s could not be parsed: %s' % (addon_xml, exc))
+            return result
+
+    if addon_id is not None and result.addon.id != addon_id:
+        errors.append('addon.xml has the id %s instead of %s'
+                      % (result.addon.id, addon_id))
+    if version is not None and result.addon.version != version:
+        errors.append('addon.xml has the version %s instead of %s'
+                      % (result.addon.version, version))
+    return result
+
+
+def _verify_item(item):
+    '''Pool worker for an (filename, addon_id, version, md5) tuple.'''
+    return verify_zip(*item)
+
+
+def verify_zips(items, processes=None, callback=None):
+    '''Verifies each (filename, addon_id, version, md5) tuple in items,
+    where any of the last three can be None, and returns a list of
+    Verifications in the same order. The zips are verified by a pool of
+    processes, by default one per CPU. If provided, callback is called
+    with each Verification as it completes.
+    '''
+    items = list(items)
+    if processes == 1 or len(items) <= 1:
+        results = []
+        for item in items:
+            results.append(_verify_item(item))
+            if callback is not None:
+                callback(results[-1])
+        return results
+
+    # Only the verification of several zips needs a process pool
+    from multiprocessing import Pool
+    pool = Pool(processes)
+    try:
+        results = []
+        for result in pool.imap(_verify_item, items):
+            results.append(result)
+            if callback is not None:
+                callback(result)
+        return results
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,157 @@
+'''
+    xam.version
+    -----------
+
+    Contains the Version type used to compare addon versions. A version
+    string is parsed once into a comparison key, so sorting or finding
+    the newest of many addons never re-parses in the comparator.
+
+    A version is a dotted release number optionally followed by a
+    suffix. Trailing zeros don't matter, so 1.0 and 1.0.0 are equal. A
+    suffix starting with '~' or a letter marks a pre-release, which
+    sorts before the release itself, any other suffix sorts after it::
+
+        1.0.0~alpha < 1.0.0~beta < 1.0.0~beta2 < 1.0 < 1.0.0-1 < 1.0.1
+
+    :copyright: (c) 2012 Jonathan Beluch
+    :license: BSD, see LICENSE for more details.
+'''
+import re
+try:
+    from collections import OrderedDict
+except ImportError:
+    from collective.ordereddict import OrderedDict
+
+
+# Stages of a version, in sorting order
+PRE_RELEASE, FINAL, POST_RELEASE = 0, 1, 2
+
+RELEASE_RE = re.compile(r'[\d.]*')
+SUFFIX_TOKEN_RE = re.compile(r'\d+|[^\W\d_]+', re.UNICODE)
+
+
+def parse(version):
+    '''Returns a (release, stage, suffix) tuple for a version string,
+    where release is a tuple of ints without trailing zeros and suffix is
+    a tuple of comparable tokens.'''
+    version = (version or '').strip()
+    release_str = RELEASE_RE.match(version).group()
+    release = [int(part) if part else 0 for part in release_str.split('.')]
+    while release and release[-1] == 0:
+        release.pop()
+
+    rest = version[len(release_str):]
+    if not rest:
+        stage = FINAL
+    elif rest[0] == '~' or rest[0].isalpha():
+        stage = PRE_RELEASE
+    else:
+        stage = POST_RELEASE
+    # Numbers sort before words and numerically
+    suffix = tuple((0, int(token), u'') if token.isdigit()
+                   else (1, 0, token.lower())
+                   for token in SUFFIX_TOKEN_RE.findall(rest))
+    return tuple(release), stage, suffix
+
+
+class Version(object):
+    '''A parsed version string. Versions compare by their parsed key and
+    str() returns the original string.'''
+
+    __slots__ = ('string', 'key')
+
+    def __init__(self, string):
+        self.string = string
+        self.key = parse(string)
+
+    def __repr__(self):
+        return 'Version(%r)' % self.string
+
+    def __str__(self):
+        return self.string or ''
+
+    @property
+    def release(self):
+        '''The release numbers without trailing zeros'''
+        return self.key[0]
+
+    @property
+    def stage(self):
+        '''One of PRE_RELEASE, FINAL or POST_RELEASE'''
+        return self.key[1]
+
+    @property
+    def is_prerelease(self):
+        return self.stage == PRE_RELEASE
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return self.key == as_version(other).key
+
+    def __ne__(self, other):
+        return self.key != as_version(other).key
+
+    def __lt__(self, other):
+        return self.key < as_version(other).key
+
+    def __le__(self, other):
+        return self.key <= as_version(other).key
+
+    def __gt__(self, other):
+        return self.key > as_version(other).key
+
+    def __ge__(self, other):
+        return self.key >= as_version(other).key
+
+
+def as_version(version):
+    '''Returns version as a Version, parsing it if it's a string.'''
+    if isinstance(version, Version):
+        return version
+    return Version(version)
+
+
+def version_key(addon):
+    '''Returns the comparison key for an addon's version. The parsed
+    version cached on the addon is used when available.'''
+    try:
+        return addon.parsed_version.key
+    except AttributeError:
+        return parse(addon.version)
+
+
+def compare(version_a, version_b):
+    '''Returns 1 if version_a is greater, -1 if version_b is greater or 0
+    if they are equal. Strings and Versions are accepted.'''
+    return cmp(as_version(version_a).key, as_version(version_b).key)
+
+
+def sort_addons(addons, reverse=False):
+    '''Returns the addons sorted by version. Addons with equal versions
+    keep their order.'''
+    return sorted(addons, key=version_key, reverse=reverse)
+
+
+def newest(addons, key=None):
+    '''Returns the addon with the greatest version, the first one listed
+    if several are equal, or None if there are no addons. If provided,
+    key is called with each item to get the addon.'''
+    best, best_key = None, None
+    for item in addons:
+        item_key = version_key(item if key is None else key(item))
+        if best_key is None or item_key > best_key:
+            best, best_key = item, item_key
+    return best
+
+
+def newest_by_id(addons):
+    '''Returns an OrderedDict mapping each addon id to the addon with the
+    greatest version for that id, in the order ids are first seen.'''
+    found, keys = OrderedDict(), {}
+    for addon in addons:
+        addon_key = version_key(addon)
+        if addon.id not in found or addon_key > keys[addon.id]:
+            found[addon.id], keys[addon.id] = addon, addon_key
+    return found